@@ -1,8 +1,45 @@
-from fastapi import FastAPI
+import time
+_inicio_import = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from src.core.config import settings
 from src.api import chat_router
+from src.util.util_admision import Saturado
+from src.util.util_resiliencia import LLMNoDisponible
+from src.util.util_warmup import calentar, estado as estado_calentamiento
+
+logger = logging.getLogger("anmi.app")
+_duracion_import_ms = (time.perf_counter() - _inicio_import) * 1000
+
+def configurar_logging():
+    """
+    Se llama al arrancar el servidor, no al importar: importar `app` (pruebas, scripts)
+    no cambia el logging de quien lo importa. Si el logger raíz ya tiene handlers
+    (p. ej. uvicorn --log-config), basicConfig no hace nada y manda esa configuración.
+    """
+    logging.basicConfig(
+        level=settings.LOG_LEVEL.upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
 
-app = FastAPI(title="Ethics Chatbot API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configurar_logging()
+    logger.info("App importada en %.0f ms", _duracion_import_ms)
+    # El calentamiento corre en segundo plano: /healthz responde de inmediato y
+    # /readyz pasa a 200 cuando los clientes, el índice y el grafo están listos
+    tarea = asyncio.create_task(calentar()) if settings.WARMUP_ENABLED else None
+    yield
+    if tarea is not None and not tarea.done():
+        tarea.cancel()
+
+app = FastAPI(title="Ethics Chatbot API", version="1.0.0", lifespan=lifespan)
 
 
 
@@ -16,6 +53,50 @@ app.add_middleware(
 
 app.include_router(chat_router.router, prefix="/api")
 
+@app.exception_handler(Saturado)
+async def handle_saturado(request, exc: Saturado):
+    """Sin capacidad para atender a tiempo: 429 con el tiempo sugerido de reintento."""
+    return JSONResponse(
+        {"detail": "El asistente está atendiendo muchas consultas. Intenta de nuevo en unos segundos.",
+         "motivo": exc.motivo},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(LLMNoDisponible)
+async def handle_llm_no_disponible(request, exc: LLMNoDisponible):
+    """Gemini no respondió tras los reintentos: 503 para que el cliente reintente más tarde."""
+    return JSONResponse(
+        {"detail": "El asistente no pudo responder en este momento. Intenta de nuevo en unos segundos.",
+         "motivo": exc.motivo},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/")
 def root():
-    return {"message": "Welcome to the Ethics Chatbot API"}
\ No newline at end of file
+    return {"message": "Welcome to the Ethics Chatbot API"}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métricas en formato Prometheus: duración por etapa (búsqueda, prompt, Gemini,
+    escritura SSE, checkpointer), streams activos y conversaciones en memoria.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: el proceso está vivo y atiende peticiones."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 cuando terminó el calentamiento (clientes creados, índice cargado,
+    grafo compilado); 503 mientras tanto o si falló una etapa crítica.
+    """
+    if not settings.WARMUP_ENABLED:
+        return {"listo": True, "calentamiento": "desactivado"}
+    codigo = 200 if estado_calentamiento["listo"] else 503
+    return JSONResponse(estado_calentamiento, status_code=codigo)
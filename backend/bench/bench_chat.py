@@ -0,0 +1,389 @@
+"""
+Benchmark de carga y latencia de punta a punta, sin red (ni Gemini ni Azure).
+
+Levanta la app de FastAPI (backend/app.py) en un subproceso con uvicorn, reemplazando:
+  - `crear_modelo()` (el Gemini detrás de la política de plazos y reintentos) por un LLM
+    falso que emite tokens con un retardo inicial y un ritmo fijos, y que puede inyectar
+    fallos y respuestas lentas
+  - `get_shared_search_client()` por un buscador BM25 sobre data/anmi_knowledge_base_curada.json
+
+y lanza muchos usuarios concurrentes (cada uno con su thread_id) contra /api/chat y
+/api/chat/stream. Mide p50/p95/p99 de latencia, tiempo al primer token (TTFT), tiempo
+al último token (TTLT), peticiones por segundo y crecimiento de RSS del servidor.
+
+Uso (desde backend/):
+    python bench/bench_chat.py --usuarios 50 --turnos 4 --salida bench_results.json
+    python bench/bench_chat.py --comparar bench_results.json   # compara con una corrida previa
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+CURADO = BACKEND_DIR.parent / "data" / "anmi_knowledge_base_curada.json"
+
+PREGUNTAS = [
+    "¿Qué alimentos ricos en hierro le puedo dar a mi bebé de 8 meses?",
+    "¿Cómo preparo la sangrecita para mi bebé?",
+    "¿Cuántas cucharadas de comida debe comer un bebé de 7 meses?",
+    "¿Qué es la anemia y por qué es peligrosa?",
+    "¿Cada cuánto tiempo debe comer mi bebé de 10 meses?",
+    "¿Qué verduras ayudan a absorber mejor el hierro?",
+    "¿Puedo darle hígado de pollo a mi bebé?",
+    "¿Qué textura debe tener la comida a los 6 meses?",
+    "¿El té o el café quitan el hierro de la comida?",
+    "¿Qué hago si mi bebé no quiere comer?",
+    "y el pescado, ¿también tiene hierro?",
+    "¿Cuánto bazo le doy por comida?",
+]
+
+
+# ==========================================
+# 1. SERVIDOR (subproceso) CON DOBLES LOCALES
+# ==========================================
+
+class ErrorSimulado(Exception):
+    """Error reintentable de Gemini (503), como los de google.api_core."""
+    code = 503
+
+
+class LLMFalso:
+    """
+    Imita `ChatGoogleGenerativeAI.astream`: espera `retardo_ms` (tiempo hasta el primer
+    token) y luego emite `tokens` trozos a razón de `tokens_por_s`.
+
+    Con probabilidad `prob_fallo` falla antes del primer token (ErrorSimulado) y con
+    `prob_lento` tarda `retardo_lento_ms` en lugar de `retardo_ms` (cola larga de latencia).
+    """
+
+    def __init__(self, tokens: int, tokens_por_s: float, retardo_ms: float,
+                 prob_fallo: float = 0, prob_lento: float = 0, retardo_lento_ms: float = 0, semilla: int = None):
+        self.tokens = tokens
+        self.intervalo = 1 / tokens_por_s if tokens_por_s > 0 else 0
+        self.retardo = retardo_ms / 1000
+        self.prob_fallo = prob_fallo
+        self.prob_lento = prob_lento
+        self.retardo_lento = retardo_lento_ms / 1000
+        self.azar = random.Random(semilla)
+        self.llamadas = 0
+
+    async def astream(self, messages, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+
+        self.llamadas += 1
+        lento = self.azar.random() < self.prob_lento
+        if self.azar.random() < self.prob_fallo:
+            await asyncio.sleep(self.retardo / 2)
+            raise ErrorSimulado("503 Service Unavailable (simulado)")
+        await asyncio.sleep(self.retardo_lento if lento else self.retardo)
+        for i in range(self.tokens):
+            if i and self.intervalo:
+                await asyncio.sleep(self.intervalo)
+            yield AIMessageChunk(content=f"palabra{i} ")
+
+    async def ainvoke(self, messages, **kwargs):
+        respuesta = None
+        async for chunk in self.astream(messages):
+            respuesta = chunk if respuesta is None else respuesta + chunk
+        return respuesta
+
+
+class BuscadorFalso:
+    """BM25 en memoria sobre el JSON curado, con latencia de red simulada."""
+
+    def __init__(self, latencia_ms: float):
+        from src.util.util_bm25 import BM25Retriever
+
+        with open(CURADO, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        documentos = [
+            {
+                "id": str(i),
+                "content": f"{item['title']}\n\nPalabras clave: {item.get('keywords', '')}\n\n{item['content']}",
+            }
+            for i, item in enumerate(datos)
+        ]
+        self.bm25 = BM25Retriever(documentos)
+        self.latencia = latencia_ms / 1000
+
+    def search(self, search_text: str, select: list = None, top: int = 50, **kwargs):
+        # Las búsquedas reales son HTTP síncrono dentro del executor de búsquedas
+        time.sleep(self.latencia)
+        return self.bm25.search(search_text, select=select, top=top)
+
+
+def servir(args):
+    """Arranca la app con los dobles instalados (se ejecuta en el subproceso)."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("RETRIEVER_BACKEND", "bm25")
+
+    # Los módulos importan estas fábricas por nombre: hay que reemplazarlas antes de importar la app
+    import src.util.util_retriever as util_retriever
+    import src.util.util_llm as util_llm
+    buscador = BuscadorFalso(args.latencia_busqueda_ms)
+    llm = LLMFalso(args.tokens, args.tokens_por_s, args.retardo_llm_ms,
+                   args.prob_fallo, args.prob_lento, args.retardo_lento_ms, args.semilla)
+    util_retriever.get_shared_search_client = lambda: buscador
+    util_llm.crear_modelo = lambda: llm
+
+    import uvicorn
+    from app import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.puerto, log_level="warning", access_log=False)
+
+
+# ==========================================
+# 2. CLIENTE DE CARGA
+# ==========================================
+
+def rss_mb(pid: int) -> float:
+    """RSS actual del proceso (Linux, /proc)."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def percentiles(valores: list) -> dict:
+    if not valores:
+        return {"n": 0}
+    ordenados = sorted(valores)
+
+    def p(q):
+        return round(ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000, 2)
+
+    return {
+        "n": len(ordenados),
+        "p50_ms": p(0.50),
+        "p95_ms": p(0.95),
+        "p99_ms": p(0.99),
+        "max_ms": round(ordenados[-1] * 1000, 2),
+        "media_ms": round(sum(ordenados) / len(ordenados) * 1000, 2),
+    }
+
+
+async def peticion_chat(cliente, mensaje: str, thread_id: str, resultados: dict):
+    inicio = time.perf_counter()
+    respuesta = await cliente.post("/api/chat", json={"message": mensaje, "thread_id": thread_id})
+    if respuesta.status_code != 200:
+        resultados["errores"] += 1
+        return
+    resultados["latencia"].append(time.perf_counter() - inicio)
+
+
+async def peticion_stream(cliente, mensaje: str, thread_id: str, resultados: dict):
+    inicio = time.perf_counter()
+    primero = None
+    async with cliente.stream(
+        "POST", "/api/chat/stream", json={"message": mensaje, "thread_id": thread_id}
+    ) as respuesta:
+        if respuesta.status_code != 200:
+            resultados["errores"] += 1
+            return
+        async for linea in respuesta.aiter_lines():
+            if not linea.startswith("data: "):
+                continue
+            if linea == "data: [DONE]":
+                break
+            if primero is None:
+                primero = time.perf_counter() - inicio
+    final = time.perf_counter() - inicio
+    if primero is not None:
+        resultados["ttft"].append(primero)
+    resultados["ttlt"].append(final)
+    resultados["latencia"].append(final)
+
+
+async def usuario(cliente, endpoint: str, numero: int, turnos: int, semilla: int, resultados: dict):
+    """Un usuario virtual: su propio thread_id y `turnos` mensajes seguidos."""
+    rng = random.Random(semilla + numero)
+    thread_id = f"bench-{endpoint}-{semilla}-{numero}"
+    for _ in range(turnos):
+        mensaje = rng.choice(PREGUNTAS)
+        try:
+            if endpoint == "stream":
+                await peticion_stream(cliente, mensaje, thread_id, resultados)
+            else:
+                await peticion_chat(cliente, mensaje, thread_id, resultados)
+        except Exception as e:
+            resultados["errores"] += 1
+            resultados.setdefault("ultimo_error", repr(e))
+
+
+async def escenario(base_url: str, endpoint: str, args, pid: int) -> dict:
+    import httpx
+
+    resultados = {"latencia": [], "ttft": [], "ttlt": [], "errores": 0}
+    limites = httpx.Limits(max_connections=args.usuarios, max_keepalive_connections=args.usuarios)
+    muestras_rss = [rss_mb(pid)]
+
+    async def muestrear_rss():
+        while True:
+            await asyncio.sleep(0.1)
+            muestras_rss.append(rss_mb(pid))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limites, timeout=args.timeout_s) as cliente:
+        muestreo = asyncio.create_task(muestrear_rss())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            usuario(cliente, endpoint, i, args.turnos, args.semilla, resultados)
+            for i in range(args.usuarios)
+        ))
+        duracion = time.perf_counter() - inicio
+        muestreo.cancel()
+    muestras_rss.append(rss_mb(pid))
+
+    completadas = len(resultados["latencia"])
+    informe = {
+        "peticiones": completadas,
+        "errores": resultados["errores"],
+        "duracion_s": round(duracion, 3),
+        "req_por_s": round(completadas / duracion, 2) if duracion else 0,
+        "latencia": percentiles(resultados["latencia"]),
+        "rss_mb": {
+            "inicio": round(muestras_rss[0], 1),
+            "fin": round(muestras_rss[-1], 1),
+            "pico": round(max(muestras_rss), 1),
+            "crecimiento": round(muestras_rss[-1] - muestras_rss[0], 1),
+        },
+    }
+    if endpoint == "stream":
+        informe["ttft"] = percentiles(resultados["ttft"])
+        informe["ttlt"] = percentiles(resultados["ttlt"])
+    if "ultimo_error" in resultados:
+        informe["ultimo_error"] = resultados["ultimo_error"]
+    return informe
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_servidor(base_url: str, proceso, timeout_s: float = 60):
+    import httpx
+
+    limite = time.monotonic() + timeout_s
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de estar listo.")
+        try:
+            if httpx.get(base_url + "/readyz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo.")
+
+
+def comparar(actual: dict, anterior: dict):
+    """Imprime la variación de las métricas principales respecto de una corrida previa."""
+    print("\nComparación con la corrida anterior:")
+    for endpoint, informe in actual["resultados"].items():
+        previo = anterior.get("resultados", {}).get(endpoint)
+        if not previo:
+            continue
+        filas = [("req/s", informe["req_por_s"], previo["req_por_s"])]
+        for metrica in ("latencia", "ttft", "ttlt"):
+            for p in ("p50_ms", "p95_ms", "p99_ms"):
+                if p in informe.get(metrica, {}) and p in previo.get(metrica, {}):
+                    filas.append((f"{metrica} {p}", informe[metrica][p], previo[metrica][p]))
+        filas.append(("RSS crecimiento MB", informe["rss_mb"]["crecimiento"], previo["rss_mb"]["crecimiento"]))
+        print(f"  [{endpoint}]")
+        for nombre, ahora, antes in filas:
+            cambio = f"{(ahora - antes) / antes * 100:+.1f}%" if antes else "n/a"
+            print(f"    {nombre:<22} {antes:>10} -> {ahora:>10}  ({cambio})")
+
+
+def imprimir(informe: dict):
+    for endpoint, datos in informe["resultados"].items():
+        print(f"\n[{endpoint}] {datos['peticiones']} peticiones, {datos['errores']} errores, "
+              f"{datos['req_por_s']} req/s")
+        for metrica in ("latencia", "ttft", "ttlt"):
+            if metrica in datos and datos[metrica].get("n"):
+                m = datos[metrica]
+                print(f"  {metrica:<9} p50 {m['p50_ms']} ms | p95 {m['p95_ms']} ms | p99 {m['p99_ms']} ms")
+        rss = datos["rss_mb"]
+        print(f"  RSS       {rss['inicio']} -> {rss['fin']} MB (pico {rss['pico']}, +{rss['crecimiento']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de /api/chat y /api/chat/stream (sin red).")
+    parser.add_argument('--usuarios', type=int, default=20, help="Usuarios concurrentes (thread_id distintos).")
+    parser.add_argument('--turnos', type=int, default=3, help="Mensajes por usuario.")
+    parser.add_argument('--endpoints', nargs="+", default=["chat", "stream"], choices=["chat", "stream"])
+    parser.add_argument('--tokens', type=int, default=60, help="Tokens por respuesta del LLM falso.")
+    parser.add_argument('--tokens-por-s', type=float, default=200, help="Ritmo de emisión del LLM falso.")
+    parser.add_argument('--retardo-llm-ms', type=float, default=300, help="Retardo hasta el primer token del LLM falso.")
+    parser.add_argument('--prob-fallo', type=float, default=0, help="Probabilidad de que el LLM falso falle (503).")
+    parser.add_argument('--prob-lento', type=float, default=0, help="Probabilidad de una respuesta lenta del LLM falso.")
+    parser.add_argument('--retardo-lento-ms', type=float, default=5000, help="Retardo hasta el primer token de una respuesta lenta.")
+    parser.add_argument('--latencia-busqueda-ms', type=float, default=40, help="Latencia simulada de la búsqueda.")
+    parser.add_argument('--cache', action='store_true', help="Deja activa la caché de respuestas (por defecto se desactiva).")
+    parser.add_argument('--timeout-s', type=float, default=120)
+    parser.add_argument('--semilla', type=int, default=7)
+    parser.add_argument('--salida', type=str, default="bench_results.json", help="Archivo JSON con los resultados.")
+    parser.add_argument('--comparar', type=str, default=None, help="JSON de una corrida previa para comparar.")
+    parser.add_argument('--servir', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--puerto', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args)
+        return
+
+    args.puerto = puerto_libre()
+    base_url = f"http://127.0.0.1:{args.puerto}"
+
+    entorno = dict(os.environ)
+    if not args.cache:
+        entorno["ANSWER_CACHE_ENABLED"] = "false"
+    comando = [sys.executable, __file__, "--servir", "--puerto", str(args.puerto),
+               "--tokens", str(args.tokens), "--tokens-por-s", str(args.tokens_por_s),
+               "--retardo-llm-ms", str(args.retardo_llm_ms),
+               "--prob-fallo", str(args.prob_fallo), "--prob-lento", str(args.prob_lento),
+               "--retardo-lento-ms", str(args.retardo_lento_ms), "--semilla", str(args.semilla),
+               "--latencia-busqueda-ms", str(args.latencia_busqueda_ms)]
+
+    proceso = subprocess.Popen(comando, cwd=BACKEND_DIR, env=entorno, stdout=subprocess.DEVNULL)
+    try:
+        esperar_servidor(base_url, proceso)
+        informe = {
+            "fecha": datetime.now(timezone.utc).isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("servir", "puerto", "comparar", "salida")},
+            "resultados": {},
+        }
+        for endpoint in args.endpoints:
+            print(f"Ejecutando escenario '{endpoint}' ({args.usuarios} usuarios x {args.turnos} turnos)...")
+            informe["resultados"][endpoint] = asyncio.run(escenario(base_url, endpoint, args, proceso.pid))
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+    imprimir(informe)
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(informe, json.load(f))
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en '{args.salida}'.")
+
+
+if __name__ == "__main__":
+    main()
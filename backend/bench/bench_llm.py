@@ -0,0 +1,110 @@
+"""
+Prueba sin red de la política de plazos, reintentos y hedging del cliente de Gemini.
+
+Corre `LLMResiliente` (src/util/util_resiliencia.py) sobre el LLM falso de bench_chat.py,
+que inyecta fallos (503) y respuestas lentas, y compara la latencia hasta el primer token
+y el total de errores con y sin hedging. Muestra también los contadores de Prometheus
+(intentos, reintentos, hedges lanzados y cuál ganó).
+
+Uso (desde backend/):
+    python bench/bench_llm.py --llamadas 300 --prob-lento 0.05 --prob-fallo 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from prometheus_client import REGISTRY
+
+from bench_chat import LLMFalso, percentiles
+from src.util.util_resiliencia import LLMNoDisponible, LLMResiliente
+
+
+def contador(nombre: str, etiquetas: dict = None) -> float:
+    return REGISTRY.get_sample_value(nombre, etiquetas or {}) or 0
+
+
+async def llamar(llm, ttfts: list, errores: dict, semaforo):
+    async with semaforo:
+        inicio = time.perf_counter()
+        primero = True
+        try:
+            async for chunk in llm.astream([]):
+                if primero and chunk.content:
+                    primero = False
+                    ttfts.append(time.perf_counter() - inicio)
+        except LLMNoDisponible as e:
+            errores[e.motivo] = errores.get(e.motivo, 0) + 1
+
+
+async def escenario(nombre: str, hedge_delay_s, args) -> dict:
+    modelo = LLMFalso(args.tokens, args.tokens_por_s, args.retardo_llm_ms,
+                      args.prob_fallo, args.prob_lento, args.retardo_lento_ms, args.semilla)
+    llm = LLMResiliente(
+        modelo,
+        timeout_s=args.timeout_s,
+        ttft_timeout_s=args.ttft_timeout_s,
+        max_reintentos=args.reintentos,
+        espera_base_s=0.05,
+        espera_max_s=0.5,
+        hedge_delay_s=hedge_delay_s
+    )
+    antes = {
+        "hedges": contador("anmi_llm_hedge_total", {"evento": "lanzado"}),
+        "gana_hedge": contador("anmi_llm_hedge_total", {"evento": "gana_hedge"}),
+        "reintentos": contador("anmi_llm_reintentos_total"),
+    }
+    ttfts, errores = [], {}
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(llamar(llm, ttfts, errores, semaforo) for _ in range(args.llamadas)))
+    return {
+        "escenario": nombre,
+        "duracion_s": round(time.perf_counter() - inicio, 2),
+        "ttft_ms": percentiles(ttfts),
+        "errores": errores,
+        "llamadas_al_modelo": modelo.llamadas,
+        "hedges": contador("anmi_llm_hedge_total", {"evento": "lanzado"}) - antes["hedges"],
+        "gana_hedge": contador("anmi_llm_hedge_total", {"evento": "gana_hedge"}) - antes["gana_hedge"],
+        "reintentos": contador("anmi_llm_reintentos_total") - antes["reintentos"],
+    }
+
+
+def imprimir(r: dict):
+    t = r["ttft_ms"]
+    print(f"\n[{r['escenario']}] {r['duracion_s']} s, {r['llamadas_al_modelo']} llamadas al modelo")
+    print(f"  ttft      p50 {t.get('p50_ms')} ms | p95 {t.get('p95_ms')} ms | p99 {t.get('p99_ms')} ms | max {t.get('max_ms')} ms")
+    print(f"  hedges    {r['hedges']:.0f} lanzados, {r['gana_hedge']:.0f} ganados por el respaldo")
+    print(f"  reintentos {r['reintentos']:.0f} | errores {r['errores'] or 'ninguno'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Política de plazos/reintentos/hedging con un LLM falso.")
+    parser.add_argument('--llamadas', type=int, default=200)
+    parser.add_argument('--concurrencia', type=int, default=20)
+    parser.add_argument('--tokens', type=int, default=20)
+    parser.add_argument('--tokens-por-s', type=float, default=500)
+    parser.add_argument('--retardo-llm-ms', type=float, default=100)
+    parser.add_argument('--prob-fallo', type=float, default=0.05)
+    parser.add_argument('--prob-lento', type=float, default=0.05)
+    parser.add_argument('--retardo-lento-ms', type=float, default=3000)
+    parser.add_argument('--hedge-delay-ms', type=float, default=300)
+    parser.add_argument('--ttft-timeout-s', type=float, default=10)
+    parser.add_argument('--timeout-s', type=float, default=20)
+    parser.add_argument('--reintentos', type=int, default=2)
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args()
+
+    imprimir(asyncio.run(escenario("sin hedging", None, args)))
+    imprimir(asyncio.run(escenario("con hedging", args.hedge_delay_ms / 1000, args)))
+
+
+if __name__ == "__main__":
+    main()
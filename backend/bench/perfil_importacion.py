@@ -0,0 +1,69 @@
+"""
+Perfil del tiempo de importación de la app (arranque en frío).
+
+Ejecuta `python -X importtime -c "import app"` en un proceso limpio y muestra los
+módulos que más tardan (tiempo acumulado, incluye sus dependencias).
+
+Uso (desde backend/):
+    python bench/perfil_importacion.py --top 25 --salida perfil_importacion.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def perfilar(modulo: str = "app") -> list:
+    # Sin GEMINI_API_KEY a propósito: importar la app no debe construir Settings
+    # (configuración, clientes y executors se crean en el primer uso o en el calentamiento)
+    entorno = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=BACKEND_DIR, env=entorno, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr[-2000:])
+
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        filas.append({
+            "modulo": nombre.strip(),
+            "profundidad": (len(nombre) - len(nombre.lstrip())) // 2,
+            "propio_ms": int(propio) / 1000,
+            "acumulado_ms": int(acumulado) / 1000,
+        })
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil del tiempo de importación de la app.")
+    parser.add_argument('--modulo', type=str, default="app")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--salida', type=str, default=None, help="Guarda el perfil completo en JSON.")
+    args = parser.parse_args()
+
+    filas = perfilar(args.modulo)
+    total = next((f["acumulado_ms"] for f in filas if f["modulo"] == args.modulo), 0)
+
+    print(f"Importar '{args.modulo}': {total:.0f} ms en total\n")
+    print(f"{'acumulado':>10} {'propio':>9}  módulo")
+    for fila in sorted(filas, key=lambda f: f["acumulado_ms"], reverse=True)[:args.top]:
+        print(f"{fila['acumulado_ms']:>8.1f}ms {fila['propio_ms']:>7.1f}ms  {'  ' * fila['profundidad']}{fila['modulo']}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"modulo": args.modulo, "total_ms": total, "modulos": filas}, f, indent=2)
+        print(f"\nPerfil guardado en '{args.salida}'.")
+
+
+if __name__ == "__main__":
+    main()
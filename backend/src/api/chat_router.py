@@ -1,6 +1,20 @@
-from fastapi import APIRouter
-from src.schemas.models import ChatRequest, ChatResponse
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from src.core.config import settings
+from src.schemas.models import ChatBatchRequest, ChatBatchResponse, ChatRequest, ChatResponse
 from src.flow.flow_agente import run_flow
+from src.util.util_admision import Saturado
+from src.util.util_reanudable import FueraDeVentana, Turno, TurnosReanudables
+from src.util.util_resiliencia import LLMNoDisponible
+from src.util.util_stream import agrupar_frames
+from src.util.util_metrics import STREAMS_ACTIVOS, observar
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -13,26 +27,278 @@ async def handle_chat(request: ChatRequest):
 
     return ChatResponse(reply=final_answer)
 
+@lru_cache(maxsize=1)
+def get_turnos():
+    """Turnos en curso o recién terminados, para reanudar streams cortados."""
+    return TurnosReanudables(
+        max_frames=settings.STREAM_RESUME_BUFFER_FRAMES,
+        ttl_s=settings.STREAM_RESUME_TTL_S,
+        max_turnos=settings.STREAM_RESUME_MAX_TURNS,
+        gracia_s=settings.STREAM_ABANDON_GRACE_S
+    )
+
+def iniciar_turno(message: str, thread_id: str, reanudable: bool = False) -> Turno:
+    """
+    Lanza la generación del turno en segundo plano: el cliente puede reanudarla desde el
+    último frame que recibió. Si se queda sin clientes se cancela; un cliente `reanudable`
+    tiene STREAM_RESUME_GRACE_S segundos para volver.
+    """
+    from src.flow.flow_agente import run_flow_stream
+
+    # Agrupamos los trozos del modelo en frames (ventana de tiempo / tamaño)
+    # para no hacer una escritura por palabra
+    frames = agrupar_frames(
+        run_flow_stream(message, thread_id),
+        ventana_ms=settings.STREAM_FRAME_WINDOW_MS,
+        max_bytes=settings.STREAM_FRAME_MAX_BYTES
+    )
+    gracia_s = settings.STREAM_RESUME_GRACE_S if reanudable else None
+    return get_turnos().iniciar(thread_id, frames, gracia_s=gracia_s)
+
+def vigilar_desconexion(http_request: Request, turno: Turno) -> asyncio.Task:
+    """
+    Tarea que termina cuando el cliente HTTP cierra la conexión. Mientras corre, el
+    cliente cuenta como lector del turno: al terminar (desconexión o fin de la respuesta)
+    se lo da de baja, y si era el último el turno se cancela (tras el periodo de gracia).
+    """
+    async def esperar_desconexion():
+        # El cuerpo ya se leyó: lo único que puede llegar es http.disconnect
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+
+    turno.conectar()
+    tarea = asyncio.create_task(esperar_desconexion())
+    tarea.add_done_callback(lambda _: turno.desconectar())
+    return tarea
+
 @router.post("/chat/stream")
-async def handle_chat_stream(request: ChatRequest):
+async def handle_chat_stream(request: ChatRequest, http_request: Request,
+                             last_event_id: Optional[str] = Header(default=None)):
     """
     Endpoint para streaming de respuestas usando SSE.
+    Cada evento lleva `id: <turno>:<seq>`; si la conexión se corta, el cliente repite
+    la petición con la cabecera Last-Event-ID y recibe solo lo que le faltó.
+    Si el cliente se va y no vuelve, la generación se cancela.
     """
     from fastapi.responses import StreamingResponse
-    from src.flow.flow_agente import run_flow_stream
-    import json
+
+    if last_event_id:
+        turno_id, _, seq = last_event_id.partition(":")
+        turno = get_turnos().obtener(turno_id, request.thread_id)
+        if turno is None or not seq.isdigit():
+            raise HTTPException(status_code=410, detail="El turno ya no está disponible para reanudar.")
+        desde = int(seq)
+        desconexion = vigilar_desconexion(http_request, turno)
+    else:
+        turno = iniciar_turno(request.message, request.thread_id, request.reanudable)
+        desde = 0
+        desconexion = vigilar_desconexion(http_request, turno)
+        # Esperamos el primer frame antes de enviar las cabeceras: si no hay capacidad
+        # (Saturado), todavía se puede responder 429 en lugar de un stream vacío
+        try:
+            await turno.esperar_inicio(corte=desconexion)
+        except BaseException:
+            desconexion.cancel()
+            raise
+        if desconexion.done():
+            # El cliente se fue mientras esperaba el primer token: nadie leerá la respuesta
+            return Response(status_code=499)
 
     async def event_generator():
-        async for token in run_flow_stream(request.message, request.thread_id):
-            # Formato SSE: data: <contenido>\n\n
-            # Escapamos saltos de línea para que no rompan el formato SSE
-            # O simplemente enviamos el token tal cual si el cliente lo maneja.
-            # Lo estándar es enviar JSON o texto plano.
-            # Enviaremos un JSON con el token para ser más seguros.
-            data = json.dumps({"token": token})
-            yield f"data: {data}\n\n"
-        
-        # Señal de fin (opcional, pero útil)
-        yield "data: [DONE]\n\n"
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
\ No newline at end of file
+        STREAMS_ACTIVOS.inc()
+        try:
+            async for seq, frame in turno.leer_desde(desde, corte=desconexion):
+                # Formato SSE: id + data: <JSON>\n\n (el JSON escapa los saltos de línea)
+                inicio = time.perf_counter()
+                yield f"id: {turno.id}:{seq}\n".encode() + b"data: " + orjson.dumps({"token": frame}) + b"\n\n"
+                # Starlette reanuda el generador cuando terminó de enviar el frame
+                observar("sse_write", time.perf_counter() - inicio)
+            
+            # Señal de fin (opcional, pero útil); no se envía si el turno se cortó.
+            # Si falló a mitad, un evento de error: quien reanuda distingue un turno
+            # fallido de uno completo
+            if desconexion.done() or turno.cancelado:
+                return
+            if turno.error is not None:
+                yield b"data: " + orjson.dumps(evento_error(turno.error)) + b"\n\n"
+            else:
+                yield b"data: [DONE]\n\n"
+        except FueraDeVentana as e:
+            logger.warning("No se pudo reanudar el stream: %s", e)
+        finally:
+            desconexion.cancel()
+            STREAMS_ACTIVOS.dec()
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@router.websocket("/chat/ws/{thread_id}")
+async def handle_chat_ws(websocket: WebSocket, thread_id: str):
+    """
+    Una conexión por conversación para muchos turnos (sin abrir una petición por mensaje).
+
+    Cliente -> servidor:
+        {"type": "mensaje", "message": "...", "reanudable": true}   (reanudable es opcional)
+        {"type": "reanudar", "turno": "<id>", "desde": <último seq recibido>}
+        {"type": "ping"}
+    Servidor -> cliente:
+        {"type": "inicio", "turno": "<id>"}
+        {"type": "token", "turno": "<id>", "seq": n, "token": "..."}
+        {"type": "fin", "turno": "<id>", "seq": n}
+        {"type": "error", "motivo": "...", "retry_after": s}   (retry_after solo si aplica)
+        {"type": "pong"}
+    Un pedido que no es un objeto JSON con los campos esperados recibe el error
+    "pedido_invalido" y la conexión sigue abierta.
+    """
+    await websocket.accept()
+    anterior = conexiones_ws.get(thread_id)
+    conexiones_ws[thread_id] = websocket
+    if anterior is not None:
+        # La conversación se abrió de nuevo (p. ej. tras un cambio de red): manda la nueva
+        try:
+            await anterior.close(code=4000, reason="reemplazada")
+        except (RuntimeError, WebSocketDisconnect):
+            # La conexión anterior ya estaba cerrada
+            pass
+
+    envio = None
+    try:
+        while True:
+            pedido = await leer_pedido_ws(websocket)
+            tipo = pedido.get("type") if pedido is not None else None
+            if tipo == "ping":
+                await enviar_ws(websocket, {"type": "pong"})
+                continue
+            if pedido is None or not pedido_valido(pedido):
+                await enviar_ws(websocket, {"type": "error", "motivo": "pedido_invalido"})
+                continue
+            if envio is not None and not envio.done():
+                await enviar_ws(websocket, {"type": "error", "motivo": "turno_en_curso"})
+                continue
+
+            if tipo == "mensaje":
+                turno, desde = iniciar_turno(pedido["message"], thread_id, pedido.get("reanudable", False)), 0
+            else:
+                turno, desde = get_turnos().obtener(pedido["turno"], thread_id), pedido.get("desde", 0)
+                if turno is None:
+                    await enviar_ws(websocket, {"type": "error", "motivo": "turno_no_disponible"})
+                    continue
+            # Mientras se envía, el socket cuenta como lector del turno (ver Turno.conectar)
+            turno.conectar()
+            envio = asyncio.create_task(enviar_turno_ws(websocket, turno, desde))
+            envio.add_done_callback(lambda _, turno=turno: turno.desconectar())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if envio is not None:
+            envio.cancel()
+        if conexiones_ws.get(thread_id) is websocket:
+            del conexiones_ws[thread_id]
+
+# thread_id -> WebSocket abierto de esa conversación
+conexiones_ws = {}
+
+async def leer_pedido_ws(websocket: WebSocket):
+    """El siguiente pedido del cliente como dict; None si no es un objeto JSON."""
+    mensaje = await websocket.receive()
+    if mensaje["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(mensaje.get("code", 1000))
+    try:
+        pedido = orjson.loads(mensaje.get("text") or mensaje.get("bytes") or b"")
+    except orjson.JSONDecodeError:
+        return None
+    return pedido if isinstance(pedido, dict) else None
+
+def pedido_valido(pedido: dict) -> bool:
+    tipo = pedido.get("type")
+    if tipo == "mensaje":
+        mensaje = pedido.get("message")
+        return (isinstance(mensaje, str) and bool(mensaje.strip())
+                and isinstance(pedido.get("reanudable", False), bool))
+    if tipo == "reanudar":
+        desde = pedido.get("desde", 0)
+        return (isinstance(pedido.get("turno"), str)
+                and isinstance(desde, int) and not isinstance(desde, bool) and desde >= 0)
+    return False
+
+def evento_error(error: BaseException) -> dict:
+    """Motivo (y Retry-After, si aplica) de un turno que falló."""
+    if isinstance(error, (Saturado, LLMNoDisponible)):
+        return {"error": error.motivo, "retry_after": error.retry_after}
+    return {"error": "error_interno"}
+
+async def enviar_ws(websocket: WebSocket, mensaje: dict):
+    await websocket.send_text(orjson.dumps(mensaje).decode())
+
+async def enviar_turno_ws(websocket: WebSocket, turno: Turno, desde: int):
+    """Envía los frames del turno desde `desde` (exclusivo) hasta el final."""
+    STREAMS_ACTIVOS.inc()
+    try:
+        await enviar_ws(websocket, {"type": "inicio", "turno": turno.id})
+        try:
+            await turno.esperar_inicio()
+            async for seq, frame in turno.leer_desde(desde):
+                inicio = time.perf_counter()
+                await enviar_ws(websocket, {"type": "token", "turno": turno.id, "seq": seq, "token": frame})
+                observar("ws_write", time.perf_counter() - inicio)
+            if turno.error is not None:
+                # Falló a mitad de la respuesta
+                raise turno.error
+        except (Saturado, LLMNoDisponible) as e:
+            await enviar_ws(websocket, {"type": "error", "turno": turno.id, "motivo": e.motivo, "retry_after": e.retry_after})
+            return
+        except FueraDeVentana:
+            await enviar_ws(websocket, {"type": "error", "turno": turno.id, "motivo": "fuera_de_ventana"})
+            return
+        except Exception:
+            logger.exception("Error en el turno %s", turno.id)
+            await enviar_ws(websocket, {"type": "error", "turno": turno.id, "motivo": "error_interno"})
+            return
+        await enviar_ws(websocket, {"type": "fin", "turno": turno.id, "seq": turno.ultimo_seq})
+    except (WebSocketDisconnect, RuntimeError):
+        # El cliente se fue a mitad del envío: el turno sigue y puede reanudarse
+        pass
+    finally:
+        STREAMS_ACTIVOS.dec()
+
+@router.post("/chat/batch")
+async def handle_chat_batch(request: ChatBatchRequest):
+    """
+    Lote de mensajes para revisiones de contenido: los ejecuta con paralelismo acotado y
+    devuelve NDJSON (un ChatBatchResponse por línea) a medida que cada uno termina.
+    """
+    from fastapi.responses import StreamingResponse
+    from src.flow.flow_agente import run_flow_batch
+
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote tiene {len(request.items)} mensajes (máximo {settings.BATCH_MAX_ITEMS})."
+        )
+
+    async def lineas():
+        async for resultado in run_flow_batch(request.items, settings.BATCH_MAX_PARALLELISM):
+            yield orjson.dumps(ChatBatchResponse(**resultado).model_dump(exclude_none=True)) + b"\n"
+
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+@router.get("/chat/cache/stats")
+async def handle_cache_stats():
+    """
+    Contadores de aciertos/fallos de la caché de respuestas y de la de búsquedas,
+    y de peticiones unidas a una generación en curso (single-flight), y turnos reanudables.
+    """
+    from src.flow.flow_agente import get_answer_bank, get_answer_cache, get_single_flight
+    from src.tools.tool_buscar_base_conocimientos import get_retrieval_cache
+
+    answer_cache = get_answer_cache()
+    retrieval_cache = get_retrieval_cache()
+    single_flight = get_single_flight()
+    answer_bank = get_answer_bank()
+
+    return {
+        "respuestas": answer_cache.stats() if answer_cache is not None else None,
+        "busquedas": retrieval_cache.stats() if retrieval_cache is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "banco": answer_bank.stats() if answer_bank is not None else None,
+        "turnos": get_turnos().stats(),
+    }
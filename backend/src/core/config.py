@@ -1,13 +1,153 @@
+from functools import lru_cache
+from pathlib import Path
 from pydantic_settings import BaseSettings
 
+# Carpeta 'data' del repositorio (donde escriben los scripts de ingesta)
+DATA_DIR = Path(__file__).resolve().parents[3] / "data"
+
 class Settings(BaseSettings):
-    AZURE_SEARCH_SERVICE_NAME: str
-    AZURE_SEARCH_INDEX_NAME: str
-    AZURE_SEARCH_API_KEY: str
+    # Solo se exigen cuando RETRIEVER_BACKEND = "azure"
+    AZURE_SEARCH_SERVICE_NAME: str = ""
+    AZURE_SEARCH_INDEX_NAME: str = ""
+    AZURE_SEARCH_API_KEY: str = ""
 
     GEMINI_API_KEY: str
+
+    # Motor de búsqueda: "azure" (Azure AI Search), "bm25" (índice local en memoria),
+    # "hybrid" (palabras clave + índice denso LSA local, fusionados con RRF)
+    # o "mmap" (índice binario local de data/ingest*.py --emit-index, abierto con mmap)
+    RETRIEVER_BACKEND: str = "azure"
+    # Documentos que generan data/ingest.py --dry-run y data/ingest_json.py --dry-run
+    LOCAL_KB_FILES: list[str] = [
+        str(DATA_DIR / "output_json_preview.json"),
+        str(DATA_DIR / "output_chunks.json"),
+    ]
+    # Búsqueda híbrida: motor de palabras clave ("bm25" o "azure") e índice denso
+    # (lo genera data/ingest*.py --dry-run; si falta o no corresponde, se construye al iniciar)
+    HYBRID_KEYWORD_BACKEND: str = "bm25"
+    DENSE_INDEX_PATH: str = str(DATA_DIR / "dense_index.npz")
+    DENSE_DIMENSIONS: int = 128
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATES: int = 20
+    # Índice binario (RETRIEVER_BACKEND = "mmap"); se recarga solo cuando se reemplaza el archivo
+    BINARY_INDEX_PATH: str = str(DATA_DIR / "knowledge_index.bin")
+    # Búsquedas simultáneas como máximo (hilos del executor y conexiones HTTP del pool)
+    RETRIEVAL_MAX_CONCURRENCY: int = 8
+
+    # Compresión del contexto recuperado: solo las oraciones relevantes para la consulta,
+    # sin repeticiones ni palabras clave, dentro de este presupuesto de tokens. Las tablas y
+    # listas (porciones, frecuencias, recetas) se conservan enteras o por ítems completos;
+    # el presupuesto alcanza para tres documentos curados completos
+    CONTEXT_COMPRESSION_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 1000
+
+    # Versión manual de la base de conocimientos (cambiarla invalida las cachés)
+    KB_VERSION: str = ""
+    # Manifiesto que escriben los scripts de ingesta tras cada carga al índice
+    INDEX_MANIFEST_PATH: str = str(DATA_DIR / "index_manifest.json")
+
+    # Caché de resultados de búsqueda (por consulta normalizada)
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 2048
+    RETRIEVAL_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+
+    # Caché de respuestas (memoria LRU/TTL + disco SQLite opcional)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAXSIZE: int = 512
+    ANSWER_CACHE_TTL_S: int = 24 * 60 * 60
+    ANSWER_CACHE_DISK_PATH: str = ""  # vacío = solo memoria
+
+    # Memoria de conversaciones: "memory" (RAM del proceso) o "sqlite" (archivo compartido entre workers).
+    # Aun con "sqlite", el orden de los turnos de una conversación (BloqueosPorHilo), los streams
+    # reanudables y el single-flight viven en cada proceso: con varios workers, todas las peticiones
+    # de un mismo thread_id deben llegar al mismo (un solo worker o balanceo con afinidad por thread_id)
+    CHECKPOINTER_BACKEND: str = "memory"
+    SQLITE_CHECKPOINT_PATH: str = "checkpoints.sqlite"
+    SESSION_TTL_S: int = 7 * 24 * 60 * 60      # antigüedad máxima de una conversación
+    SESSION_IDLE_TTL_S: int = 24 * 60 * 60     # inactividad máxima
+    SESSION_STORE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Historial en el prompt: últimos turnos literales dentro de un presupuesto de tokens;
+    # lo anterior se pliega en un resumen acumulado
+    HISTORY_MAX_TURNS: int = 6
+    HISTORY_TOKEN_BUDGET: int = 2000
+    HISTORY_SUMMARY_TOKEN_BUDGET: int = 300
+
+    # Banco de respuestas precalculadas (data/build_answer_bank.py) para las preguntas frecuentes
+    ANSWER_BANK_ENABLED: bool = True
+    ANSWER_BANK_PATH: str = str(DATA_DIR / "answer_bank.json")
+
+    # Plazos de Gemini: total por llamada (todos los intentos) y hasta el primer token
+    # por intento; reintentos con espera exponencial y jitter (solo antes del primer token)
+    LLM_TIMEOUT_S: float = 60.0
+    LLM_TTFT_TIMEOUT_S: float = 15.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF_S: float = 0.5
+    LLM_RETRY_BACKOFF_MAX_S: float = 4.0
+    # Hedging: si no hay primer token tras este retardo (~p95 del TTFT), se lanza una
+    # segunda petición y se cancela la más lenta
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_DELAY_S: float = 3.0
+
+    # Control de admisión: llamadas simultáneas a Gemini, peticiones en espera como máximo
+    # y plazo máximo de espera (de turno o del candado de la conversación) antes de responder 429
+    LLM_MAX_CONCURRENCY: int = 16
+    ADMISSION_QUEUE_MAX: int = 64
+    ADMISSION_QUEUE_TIMEOUT_S: float = 10.0
+
+    # Lotes (/api/chat/batch): mensajes en paralelo como máximo y tamaño máximo del lote
+    BATCH_MAX_PARALLELISM: int = 8
+    BATCH_MAX_ITEMS: int = 1000
+
+    # Single-flight: preguntas idénticas de primer turno que llegan mientras otra igual
+    # se está generando comparten esa generación (cola acotada de trozos por suscriptor)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_QUEUE_MAX: int = 256
+
+    # Streaming SSE: los trozos del modelo se agrupan en frames por tiempo o tamaño
+    STREAM_FRAME_WINDOW_MS: int = 30
+    STREAM_FRAME_MAX_BYTES: int = 1024
+    # Streams reanudables (SSE con Last-Event-ID y WebSocket): frames que se guardan por
+    # turno, segundos que un turno terminado sigue disponible y turnos guardados como máximo
+    STREAM_RESUME_BUFFER_FRAMES: int = 1024
+    STREAM_RESUME_TTL_S: float = 120.0
+    STREAM_RESUME_MAX_TURNS: int = 2000
+    # Segundos que se espera a que un cliente desconectado vuelva antes de cancelar la
+    # generación de su turno. 0 (default): se cancela en cuanto se va el último cliente,
+    # sin seguir gastando tokens de Gemini para nadie
+    STREAM_ABANDON_GRACE_S: float = 0.0
+    # Gracia de los turnos cuyo cliente avisó que reanuda (`reanudable` en el pedido): le da
+    # tiempo a reconectarse tras un corte. Los reintentos del frontend (useChat.ts) deben
+    # caber en esta ventana
+    STREAM_RESUME_GRACE_S: float = 1.5
+
+    # Nivel de logging ("DEBUG" muestra la duración de cada etapa)
+    LOG_LEVEL: str = "INFO"
+
+    # Calentamiento al arrancar (en segundo plano): abre conexiones, carga el índice,
+    # compila el grafo y precarga la caché de búsquedas con estas consultas frecuentes.
+    # /readyz responde 200 cuando termina.
+    WARMUP_ENABLED: bool = True
+    WARMUP_QUERIES: list[str] = [
+        "¿Qué alimentos ricos en hierro le puedo dar a mi bebé?",
+        "¿Cuántas cucharadas de comida debe comer mi bebé?",
+        "¿Qué textura debe tener la comida de mi bebé?",
+        "¿Qué es la anemia?",
+    ]
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+class _SettingsPerezosos:
+    """
+    Se construye Settings en el primer acceso a un atributo, no al importar:
+    `from src.core.config import settings` sigue funcionando igual.
+    """
+    def __getattr__(self, nombre):
+        return getattr(get_settings(), nombre)
+
+settings = _SettingsPerezosos()
@@ -1,69 +1,296 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
 from typing import Annotated
 from typing_extensions import TypedDict
-import asyncio
-import random
 # --- Imports de LangGraph y LangChain ---
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.config import get_stream_writer
+from langchain_core.messages import (
+    AIMessage, AIMessageChunk, HumanMessage, RemoveMessage, SystemMessage, message_chunk_to_message
+)
 
 # --- Tus Imports ---
-from src.prompts.system_prompts import SYSTEM_PROMPT
-from src.tools.tool_buscar_base_conocimientos import buscar_base_conocimientos_tool
-from src.util.util_llm import get_llm_chain # Asumo que este es tu objeto Gemini (llm)
+from src.core.config import settings
+from src.prompts.system_prompts import (
+    SYSTEM_PROMPT,
+    RESUMEN_CONVERSACION_PROMPT,
+    RESPUESTA_SALUDO,
+    RESPUESTA_SALIDA_EMERGENCIA,
+    AVISO_RESPUESTA_CORTADA,
+)
+from src.tools.tool_buscar_base_conocimientos import abuscar_base_conocimientos_tool
+from src.util.util_llm import get_llm_chain # Fábrica del cliente Gemini (llm), se crea en el primer uso
+from src.util.util_admision import BloqueosPorHilo, ControlAdmision, Saturado
+from src.util.util_answer_bank import AnswerBank
+from src.util.util_cache import AnswerCache
+from src.util.util_checkpointer import SQLiteCheckpointer
+from src.util.util_historial import gestionar_historial, contar_tokens_mensajes
+from src.util.util_metrics import RESPUESTAS, instrumentar_checkpointer, medir, observar
+from src.util.util_resiliencia import LLMNoDisponible
+from src.util.util_retriever import get_kb_version
+from src.util.util_router import clasificar_mensaje, RUTA_RAG, RUTA_SALUDO, RUTA_SALIDA_EMERGENCIA
+from src.util.util_singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 # 1. Definimos el Estado (La lista de mensajes que se guardará en RAM)
 class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
+    # Resumen acumulado de los turnos antiguos que ya no van literales al prompt
+    resumen: str
+    # Tokens (estimados) del último prompt enviado a Gemini
+    tokens_prompt: int
+    # Ruta elegida por el enrutador rápido para el último mensaje
+    ruta: str
+
+# 2. Inicializamos la Memoria
+#    - "memory": volátil, se borra al reiniciar y no se comparte entre workers
+#    - "sqlite": persistente, acotada y compartida por todos los workers del host
+#      (los turnos de un mismo hilo se ordenan por proceso: ver BloqueosPorHilo)
+def get_checkpointer():
+    backend = settings.CHECKPOINTER_BACKEND.lower()
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        return SQLiteCheckpointer(
+            settings.SQLITE_CHECKPOINT_PATH,
+            ttl_s=settings.SESSION_TTL_S,
+            idle_ttl_s=settings.SESSION_IDLE_TTL_S,
+            max_bytes=settings.SESSION_STORE_MAX_BYTES
+        )
+    raise ValueError(f"CHECKPOINTER_BACKEND desconocido: {settings.CHECKPOINTER_BACKEND}")
+
+@lru_cache(maxsize=1)
+def get_memory():
+    # Se miden sus lecturas/escrituras y se publica cuántas conversaciones guarda (/metrics)
+    return instrumentar_checkpointer(get_checkpointer())
+
+# 2b. Caché de respuestas para preguntas repetidas (se vacía si cambia la base de conocimientos)
+@lru_cache(maxsize=1)
+def get_answer_cache():
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(
+        maxsize=settings.ANSWER_CACHE_MAXSIZE,
+        ttl=settings.ANSWER_CACHE_TTL_S,
+        version_fn=get_kb_version,
+        disk_path=settings.ANSWER_CACHE_DISK_PATH
+    )
+
+# 2c. Banco de respuestas precalculadas para las preguntas frecuentes (cero llamadas a Gemini).
+#     Se crea una vez; el banco se recarga solo cuando data/build_answer_bank.py reescribe el archivo
+@lru_cache(maxsize=1)
+def get_answer_bank():
+    if not settings.ANSWER_BANK_ENABLED:
+        return None
+    return AnswerBank.desde_archivo(settings.ANSWER_BANK_PATH)
+
+# 2d. Preguntas idénticas en vuelo (primer turno) comparten una sola generación de Gemini
+@lru_cache(maxsize=1)
+def get_single_flight():
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return None
+    return SingleFlight(max_cola=settings.SINGLE_FLIGHT_QUEUE_MAX)
+
+# 2e. Control de admisión: cupo global de llamadas a Gemini y un candado por conversación
+@lru_cache(maxsize=1)
+def get_control_admision():
+    return ControlAdmision(
+        max_concurrencia=settings.LLM_MAX_CONCURRENCY,
+        max_cola=settings.ADMISSION_QUEUE_MAX,
+        espera_max_s=settings.ADMISSION_QUEUE_TIMEOUT_S
+    )
+
+@lru_cache(maxsize=1)
+def get_bloqueos_hilo():
+    return BloqueosPorHilo(espera_max_s=settings.ADMISSION_QUEUE_TIMEOUT_S)
+
+def respuesta_directa(texto: str, origen: str) -> dict:
+    """
+    Responde sin pasar por Gemini. El texto se envía por el stream (si lo hay)
+    y se guarda en la memoria del hilo como mensaje del asistente.
+    """
+    RESPUESTAS.labels(origen=origen).inc()
+    writer = get_stream_writer()
+    writer(texto)
+    return {"messages": [AIMessage(content=texto)]}
+
+# 3a. NODO ENRUTADOR: saludos y preguntas fuera de alcance se responden al instante,
+#     sin búsqueda ni Gemini (la respuesta igual queda en la memoria del hilo)
+RESPUESTAS_RAPIDAS = {
+    RUTA_SALUDO: RESPUESTA_SALUDO,
+    RUTA_SALIDA_EMERGENCIA: RESPUESTA_SALIDA_EMERGENCIA,
+}
+
+async def route_message(state: AgentState):
+    ruta = clasificar_mensaje(state["messages"][-1].content)
+    if ruta == RUTA_RAG:
+        return {"ruta": ruta}
+
+    logger.info("Respuesta rápida (%s)", ruta)
+    return {"ruta": ruta, **respuesta_directa(RESPUESTAS_RAPIDAS[ruta], origen="rapida")}
+
+def siguiente_nodo(state: AgentState) -> str:
+    return "anmi_agent" if state["ruta"] == RUTA_RAG else END
+
+async def generar_respuesta(messages_for_llm: list, emitir) -> AIMessage:
+    """
+    Llamada a Gemini en streaming: cada trozo con texto se pasa a `emitir`.
+    Devuelve el mensaje completo. Espera turno en el control de admisión
+    (lanza Saturado si no lo consigue a tiempo).
 
-# 2. Inicializamos la Memoria (Volátil: se borra al reiniciar)
-memory = MemorySaver()
+    Si Gemini falla antes del primer token, LLMNoDisponible llega al endpoint (503).
+    Si falla a mitad de respuesta, devuelve lo generado más el aviso de respuesta cortada,
+    marcado con `additional_kwargs["cortada"]` (el aviso no se emite: decide quien llama).
+    """
+    async with get_control_admision().ranura_llm():
+        response = None
+        inicio_llm = time.perf_counter()
+        primer_token = False
+        with medir("llm_total"):
+            try:
+                async for chunk in get_llm_chain().astream(messages_for_llm):
+                    response = chunk if response is None else response + chunk
+                    if chunk.content:
+                        if not primer_token:
+                            primer_token = True
+                            observar("llm_ttft", time.perf_counter() - inicio_llm)
+                        emitir(chunk.content)
+            except LLMNoDisponible as e:
+                if not primer_token:
+                    raise
+                logger.warning("Respuesta de Gemini cortada a mitad (%s)", e.motivo)
+                response = response + AIMessageChunk(
+                    content=AVISO_RESPUESTA_CORTADA, additional_kwargs={"cortada": True}
+                )
+    return message_chunk_to_message(response)
 
-# 3. Definimos el NODO PRINCIPAL (Aquí ocurre toda la lógica RAG)
+# 3b. Definimos el NODO PRINCIPAL (Aquí ocurre toda la lógica RAG)
 async def call_model(state: AgentState):
     
     # a. Obtenemos el último mensaje del usuario desde el historial
     last_message = state["messages"][-1].content
-    print(f"--- Procesando mensaje: {last_message} ---")
+    logger.info("Procesando mensaje (%d caracteres)", len(last_message))
 
-    # b. Fase 1: Retrieval (Buscar en Azure)
-    contexto = buscar_base_conocimientos_tool(last_message)
+    # b. Fase 1: Retrieval (Buscar en Azure, sin bloquear el event loop)
+    with medir("retrieval"):
+        contexto = await abuscar_base_conocimientos_tool(last_message)
     
     # c. Filtro de Seguridad
     if "No se encontró contexto" in contexto or not contexto:
         # Cortocircuito: Respondemos directamente sin gastar tokens del LLM
-        return {"messages": ["Lo siento, no encontré información oficial sobre eso en mis documentos."]}
+        return respuesta_directa(
+            "Lo siento, no encontré información oficial sobre eso en mis documentos.",
+            origen="sin_contexto"
+        )
+
+    # El banco y la caché guardan respuestas generadas sin historial: solo sirven en el
+    # primer turno (después, "¿y cuánto?" depende de lo que se habló antes)
+    primer_turno = len(state["messages"]) == 1 and not state.get("resumen")
+
+    # c2. Banco de respuestas: preguntas frecuentes precalculadas (válidas mientras
+    #     la búsqueda devuelva el mismo contexto con el que se generaron)
+    answer_bank = get_answer_bank()
+    if answer_bank is not None and primer_turno:
+        respuesta_banco = answer_bank.buscar(last_message, contexto)
+        if respuesta_banco is not None:
+            logger.info("Respuesta servida desde el banco de respuestas")
+            return respuesta_directa(respuesta_banco, origen="banco")
+
+    # c3. Caché de respuestas
+    answer_cache = get_answer_cache()
+    clave_cache = None
+    if answer_cache is not None and primer_turno:
+        clave_cache = answer_cache.clave(last_message, contexto)
+        respuesta_cacheada = answer_cache.get(clave_cache)
+        if respuesta_cacheada is not None:
+            logger.info("Respuesta servida desde caché")
+            return respuesta_directa(respuesta_cacheada, origen="cache")
 
     # d. Preparamos el Prompt con el Contexto Fresco
     # (Esto se hace en cada turno para que el contexto siempre sea relevante a la última pregunta)
+    inicio_prompt = time.perf_counter()
     prompt_actualizado = SYSTEM_PROMPT.format(
         contexto_de_la_busqueda_rag=contexto,
         pregunta_del_usuario=last_message
     )
     
-    # e. Preparamos la lista de mensajes para Gemini:
-    #    [0] Instrucciones del Sistema (con contexto)
-    #    [1..N] Historial de la conversación (state["messages"])
-    messages_for_llm = [SystemMessage(content=prompt_actualizado)] + state["messages"]
+    # e. Ventana de historial: los últimos turnos literales dentro del presupuesto de tokens;
+    #    los anteriores se pliegan en un resumen acumulado (y salen del estado)
+    historial = gestionar_historial(
+        state["messages"],
+        state.get("resumen", ""),
+        max_turnos=settings.HISTORY_MAX_TURNS,
+        presupuesto_tokens=settings.HISTORY_TOKEN_BUDGET,
+        presupuesto_resumen=settings.HISTORY_SUMMARY_TOKEN_BUDGET
+    )
+    if historial["resumen"]:
+        prompt_actualizado += RESUMEN_CONVERSACION_PROMPT.format(resumen=historial["resumen"])
+
+    # Preparamos la lista de mensajes para Gemini:
+    #    [0] Instrucciones del Sistema (con contexto y resumen)
+    #    [1..N] Ventana reciente de la conversación
+    messages_for_llm = [SystemMessage(content=prompt_actualizado)] + historial["ventana"]
+    tokens_prompt = contar_tokens_mensajes(messages_for_llm)
+    observar("prompt", time.perf_counter() - inicio_prompt)
     
     # f. Fase 2: Generation (Llamada REAL a Gemini)
-    print("--- Invocando a Gemini ---")
-    # Usamos el objeto LLM que importaste
-    response = await get_llm_chain.ainvoke(messages_for_llm)
+    logger.info(
+        "Invocando a Gemini (~%d tokens de prompt, %d mensajes en ventana)",
+        tokens_prompt, len(historial["ventana"])
+    )
+    # Consumimos el stream del LLM: cada trozo se reenvía al cliente (si hay streaming)
+    writer = get_stream_writer()
+    single_flight = get_single_flight()
+    if single_flight is not None and primer_turno:
+        # Si la misma pregunta (con el mismo contexto) ya se está generando, nos unimos
+        # a esa generación; cada petición guarda su propia copia en su hilo
+        response, lider = await single_flight.ejecutar(
+            AnswerCache.clave(last_message, contexto),
+            lambda emitir: generar_respuesta(messages_for_llm, emitir),
+            writer
+        )
+        response = response.model_copy(update={"id": None})
+    else:
+        response = await generar_respuesta(messages_for_llm, writer)
+        lider = True
+    if response.additional_kwargs.get("cortada"):
+        # Respuesta degradada: el líder cierra lo ya enviado con el aviso y la guarda en
+        # su hilo; las peticiones unidas reciben el error (y su turno se deshace). Nunca
+        # va a la caché de respuestas
+        if not lider:
+            raise LLMNoDisponible("error")
+        writer(AVISO_RESPUESTA_CORTADA)
+        clave_cache = None
+    RESPUESTAS.labels(origen="llm" if lider else "single_flight").inc()
+
+    if clave_cache is not None and lider:
+        answer_cache.set(clave_cache, response.content)
     
     # Devolvemos la respuesta para que LangGraph la guarde en la memoria
-    return {"messages": [response]}
+    return {
+        "messages": historial["eliminar"] + [response],
+        "resumen": historial["resumen"],
+        "tokens_prompt": tokens_prompt
+    }
 
 # 4. Construimos el Grafo
 workflow = StateGraph(AgentState)
+workflow.add_node("router", route_message)
 workflow.add_node("anmi_agent", call_model)
-workflow.add_edge(START, "anmi_agent")
+workflow.add_edge(START, "router")
+workflow.add_conditional_edges("router", siguiente_nodo, ["anmi_agent", END])
 workflow.add_edge("anmi_agent", END)
 
-# 5. Compilamos la aplicación CON memoria
+# 5. Compilamos la aplicación CON memoria (en el primer uso o en el calentamiento)
 # Este objeto 'app_graph' es el que mantiene el estado
-app_graph = workflow.compile(checkpointer=memory)
+@lru_cache(maxsize=1)
+def get_app_graph():
+    return workflow.compile(checkpointer=get_memory())
 
 # 6. Función Pública (La que llama tu API)
 # AHORA NECESITA thread_id
@@ -78,11 +305,17 @@ async def run_flow(user_message: str, thread_id: str) -> str:
     # Ejecutamos el grafo pasando el nuevo mensaje
     input_message = HumanMessage(content=user_message)
     
-    # ainvoke corre el grafo y guarda el estado automáticamente
-    final_state = await app_graph.ainvoke(
-        {"messages": [input_message]}, 
-        config=config
-    )
+    # ainvoke corre el grafo y guarda el estado automáticamente.
+    # Un turno a la vez por conversación: el siguiente espera a que este se guarde
+    async with get_bloqueos_hilo().bloquear(thread_id):
+        try:
+            final_state = await get_app_graph().ainvoke(
+                {"messages": [input_message]}, 
+                config=config
+            )
+        except TURNO_NO_ATENDIDO:
+            await deshacer_turno(config, user_message)
+            raise
     
     # Extraemos el texto de la última respuesta del bot
     bot_response = final_state["messages"][-1].content
@@ -91,39 +324,150 @@ async def run_flow(user_message: str, thread_id: str) -> str:
 
 async def run_flow_stream(user_message: str, thread_id: str):
     """
-    Streaming estilo ChatGPT:
-    - Palabras con velocidad variable leve
-    - Sin pausas incómodas
-    - Suave y natural
+    Streaming: reenvía los trozos de Gemini tal como llegan, sin pausas artificiales.
+    El agrupado en frames lo hace el endpoint SSE y el efecto de escritura, el cliente.
     """
     
     config = {"configurable": {"thread_id": thread_id}}
     input_message = HumanMessage(content=user_message)
 
-    buffer = ""
+    # stream_mode="custom" entrega lo que call_model envía con el stream writer:
+    # los trozos de Gemini o una respuesta completa (caché / cortocircuito).
+    # Un turno a la vez por conversación: el siguiente espera a que este se guarde
+    emitidos = []
+    async with get_bloqueos_hilo().bloquear(thread_id):
+        stream = get_app_graph().astream(
+            {"messages": [input_message]},
+            config=config,
+            stream_mode="custom"
+        )
+        try:
+            async for chunk in stream:
+                if chunk:
+                    emitidos.append(chunk)
+                    yield chunk
+        except TURNO_NO_ATENDIDO:
+            await deshacer_turno(config, user_message)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # El cliente se fue: cerrar el stream cancela los nodos del grafo en curso
+            # (y con ellos la llamada a Gemini). Antes de soltar el hilo se guarda lo
+            # que alcanzó a generarse
+            await stream.aclose()
+            await guardar_respuesta_cancelada(config, user_message, "".join(emitidos))
+            raise
 
-    async for event in app_graph.astream_events(
-        {"messages": [input_message]},
-        config=config,
-        version="v2"
-    ):
-        if event["event"] == "on_chat_model_stream":
-            chunk = event["data"]["chunk"].content
-            if not chunk:
-                continue
+# Errores con los que el turno termina sin respuesta (el endpoint responde 429 / 503)
+TURNO_NO_ATENDIDO = (Saturado, LLMNoDisponible)
 
-            buffer += chunk
+async def mensaje_pendiente(config: dict, user_message: str):
+    """
+    El mensaje del usuario de este turno si es el último del hilo (el grafo ya lo guardó
+    y todavía no tiene respuesta); None si no llegó a guardarse.
+    """
+    estado = await get_app_graph().aget_state(config)
+    mensajes = estado.values.get("messages", [])
+    if mensajes and isinstance(mensajes[-1], HumanMessage) and mensajes[-1].content == user_message:
+        return mensajes[-1]
+    return None
+
+async def deshacer_turno(config: dict, user_message: str):
+    """
+    Quita de la memoria del hilo el mensaje de un turno que no se atendió (sin capacidad
+    para llamar a Gemini, o Gemini no respondió): el grafo lo guarda al empezar, y si
+    quedara sin respuesta el próximo turno enviaría dos mensajes del usuario seguidos.
+    El cliente lo reintenta.
+    """
+    try:
+        pendiente = await mensaje_pendiente(config, user_message)
+        if pendiente is not None:
+            await get_app_graph().aupdate_state(
+                config, {"messages": [RemoveMessage(id=pendiente.id)]}, as_node="anmi_agent"
+            )
+    except Exception:
+        logger.exception("No se pudo deshacer el turno no atendido")
+
+async def guardar_respuesta_cancelada(config: dict, user_message: str, parcial: str):
+    """
+    Cierra en la memoria del hilo un turno cancelado a mitad: guarda la respuesta parcial
+    (marcada con `cancelada`) para que el historial siga alternando usuario / asistente.
+    Si el grafo no llegó a guardar el mensaje del usuario, no se guarda nada.
+    """
+    try:
+        if await mensaje_pendiente(config, user_message) is None:
+            return
+        respuesta = AIMessage(
+            content=parcial.rstrip() + AVISO_RESPUESTA_CORTADA if parcial else AVISO_RESPUESTA_CORTADA.strip(),
+            response_metadata={"cancelada": True}
+        )
+        await get_app_graph().aupdate_state(config, {"messages": [respuesta]}, as_node="anmi_agent")
+    except Exception:
+        logger.exception("No se pudo guardar la respuesta cancelada")
+
+# Reintentos de un mensaje del lote cuando no hay capacidad (429): se espera lo que indica
+# Retry-After en lugar de perder el mensaje. Un intento rechazado no deja rastro en el
+# hilo (ver deshacer_turno), así que reintentar no repite el mensaje del usuario
+REINTENTOS_LOTE = 3
+
+async def run_flow_batch(items: list, paralelismo: int):
+    """
+    Ejecuta un lote de (message, thread_id) con `run_flow`, como mucho `paralelismo`
+    mensajes a la vez. Los mensajes de un mismo thread_id van en orden, uno tras otro.
+    Entrega un dict por mensaje en orden de finalización:
+        {"index", "thread_id", "reply" | "error", "timings": {"queue_ms", "run_ms"}}
+    Las búsquedas repetidas dentro del lote se resuelven una sola vez (caché de
+    búsquedas + búsquedas en curso compartidas).
+    """
+    semaforo = asyncio.Semaphore(paralelismo)
+    resultados = asyncio.Queue()
 
-            # Emitir una palabra cuando aparece espacio
-            while " " in buffer:
-                word, buffer = buffer.split(" ", 1)
+    conversaciones = {}
+    for indice, item in enumerate(items):
+        conversaciones.setdefault(item.thread_id, []).append((indice, item))
 
-                # Emitir la palabra
-                yield word + " "
+    async def procesar(indice: int, item) -> dict:
+        inicio = time.perf_counter()
+        ejecucion = 0.0
+        resultado = {"index": indice, "thread_id": item.thread_id}
+        for intento in range(REINTENTOS_LOTE + 1):
+            espera = None
+            async with semaforo:
+                inicio_flujo = time.perf_counter()
+                try:
+                    resultado["reply"] = await run_flow(item.message, item.thread_id)
+                except Saturado as e:
+                    if intento == REINTENTOS_LOTE:
+                        resultado["error"] = f"saturado: {e.motivo}"
+                    else:
+                        espera = e.retry_after
+                except LLMNoDisponible as e:
+                    resultado["error"] = f"llm_no_disponible: {e.motivo}"
+                except Exception as e:
+                    logger.exception("Error en el mensaje %d del lote", indice)
+                    resultado["error"] = type(e).__name__
+                ejecucion += time.perf_counter() - inicio_flujo
+            if espera is None:
+                break
+            # La espera del Retry-After se hace fuera del semáforo: el lugar queda libre
+            # para otro mensaje del lote y el reintento vuelve a la cola
+            await asyncio.sleep(espera)
+        total = time.perf_counter() - inicio
+        resultado["timings"] = {
+            "queue_ms": round((total - ejecucion) * 1000, 1),
+            "run_ms": round(ejecucion * 1000, 1),
+        }
+        return resultado
 
-                # Velocidad tipo ChatGPT (rápido, suave, ligeramente aleatorio)
-                await asyncio.sleep(random.uniform(0.010, 0.020))
+    async def conversacion(mensajes: list):
+        for indice, item in mensajes:
+            resultados.put_nowait(await procesar(indice, item))
 
-    # Emitir cualquier resto al final
-    if buffer:
-        yield buffer
\ No newline at end of file
+    tareas = [asyncio.create_task(conversacion(m)) for m in conversaciones.values()]
+    try:
+        for _ in range(len(items)):
+            yield await resultados.get()
+    finally:
+        # Si el cliente se desconecta, no se sigue gastando en el resto del lote
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
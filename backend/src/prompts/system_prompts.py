@@ -45,4 +45,17 @@ CONTEXTO:
 ---
 PREGUNTA DEL USUARIO:
 {pregunta_del_usuario}
-"""
\ No newline at end of file
+"""
+
+RESUMEN_CONVERSACION_PROMPT = """
+---
+RESUMEN DE LA CONVERSACIÓN ANTERIOR (turnos antiguos, solo como referencia):
+{resumen}
+"""
+
+# Respuestas fijas del enrutador rápido (mismo comportamiento que pide SYSTEM_PROMPT)
+RESPUESTA_SALUDO = "¡Hola! 💚 Soy ANMI, tu asistente nutricional materno infantil. ¿En qué puedo ayudarte hoy sobre la alimentación de tu bebé de 6 a 12 meses?"
+
+RESPUESTA_SALIDA_EMERGENCIA = "Entiendo que buscas ayuda específica. Sin embargo, como asistente de IA educativo, solo puedo ofrecer información para bebés de **6 a 12 meses** y no puedo ofrecer dietas personalizadas o consejos médicos. Esa información debe dártela un pediatra o nutricionista. Te recomiendo consultar a un profesional de la salud."
+
+AVISO_RESPUESTA_CORTADA = "\n\n_(La respuesta se interrumpió. Si te quedó alguna duda, vuelve a preguntarme.)_"
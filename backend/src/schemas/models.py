@@ -1,8 +1,27 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     message: str
     thread_id: str
+    # El cliente reanuda streams cortados: el turno espera STREAM_RESUME_GRACE_S antes de cancelarse
+    reanudable: bool = False
 
 class ChatResponse(BaseModel):
-    reply: str
\ No newline at end of file
+    reply: str
+
+class ChatBatchRequest(BaseModel):
+    # Los mensajes de un mismo thread_id se procesan en el orden en que vienen
+    items: List[ChatRequest] = Field(..., min_length=1)
+
+class ChatBatchTimings(BaseModel):
+    queue_ms: float  # espera de un lugar libre (límite de paralelismo del lote) y del Retry-After
+    run_ms: float    # ejecución del flujo (suma de los intentos)
+
+class ChatBatchResponse(BaseModel):
+    # Una línea NDJSON por mensaje, en orden de finalización
+    index: int
+    thread_id: str
+    reply: Optional[str] = None
+    error: Optional[str] = None
+    timings: ChatBatchTimings
@@ -1,11 +1,44 @@
-from src.util.util_retriever import search_client
+import asyncio
+import logging
+from functools import lru_cache
+from src.core.config import settings
+from src.util.util_cache import RetrievalCache
+from src.util.util_compresion import comprimir_contexto
+from src.util.util_metrics import medir
+from src.util.util_retriever import get_shared_search_client, get_retrieval_executor, get_kb_version
+from src.util.util_texto import clave_consulta
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1)
+def get_retrieval_cache():
+    """
+    Resultados de búsqueda por consulta normalizada (se vacía al re-ingestar el índice).
+    None si está desactivada.
+    """
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        return None
+    return RetrievalCache(
+        max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+        max_bytes=settings.RETRIEVAL_CACHE_MAX_BYTES,
+        version_fn=get_kb_version
+    )
 
 def buscar_base_conocimientos_tool(query: str) -> str:
     """
-    Usa el cliente de Azure AI Search para buscar en la base de conocimientos.
+    Usa el cliente de búsqueda configurado (Azure AI Search o BM25 local)
+    para buscar en la base de conocimientos. El contexto se comprime para la
+    consulta antes de guardarlo en caché (la clave ya es la consulta).
     """
+    clave = clave_consulta(query)
+    retrieval_cache = get_retrieval_cache()
+    if retrieval_cache is not None:
+        contexto = retrieval_cache.get(clave)
+        if contexto is not None:
+            return contexto
+
     try:
-        results = search_client.search(
+        results = get_shared_search_client().search(
             search_text=query,
             select=["content"],
             top=3  # Limitar a los 3 resultados más relevantes
@@ -16,9 +49,41 @@ def buscar_base_conocimientos_tool(query: str) -> str:
 
         if not contexto:
             return "No se encontraron resultados relevantes en la base de conocimientos."
+
+        if settings.CONTEXT_COMPRESSION_ENABLED:
+            with medir("compresion"):
+                contexto = comprimir_contexto(contexto, query, settings.CONTEXT_TOKEN_BUDGET)
+
+        if retrieval_cache is not None:
+            retrieval_cache.set(clave, contexto)
         return contexto
     
     except Exception as e:
-        print(f"Error al buscar en la base de conocimientos: {e}")
-        return "Error al conectar con la base de conocimientos." 
-    
\ No newline at end of file
+        logger.exception("Error al buscar en la base de conocimientos: %s", e)
+        return "Error al conectar con la base de conocimientos."
+
+
+# Búsquedas en curso por consulta normalizada (clave -> futuro del executor)
+_busquedas_en_curso = {}
+
+async def abuscar_base_conocimientos_tool(query: str) -> str:
+    """
+    Versión asíncrona: ejecuta la búsqueda en el executor acotado de búsquedas
+    para no bloquear el event loop mientras se espera la respuesta.
+    Las consultas iguales que llegan mientras otra está en curso esperan esa misma
+    búsqueda (la caché solo ayuda a las que llegan después).
+    """
+    clave = clave_consulta(query)
+    futuro = _busquedas_en_curso.get(clave)
+    if futuro is not None:
+        logger.debug("Búsqueda unida a otra en curso: %s", clave)
+        return await asyncio.shield(futuro)
+
+    loop = asyncio.get_running_loop()
+    futuro = loop.run_in_executor(get_retrieval_executor(), buscar_base_conocimientos_tool, query)
+    _busquedas_en_curso[clave] = futuro
+    try:
+        return await asyncio.shield(futuro)
+    finally:
+        if _busquedas_en_curso.get(clave) is futuro:
+            del _busquedas_en_curso[clave]
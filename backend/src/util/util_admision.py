@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+
+from src.util.util_metrics import LLM_EN_COLA, LLM_EN_VUELO, RECHAZOS, observar
+
+logger = logging.getLogger(__name__)
+
+
+class Saturado(Exception):
+    """No hay capacidad para atender la petición a tiempo (se responde 429)."""
+
+    def __init__(self, motivo: str, retry_after: int):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ControlAdmision:
+    """
+    Limita las llamadas simultáneas a Gemini.
+
+    - Como máximo `max_concurrencia` llamadas en vuelo (semáforo global del proceso).
+    - Como máximo `max_cola` peticiones esperando turno: si la cola está llena, se
+      rechaza al instante en lugar de acumular latencia.
+    - Ninguna espera más de `espera_max_s`: si vence el plazo, se descarta.
+
+    El Retry-After se estima con la duración media de una llamada y el largo de la cola.
+    """
+
+    def __init__(self, max_concurrencia: int, max_cola: int, espera_max_s: float):
+        self.max_concurrencia = max_concurrencia
+        self.max_cola = max_cola
+        self.espera_max_s = espera_max_s
+        self.semaforo = asyncio.Semaphore(max_concurrencia)
+        self.en_vuelo = 0
+        self.en_cola = 0
+        # Media móvil exponencial de la duración de una llamada (segundos)
+        self.duracion_media = 5.0
+
+    def retry_after(self) -> int:
+        turnos = (self.en_cola + 1) / self.max_concurrencia
+        return max(1, math.ceil(turnos * self.duracion_media))
+
+    def _rechazar(self, motivo: str):
+        RECHAZOS.labels(motivo=motivo).inc()
+        logger.warning("Petición rechazada (%s): %d en vuelo, %d en cola", motivo, self.en_vuelo, self.en_cola)
+        raise Saturado(motivo, self.retry_after())
+
+    @asynccontextmanager
+    async def ranura_llm(self):
+        # Se cuenta con los contadores propios y no con semaforo.locked(): una petición
+        # que ya pidió turno pero todavía no lo tomó también ocupa lugar
+        if self.en_vuelo + self.en_cola >= self.max_concurrencia + self.max_cola:
+            self._rechazar("cola_llena")
+
+        inicio = time.perf_counter()
+        self.en_cola += 1
+        LLM_EN_COLA.inc()
+        try:
+            await asyncio.wait_for(self.semaforo.acquire(), timeout=self.espera_max_s)
+        except TimeoutError:
+            self._rechazar("plazo_vencido")
+        finally:
+            self.en_cola -= 1
+            LLM_EN_COLA.dec()
+        observar("cola_llm", time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        self.en_vuelo += 1
+        LLM_EN_VUELO.inc()
+        try:
+            yield
+        finally:
+            self.en_vuelo -= 1
+            LLM_EN_VUELO.dec()
+            self.semaforo.release()
+            self.duracion_media = 0.8 * self.duracion_media + 0.2 * (time.perf_counter() - inicio)
+
+
+class BloqueosPorHilo:
+    """
+    Un candado por thread_id: los turnos de una misma conversación se aplican de a uno
+    y en orden de llegada, sin pisarse en el checkpointer. Los candados se borran
+    cuando nadie los usa (la memoria no crece con el número de conversaciones).
+
+    Es por proceso y no se coordina a través del checkpointer: dos workers que reciben
+    turnos del mismo thread_id pueden intercalarlos aunque compartan el SQLite. Por eso se
+    despliega con un solo worker o con afinidad por thread_id (ver README).
+    """
+
+    def __init__(self, espera_max_s: float):
+        self.espera_max_s = espera_max_s
+        self.bloqueos = {}  # thread_id -> [candado, peticiones que lo usan o esperan]
+
+    @asynccontextmanager
+    async def bloquear(self, thread_id: str):
+        entrada = self.bloqueos.setdefault(thread_id, [asyncio.Lock(), 0])
+        entrada[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entrada[0].acquire(), timeout=self.espera_max_s)
+            except TimeoutError:
+                RECHAZOS.labels(motivo="hilo_ocupado").inc()
+                raise Saturado("hilo_ocupado", max(1, math.ceil(self.espera_max_s / 2)))
+            try:
+                yield
+            finally:
+                entrada[0].release()
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0 and self.bloqueos.get(thread_id) is entrada:
+                del self.bloqueos[thread_id]
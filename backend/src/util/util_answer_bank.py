@@ -0,0 +1,86 @@
+import json
+import logging
+from pathlib import Path
+
+from src.util.util_cache import hash_texto
+from src.util.util_texto import clave_consulta
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerBank:
+    """
+    Banco de respuestas precalculadas para las preguntas frecuentes (opciones rápidas).
+
+    Lo genera data/build_answer_bank.py. Cada entrada guarda el hash del contexto con el
+    que se generó: si la búsqueda de hoy devuelve otros trozos (la base de conocimientos
+    cambió), la entrada se ignora y la pregunta sigue el flujo normal hasta reconstruirla.
+    Si se cargó de un archivo, se vuelve a leer cuando este cambia (las ingestas lo
+    regeneran), sin reiniciar el backend.
+    """
+
+    def __init__(self, entradas: list, ruta: Path = None):
+        self.entradas = {clave_consulta(e["pregunta"]): e for e in entradas}
+        self.ruta = ruta
+        self.mtime = _mtime(ruta)
+        self.hits = 0
+        self.obsoletas = 0
+        self.recargas = 0
+
+    @classmethod
+    def desde_archivo(cls, ruta) -> "AnswerBank":
+        ruta = Path(ruta)
+        banco = cls(_leer_entradas(ruta), ruta)
+        logger.info("Banco de respuestas cargado: %d preguntas.", len(banco.entradas))
+        return banco
+
+    def recargar_si_cambio(self):
+        """Vuelve a leer el archivo si cambió desde la última carga (un stat por consulta)."""
+        if self.ruta is None:
+            return
+        mtime = _mtime(self.ruta)
+        if mtime == self.mtime:
+            return
+        try:
+            entradas = _leer_entradas(self.ruta)
+        except (OSError, ValueError, KeyError) as e:
+            # Se sigue con el banco anterior; se reintenta en la próxima consulta
+            logger.warning("No se pudo recargar el banco de respuestas '%s': %s", self.ruta, e)
+            return
+        self.entradas = {clave_consulta(e["pregunta"]): e for e in entradas}
+        self.mtime = mtime
+        self.recargas += 1
+        logger.info("Banco de respuestas recargado: %d preguntas.", len(self.entradas))
+
+    def buscar(self, pregunta: str, contexto: str):
+        """Respuesta precalculada para la pregunta, o None si no hay o quedó obsoleta."""
+        self.recargar_si_cambio()
+        entrada = self.entradas.get(clave_consulta(pregunta))
+        if entrada is None:
+            return None
+        if entrada["hash_contexto"] != hash_texto(contexto):
+            self.obsoletas += 1
+            return None
+        self.hits += 1
+        return entrada["respuesta"]
+
+    def stats(self) -> dict:
+        return {"preguntas": len(self.entradas), "hits": self.hits, "obsoletas": self.obsoletas,
+                "recargas": self.recargas}
+
+
+def _mtime(ruta):
+    if ruta is None:
+        return None
+    try:
+        return Path(ruta).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _leer_entradas(ruta: Path) -> list:
+    if not ruta.exists():
+        logger.info("No hay banco de respuestas en '%s'.", ruta)
+        return []
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f).get("entradas", [])
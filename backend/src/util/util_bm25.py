@@ -0,0 +1,87 @@
+import heapq
+import json
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from src.util.util_texto import tokenizar
+
+
+def cargar_documentos(rutas: list) -> list:
+    """
+    Lee los JSON que generan los scripts de ingesta (`output_chunks.json` y
+    `output_json_preview.json`). Los archivos que no existan se ignoran.
+    """
+    documentos = []
+    for ruta in rutas:
+        ruta = Path(ruta)
+        if not ruta.exists():
+            continue
+        with open(ruta, "r", encoding="utf-8") as f:
+            documentos.extend(json.load(f))
+    return documentos
+
+
+class BM25Retriever:
+    """
+    Motor de búsqueda BM25 en memoria (índice invertido).
+
+    Expone el mismo método `search(search_text=..., select=..., top=...)` que el
+    SearchClient de Azure, así que puede usarse como reemplazo directo.
+    """
+
+    def __init__(self, documentos: list, k1: float = 1.5, b: float = 0.75):
+        self.documentos = documentos
+        self.k1 = k1
+        self.b = b
+
+        # término -> [(índice del documento, frecuencia del término)]
+        self.postings = defaultdict(list)
+        self.longitudes = []
+
+        for idx, doc in enumerate(documentos):
+            terminos = tokenizar(doc.get("content", ""))
+            self.longitudes.append(len(terminos))
+            for termino, tf in Counter(terminos).items():
+                self.postings[termino].append((idx, tf))
+
+        total = len(documentos)
+        self.longitud_media = (sum(self.longitudes) / total) if total else 0.0
+        self.idf = {
+            termino: math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+            for termino, lista in self.postings.items()
+        }
+
+    @classmethod
+    def from_json_files(cls, rutas: list) -> "BM25Retriever":
+        """
+        Construye el índice a partir de los JSON que generan los scripts de ingesta.
+        """
+        return cls(cargar_documentos(rutas))
+
+    def puntuar(self, search_text: str) -> dict:
+        """
+        Devuelve {índice del documento: puntaje BM25} para la consulta.
+        """
+        puntajes = defaultdict(float)
+        for termino in set(tokenizar(search_text)):
+            lista = self.postings.get(termino)
+            if not lista:
+                continue
+            idf = self.idf[termino]
+            for idx, tf in lista:
+                norma = 1 - self.b + self.b * self.longitudes[idx] / self.longitud_media
+                puntajes[idx] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norma)
+        return puntajes
+
+    def search(self, search_text: str, select: list = None, top: int = 50, **kwargs) -> list:
+        puntajes = self.puntuar(search_text)
+        mejores = heapq.nlargest(top, puntajes.items(), key=lambda par: par[1])
+
+        resultados = []
+        for idx, puntaje in mejores:
+            doc = self.documentos[idx]
+            resultado = {campo: doc.get(campo) for campo in select} if select else dict(doc)
+            resultado["@search.score"] = puntaje
+            resultados.append(resultado)
+        return resultados
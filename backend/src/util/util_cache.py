@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from cachetools import TTLCache
+
+from src.util.util_texto import clave_consulta
+
+logger = logging.getLogger(__name__)
+
+
+def hash_texto(texto: str) -> str:
+    """Hash corto y estable de un texto (para claves de caché)."""
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AnswerCache:
+    """
+    Caché de respuestas del LLM en dos niveles:
+      1. Memoria: LRU con expiración (TTL).
+      2. Disco (opcional): SQLite, sobrevive a reinicios y se comparte entre workers.
+
+    La clave combina la pregunta normalizada y el hash del contexto recuperado.
+    Todas las entradas quedan marcadas con la versión de la base de conocimientos;
+    si la versión cambia, la caché se vacía sola.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, version_fn, disk_path: str = ""):
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.memoria = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.version = version_fn()
+
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+        self.disco = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self.disco = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self.disco.execute("PRAGMA journal_mode=WAL")
+            self.disco.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                " clave TEXT PRIMARY KEY, version TEXT, respuesta TEXT, creado REAL)"
+            )
+            self.disco.execute("DELETE FROM respuestas WHERE version != ?", (self.version,))
+
+    @staticmethod
+    def clave(pregunta: str, contexto: str) -> str:
+        return f"{clave_consulta(pregunta)}|{hash_texto(contexto)}"
+
+    def _verificar_version(self):
+        version = self.version_fn()
+        if version != self.version:
+            logger.info("Base de conocimientos actualizada (%s -> %s): se vacía la caché", self.version, version)
+            self.version = version
+            self.memoria.clear()
+            if self.disco is not None:
+                self.disco.execute("DELETE FROM respuestas WHERE version != ?", (version,))
+
+    def get(self, clave: str):
+        self._verificar_version()
+
+        respuesta = self.memoria.get(clave)
+        if respuesta is not None:
+            self.hits_memoria += 1
+            return respuesta
+
+        if self.disco is not None:
+            fila = self.disco.execute(
+                "SELECT respuesta FROM respuestas WHERE clave = ? AND version = ? AND creado > ?",
+                (clave, self.version, time.time() - self.ttl)
+            ).fetchone()
+            if fila is not None:
+                self.hits_disco += 1
+                self.memoria[clave] = fila[0]
+                return fila[0]
+
+        self.misses += 1
+        return None
+
+    def set(self, clave: str, respuesta: str):
+        self.memoria[clave] = respuesta
+        if self.disco is not None:
+            self.disco.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, version, respuesta, creado) VALUES (?, ?, ?, ?)",
+                (clave, self.version, respuesta, time.time())
+            )
+
+    def stats(self) -> dict:
+        return {
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "entradas_memoria": len(self.memoria),
+            "version": self.version,
+        }
+
+
+class RetrievalCache:
+    """
+    Caché LRU de resultados de búsqueda, acotada por número de entradas y por bytes.
+
+    Se usa desde los hilos del executor de búsquedas, por eso está protegida con un lock.
+    Las entradas quedan marcadas con la versión del índice: tras una re-ingesta se vacía.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, version_fn):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_fn = version_fn
+        self.version = version_fn()
+        self.entradas = OrderedDict()  # clave -> (valor, tamaño en bytes)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _verificar_version(self):
+        version = self.version_fn()
+        if version != self.version:
+            self.version = version
+            self.entradas.clear()
+            self.bytes = 0
+
+    def get(self, clave: str):
+        with self.lock:
+            self._verificar_version()
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[0]
+
+    def set(self, clave: str, valor: str):
+        tamano = len(clave.encode("utf-8")) + len(valor.encode("utf-8"))
+        if tamano > self.max_bytes:
+            return
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self.entradas[clave] = (valor, tamano)
+            self.bytes += tamano
+            # Desalojamos las entradas menos usadas hasta respetar ambos límites
+            while len(self.entradas) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, tamano_viejo) = self.entradas.popitem(last=False)
+                self.bytes -= tamano_viejo
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entradas": len(self.entradas),
+            "bytes": self.bytes,
+            "version": self.version,
+        }
@@ -0,0 +1,441 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+import zstandard
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+# Los blobs más grandes que esto se comprimen con zstd
+_UMBRAL_COMPRESION = 512
+_SUFIJO_ZSTD = "+zstd"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    tipo TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    tipo_metadata TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    valor BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    creado REAL NOT NULL,
+    ultimo_acceso REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS threads_acceso ON threads (ultimo_acceso);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Checkpointer de LangGraph sobre SQLite en modo WAL.
+
+    - Varios workers de uvicorn en el mismo host pueden compartir el archivo (la
+      conversación sobrevive a reinicios), pero no serializa los turnos de un mismo hilo:
+      eso lo hace BloqueosPorHilo dentro de cada proceso.
+    - Cada hilo conserva solo sus últimos `checkpoints_por_thread` checkpoints
+      (cada uno ya contiene el historial completo).
+    - Los hilos caducan por antigüedad (`ttl_s`) o inactividad (`idle_ttl_s`), y si el
+      archivo supera `max_bytes` se desalojan los hilos usados hace más tiempo.
+    - El estado se serializa con msgpack (serializador por defecto de LangGraph) y se
+      comprime con zstd cuando vale la pena.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        ttl_s: int = 7 * 24 * 60 * 60,
+        idle_ttl_s: int = 24 * 60 * 60,
+        max_bytes: int = 256 * 1024 * 1024,
+        checkpoints_por_thread: int = 3,
+        intervalo_limpieza_s: int = 60,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.ttl_s = ttl_s
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = max_bytes
+        self.checkpoints_por_thread = checkpoints_por_thread
+        self.intervalo_limpieza_s = intervalo_limpieza_s
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._ultima_limpieza = 0.0
+        self._compresor = zstandard.ZstdCompressor(level=3)
+        self._descompresor = zstandard.ZstdDecompressor()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Conexión y serialización
+    # ------------------------------------------------------------------
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por proceso: tras un fork la conexión heredada no es válida
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_ESQUEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _dumps(self, valor: Any) -> tuple[str, bytes]:
+        tipo, datos = self.serde.dumps_typed(valor)
+        if len(datos) > _UMBRAL_COMPRESION:
+            return tipo + _SUFIJO_ZSTD, self._compresor.compress(datos)
+        return tipo, datos
+
+    def _loads(self, tipo: str, datos: bytes) -> Any:
+        if tipo.endswith(_SUFIJO_ZSTD):
+            tipo = tipo[: -len(_SUFIJO_ZSTD)]
+            datos = self._descompresor.decompress(datos)
+        return self.serde.loads_typed((tipo, datos))
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _tuple_desde_fila(self, conn, thread_id, checkpoint_ns, fila) -> CheckpointTuple:
+        checkpoint_id, parent_id, tipo, checkpoint, tipo_meta, metadata = fila
+        writes = conn.execute(
+            "SELECT task_id, channel, tipo, valor FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+            " ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self._loads(tipo, checkpoint),
+            metadata=self._loads(tipo_meta, metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self._loads(tipo_v, valor))
+                for task_id, channel, tipo_v, valor in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id: str = config["configurable"]["thread_id"]
+        checkpoint_ns: str = config["configurable"].get("checkpoint_ns", "")
+        columnas = "checkpoint_id, parent_id, tipo, checkpoint, tipo_metadata, metadata"
+
+        with self._lock:
+            conn = self._conexion()
+            if checkpoint_id := get_checkpoint_id(config):
+                fila = conn.execute(
+                    f"SELECT {columnas} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                fila = conn.execute(
+                    f"SELECT {columnas} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if fila is None:
+                return None
+
+            conn.execute(
+                "UPDATE threads SET ultimo_acceso = ? WHERE thread_id = ?",
+                (time.time(), thread_id),
+            )
+            return self._tuple_desde_fila(conn, thread_id, checkpoint_ns, fila)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        condiciones, parametros = [], []
+        if config:
+            condiciones.append("thread_id = ?")
+            parametros.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                condiciones.append("checkpoint_ns = ?")
+                parametros.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                condiciones.append("checkpoint_id = ?")
+                parametros.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            condiciones.append("checkpoint_id < ?")
+            parametros.append(before_id)
+
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with self._lock:
+            conn = self._conexion()
+            filas = conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, tipo, checkpoint,"
+                f" tipo_metadata, metadata FROM checkpoints {where}"
+                " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC",
+                parametros,
+            ).fetchall()
+
+            resultados = []
+            for thread_id, checkpoint_ns, *fila in filas:
+                if limit is not None and len(resultados) >= limit:
+                    break
+                if filter:
+                    metadata = self._loads(fila[4], fila[5])
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                resultados.append(self._tuple_desde_fila(conn, thread_id, checkpoint_ns, fila))
+        yield from resultados
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        parent_id = config["configurable"].get("checkpoint_id")
+
+        tipo, datos = self._dumps(checkpoint)
+        tipo_meta, datos_meta = self._dumps(get_checkpoint_metadata(config, metadata))
+        ahora = time.time()
+
+        with self._lock:
+            conn = self._conexion()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], parent_id,
+                     tipo, datos, tipo_meta, datos_meta),
+                )
+                self._podar_thread(conn, thread_id, checkpoint_ns)
+                conn.execute(
+                    "INSERT INTO threads (thread_id, creado, ultimo_acceso, bytes)"
+                    " VALUES (?, ?, ?, 0)"
+                    " ON CONFLICT(thread_id) DO UPDATE SET ultimo_acceso = excluded.ultimo_acceso",
+                    (thread_id, ahora, ahora),
+                )
+                conn.execute(
+                    "UPDATE threads SET bytes = (SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0)"
+                    " FROM checkpoints WHERE thread_id = ?) WHERE thread_id = ?",
+                    (thread_id, thread_id),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            if ahora - self._ultima_limpieza > self.intervalo_limpieza_s:
+                self._ultima_limpieza = ahora
+                self._limpiar(conn, ahora)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        filas = []
+        for idx, (channel, valor) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            tipo, datos = self._dumps(valor)
+            filas.append((thread_id, checkpoint_ns, checkpoint_id, task_id, idx,
+                          channel, tipo, datos, task_path, idx))
+
+        with self._lock:
+            conn = self._conexion()
+            # Las escrituras especiales (idx < 0) se reemplazan; las normales no se repiten
+            conn.executemany(
+                "INSERT INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) DO UPDATE SET channel = excluded.channel, tipo = excluded.tipo,"
+                " valor = excluded.valor, task_path = excluded.task_path WHERE ? < 0",
+                filas,
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._borrar_threads(self._conexion(), [thread_id])
+
+    # ------------------------------------------------------------------
+    # Desalojo
+    # ------------------------------------------------------------------
+
+    def _podar_thread(self, conn, thread_id: str, checkpoint_ns: str):
+        viejos = conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.checkpoints_por_thread),
+        ).fetchall()
+        for (checkpoint_id,) in viejos:
+            for tabla in ("checkpoints", "writes"):
+                conn.execute(
+                    f"DELETE FROM {tabla} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+
+    def _borrar_threads(self, conn, thread_ids: list):
+        if not thread_ids:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tabla in ("checkpoints", "writes", "threads"):
+                conn.executemany(f"DELETE FROM {tabla} WHERE thread_id = ?", [(t,) for t in thread_ids])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _limpiar(self, conn, ahora: float):
+        """
+        Borra hilos caducados (TTL / inactividad) y, si se supera el tope global de
+        bytes, los menos usados recientemente.
+        """
+        caducados = [
+            fila[0] for fila in conn.execute(
+                "SELECT thread_id FROM threads WHERE creado < ? OR ultimo_acceso < ?",
+                (ahora - self.ttl_s, ahora - self.idle_ttl_s),
+            )
+        ]
+        self._borrar_threads(conn, caducados)
+
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM threads").fetchone()[0]
+        if total > self.max_bytes:
+            desalojar = []
+            for thread_id, tamano in conn.execute(
+                "SELECT thread_id, bytes FROM threads ORDER BY ultimo_acceso"
+            ):
+                if total <= self.max_bytes:
+                    break
+                desalojar.append(thread_id)
+                total -= tamano
+            self._borrar_threads(conn, desalojar)
+
+    def contar_threads(self) -> int:
+        """Número de conversaciones guardadas."""
+        with self._lock:
+            return self._conexion().execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Versiones asíncronas (SQLite local: se ejecutan en un hilo aparte)
+    # ------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        resultados = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in resultados:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        # Mismo formato que InMemorySaver: "<número>.<aleatorio>", ordenable como texto
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
@@ -0,0 +1,273 @@
+import math
+import re
+from collections import Counter
+
+from src.util.util_historial import contar_tokens
+from src.util.util_texto import tokenizar
+
+SEPARADOR_TROZOS = "\n---\n"
+
+# Boilerplate de los documentos curados (ingest_json antepone "Palabras clave: ..." al contenido)
+_LINEA_PALABRAS_CLAVE = re.compile(r"^\s*palabras clave:.*$", re.IGNORECASE | re.MULTILINE)
+_FIN_ORACION = re.compile(r"(?<=[.!?])\s+(?=[\"'¿¡(*A-ZÁÉÍÓÚÑ0-9-])")
+# Filas de tabla: markdown (|) o texto de PDF con columnas separadas por tabuladores / varios espacios
+_COLUMNAS_PDF = re.compile(r"\S(?:\t| {3,})\S")
+# Tablas de los PDF: ingest colapsa los espacios, así que llegan en una sola línea
+# ("Tabla N° 2 Contenido de Hierro ... Sangre de pollo cocida 8.9 Bazo de res 8.6 ...").
+# Una mención en el texto ("según la Tabla N° 3, ...", "(ver Tabla N° 2)") no abre una tabla
+_ENCABEZADO_TABLA = re.compile(
+    r"(?<![Ll]a )(?<![Vv]er )(?<!\()\b(?:Tabla|TABLA)\s+N\s*[°ºo]?\.?\s*\d+\.?(?=\s+[A-ZÁÉÍÓÚÑ(])"
+)
+# La tabla termina en su fuente, en el título de la sección siguiente ("5.3.2 ...") o en un inciso
+_FIN_TABLA = re.compile(r"\s(?=Fuente:|\d+\.\d+\.\d+\.?\s+[A-ZÁÉÍÓÚÑ]|[a-z]\)\s)")
+# Una fila termina en su último valor numérico y la siguiente empieza con el rótulo en mayúscula
+# (o con una viñeta, en las tablas de texto)
+_FIN_FILA = re.compile(r"(?<=\d)\s+(?=[A-ZÁÉÍÓÚÑ])|\s+(?=•)")
+# Listas de los documentos curados (porciones, frecuencias, pasos de una receta): cada ítem
+# es una fila y el rótulo que las presenta ("**Frecuencia de Comidas:**"), su encabezado
+_ITEM_LISTA = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+\S")
+_ROTULO_LISTA = re.compile(r":(?:\*\*)?\s*$")
+
+# BM25 sobre las unidades del propio contexto
+_K1 = 1.2
+_B = 0.75
+# Si dos unidades comparten al menos esta fracción de términos, la segunda se descarta
+_UMBRAL_SOLAPAMIENTO = 0.8
+
+
+class _Unidad:
+    """
+    Una oración, o una tabla o lista (con sus filas / ítems) de un trozo recuperado.
+    Las listas se tratan como tablas: una fila por ítem.
+    """
+
+    def __init__(self, texto: str, trozo: int, posicion: int, nueva_linea: bool, filas: list = None,
+                 con_encabezado: bool = True):
+        self.texto = texto
+        self.trozo = trozo
+        self.posicion = posicion
+        self.nueva_linea = nueva_linea  # empieza un párrafo / viñeta (se une con \n)
+        self.filas = filas
+        self.con_encabezado = con_encabezado  # la primera fila es el encabezado
+        self.es_tabla = filas is not None
+        self.terminos = tokenizar(texto)
+        self.tokens = contar_tokens(texto)
+        self.puntaje = 0.0
+        # Primera línea corta y sin punto final: el título de un documento curado
+        self.es_titulo = (posicion == 0 and not self.es_tabla and self.tokens <= 30
+                          and not texto.rstrip().endswith((".", ":", ";")))
+
+
+def _es_fila_tabla(linea: str) -> bool:
+    return linea.count("|") >= 2 or len(_COLUMNAS_PDF.findall(linea)) >= 2
+
+
+def _tramos(linea: str):
+    """
+    Separa una línea en texto corrido (filas None) y tablas colapsadas de PDF (con sus filas).
+    Si no se distingue ninguna fila después del encabezado, la tabla sigue como texto corrido.
+    """
+    desde = 0
+    while encabezado := _ENCABEZADO_TABLA.search(linea, desde):
+        hasta = len(linea)
+        for fin in (_FIN_TABLA.search(linea, encabezado.end()), _ENCABEZADO_TABLA.search(linea, encabezado.end())):
+            if fin:
+                hasta = min(hasta, fin.start())
+        filas = _FIN_FILA.split(linea[encabezado.end():hasta].strip())
+        if len(filas) < 2:
+            yield linea[desde:hasta].strip(), None
+        else:
+            if linea[desde:encabezado.start()].strip():
+                yield linea[desde:encabezado.start()].strip(), None
+            filas[0] = f"{encabezado.group()} {filas[0]}"
+            yield " ".join(filas), filas
+        desde = hasta
+    if linea[desde:].strip():
+        yield linea[desde:].strip(), None
+
+
+def _dividir(trozo: str, indice: int) -> list:
+    """
+    Divide un trozo en oraciones. Las filas de una misma tabla, y los ítems de una misma lista
+    con el rótulo que la presenta, quedan en una sola unidad.
+    """
+    unidades = []
+    tabla = []
+    lista = []
+    rotulo = None  # línea "...:" que puede presentar la lista siguiente
+
+    def cerrar_tabla():
+        if tabla:
+            unidades.append(_Unidad("\n".join(tabla), indice, len(unidades), True, filas=list(tabla)))
+            tabla.clear()
+
+    def cerrar_lista():
+        nonlocal rotulo
+        if lista:
+            filas = [rotulo, *lista] if rotulo else list(lista)
+            unidades.append(_Unidad("\n".join(filas), indice, len(unidades), True, filas=filas,
+                                    con_encabezado=rotulo is not None))
+            lista.clear()
+        elif rotulo:
+            unidades.append(_Unidad(rotulo, indice, len(unidades), True))
+        rotulo = None
+
+    for linea in trozo.splitlines():
+        if not linea.strip():
+            cerrar_tabla()
+            cerrar_lista()
+            continue
+        if _es_fila_tabla(linea):
+            cerrar_lista()
+            tabla.append(linea.rstrip())
+            continue
+        cerrar_tabla()
+        if _ITEM_LISTA.match(linea):
+            lista.append(linea.strip())
+            continue
+        cerrar_lista()
+        if _ROTULO_LISTA.search(linea):
+            rotulo = linea.strip()
+            continue
+        for texto, filas in _tramos(linea.strip()):
+            if filas is not None:
+                unidades.append(_Unidad(texto, indice, len(unidades), True, filas=filas))
+                continue
+            for i, oracion in enumerate(_FIN_ORACION.split(texto)):
+                if oracion:
+                    # Cada tramo de texto (p. ej. lo que sigue a una tabla) empieza párrafo aparte
+                    unidades.append(_Unidad(oracion, indice, len(unidades), nueva_linea=(i == 0)))
+    cerrar_tabla()
+    cerrar_lista()
+    return unidades
+
+
+def _puntuar(unidades: list, terminos_consulta: list):
+    """BM25 de cada unidad contra la consulta, con IDF calculado sobre las propias unidades."""
+    n = len(unidades)
+    largo_medio = sum(len(u.terminos) for u in unidades) / n or 1
+    df = Counter(t for u in unidades for t in set(u.terminos))
+    consulta = set(terminos_consulta)
+    for u in unidades:
+        frecuencias = Counter(u.terminos)
+        norma = _K1 * (1 - _B + _B * len(u.terminos) / largo_medio)
+        u.puntaje = sum(
+            math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) * frecuencias[t] * (_K1 + 1) / (frecuencias[t] + norma)
+            for t in consulta if t in frecuencias
+        )
+
+
+def _solapa(unidad: _Unidad, elegidas: list) -> bool:
+    terminos = set(unidad.terminos)
+    if not terminos:
+        return False
+    return any(len(terminos & set(e.terminos)) / len(terminos) >= _UMBRAL_SOLAPAMIENTO for e in elegidas)
+
+
+def _recortar_tabla(tabla: _Unidad, disponible: int, terminos_consulta: list):
+    """
+    Versión de `tabla` (o lista) que entra en `disponible` tokens: el encabezado y las filas
+    que más términos comparten con la consulta, siempre enteras y en su orden original.
+    None si no entra ni el encabezado con una fila.
+    """
+    consulta = set(terminos_consulta)
+    separador = "\n" if "\n" in tabla.texto else " "
+    fijas = [0] if tabla.con_encabezado else []
+    prioridad = sorted(
+        range(len(fijas), len(tabla.filas)),
+        key=lambda i: (-len(consulta & set(tokenizar(tabla.filas[i]))), i)
+    )
+    quedan = fijas
+    for i in prioridad:
+        prueba = sorted(quedan + [i])
+        if contar_tokens(separador.join(tabla.filas[j] for j in prueba)) <= disponible:
+            quedan = prueba
+    if len(quedan) == len(fijas):
+        return None
+    filas = [tabla.filas[j] for j in quedan]
+    recortada = _Unidad(separador.join(filas), tabla.trozo, tabla.posicion, tabla.nueva_linea, filas=filas,
+                        con_encabezado=tabla.con_encabezado)
+    recortada.puntaje = tabla.puntaje
+    return recortada
+
+
+def _elegir(candidatas: list, presupuesto_tokens: int, exigir_relevancia: bool, terminos_consulta: list) -> list:
+    elegidas = []
+    usados = 0
+
+    def agregar(u) -> bool:
+        nonlocal usados
+        if (u.trozo, u.posicion) in {(e.trozo, e.posicion) for e in elegidas} or _solapa(u, elegidas):
+            return False
+        if usados + u.tokens > presupuesto_tokens:
+            # Una tabla o lista que no entra se recorta por filas enteras en vez de perderla
+            u = _recortar_tabla(u, presupuesto_tokens - usados, terminos_consulta) if u.es_tabla else None
+            if u is None:
+                return False
+        elegidas.append(u)
+        usados += u.tokens
+        return True
+
+    for u in candidatas:
+        if exigir_relevancia and not u.es_titulo and u.puntaje <= 0:
+            continue
+        agregar(u)
+
+    # Con el presupuesto que sobre, las oraciones vecinas de las elegidas (mantienen
+    # el hilo de una lista o de una explicación que sigue en la oración siguiente)
+    posiciones = {(u.trozo, u.posicion) for u in elegidas if not u.es_titulo}
+    for u in candidatas:
+        if (u.trozo, u.posicion - 1) in posiciones or (u.trozo, u.posicion + 1) in posiciones:
+            agregar(u)
+    return elegidas
+
+
+def comprimir_contexto(contexto: str, consulta: str, presupuesto_tokens: int) -> str:
+    """
+    Reduce el contexto recuperado a lo que importa para la consulta:
+
+    1. Quita el boilerplate de palabras clave de los documentos curados.
+    2. Divide cada trozo en oraciones. Las tablas (filas con columnas o, en el texto colapsado
+       de los PDF, desde "Tabla N° ..." hasta su fuente) y las listas (con su rótulo "...:")
+       son una sola unidad; si no entran en el presupuesto se recortan por filas o ítems
+       enteros, nunca a mitad de uno.
+    3. Puntúa cada unidad contra la consulta (BM25 local, sin llamadas externas).
+    4. Elige de mayor a menor puntaje, saltando las que repiten otra ya elegida (los trozos
+       de PDF se solapan) y las que no comparten ningún término con la consulta, hasta
+       llenar `presupuesto_tokens`; lo que sobre se usa en las oraciones vecinas de las
+       elegidas. Los títulos de los documentos curados se conservan.
+       Si ninguna oración comparte términos con la consulta, se llena en orden de ranking.
+    5. Devuelve lo elegido en el orden original, con los trozos separados como antes.
+    """
+    trozos = [_LINEA_PALABRAS_CLAVE.sub("", t).strip() for t in contexto.split(SEPARADOR_TROZOS)]
+    unidades = [u for i, t in enumerate(trozos) for u in _dividir(t, i)]
+    if not unidades:
+        return contexto
+
+    terminos_consulta = tokenizar(consulta)
+    _puntuar(unidades, terminos_consulta)
+
+    # Títulos primero (cortos y dan contexto a lo demás); luego por puntaje, desempatando
+    # a favor del trozo mejor rankeado por la búsqueda
+    candidatas = sorted(
+        unidades,
+        key=lambda u: (not u.es_titulo, -u.puntaje, u.trozo, u.posicion)
+    )
+    elegidas = _elegir(candidatas, presupuesto_tokens, exigir_relevancia=True,
+                       terminos_consulta=terminos_consulta)
+    if all(u.es_titulo for u in elegidas):
+        elegidas = _elegir(candidatas, presupuesto_tokens, exigir_relevancia=False,
+                           terminos_consulta=terminos_consulta)
+
+    salida = []
+    for i in range(len(trozos)):
+        partes = sorted((u for u in elegidas if u.trozo == i), key=lambda u: u.posicion)
+        if all(u.es_titulo for u in partes):
+            # Del trozo solo quedó el título: no aporta información
+            continue
+        texto = partes[0].texto
+        for anterior, u in zip(partes, partes[1:]):
+            contigua = u.posicion == anterior.posicion + 1 and not (u.nueva_linea or u.es_tabla)
+            texto += (" " if contigua else "\n") + u.texto
+        salida.append(texto)
+    return SEPARADOR_TROZOS.join(salida) if salida else contexto
@@ -0,0 +1,254 @@
+import logging
+import math
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from src.util.util_texto import tokenizar
+
+logger = logging.getLogger(__name__)
+
+
+def _pesos_tfidf(terminos: list, vocabulario: dict, idf: np.ndarray) -> tuple:
+    """
+    Vector TF-IDF disperso (columnas, pesos) normalizado a norma 1.
+    TF sublineal: 1 + log(tf), para que un término repetido no domine el trozo.
+    """
+    columnas, pesos = [], []
+    for termino, tf in Counter(terminos).items():
+        col = vocabulario.get(termino)
+        if col is None:
+            continue
+        columnas.append(col)
+        pesos.append((1 + math.log(tf)) * idf[col])
+    columnas = np.asarray(columnas, dtype=np.int64)
+    pesos = np.asarray(pesos, dtype=np.float32)
+    norma = np.linalg.norm(pesos)
+    if norma > 0:
+        pesos /= norma
+    return columnas, pesos
+
+
+def construir_indice_lsa(documentos: list, dimensiones: int = 128, min_df: int = 2,
+                         max_terminos: int = 50000, semilla: int = 42) -> dict:
+    """
+    Construye un índice denso LSA (TF-IDF + SVD truncada) sobre el campo "content".
+
+    La matriz TF-IDF se guarda dispersa (coordenadas) y la SVD se calcula de forma
+    aleatorizada, así no hace falta materializar la matriz documentos x términos.
+    Devuelve los arreglos que guarda `guardar_indice`.
+    """
+    terminos_por_doc = [tokenizar(doc.get("content", "")) for doc in documentos]
+
+    df = Counter()
+    for terminos in terminos_por_doc:
+        df.update(set(terminos))
+    elegidos = [t for t, n in df.most_common(max_terminos) if n >= min_df] or list(df)
+    elegidos.sort()
+    vocabulario = {termino: col for col, termino in enumerate(elegidos)}
+
+    total = len(documentos)
+    idf = np.array(
+        [math.log((1 + total) / (1 + df[t])) + 1 for t in elegidos],
+        dtype=np.float32
+    )
+
+    filas, columnas, valores = [], [], []
+    for fila, terminos in enumerate(terminos_por_doc):
+        cols, pesos = _pesos_tfidf(terminos, vocabulario, idf)
+        filas.append(np.full(len(cols), fila, dtype=np.int64))
+        columnas.append(cols)
+        valores.append(pesos)
+    filas = np.concatenate(filas) if filas else np.zeros(0, dtype=np.int64)
+    columnas = np.concatenate(columnas) if columnas else np.zeros(0, dtype=np.int64)
+    valores = np.concatenate(valores) if valores else np.zeros(0, dtype=np.float32)
+
+    num_terminos = len(elegidos)
+
+    def x_por(m):   # X @ m      (documentos x k)
+        salida = np.zeros((total, m.shape[1]), dtype=np.float32)
+        np.add.at(salida, filas, valores[:, None] * m[columnas])
+        return salida
+
+    def xt_por(m):  # X.T @ m    (términos x k)
+        salida = np.zeros((num_terminos, m.shape[1]), dtype=np.float32)
+        np.add.at(salida, columnas, valores[:, None] * m[filas])
+        return salida
+
+    k = max(1, min(dimensiones, total - 1, num_terminos - 1))
+    rng = np.random.default_rng(semilla)
+    omega = rng.standard_normal((num_terminos, k + 10)).astype(np.float32)
+
+    # SVD aleatorizada (Halko et al.) con dos iteraciones de potencia
+    q, _ = np.linalg.qr(x_por(omega))
+    for _ in range(2):
+        q, _ = np.linalg.qr(xt_por(q))
+        q, _ = np.linalg.qr(x_por(q))
+    b = xt_por(q).T                     # (k + 10) x términos
+    _, _, vt = np.linalg.svd(b, full_matrices=False)
+    proyeccion = np.ascontiguousarray(vt[:k].T, dtype=np.float32)   # términos x k
+
+    matriz = x_por(proyeccion)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    matriz /= np.where(normas > 0, normas, 1)
+
+    return {
+        "ids": np.array([str(doc.get("id", i)) for i, doc in enumerate(documentos)]),
+        "vocabulario": np.array(elegidos),
+        "idf": idf,
+        "proyeccion": proyeccion,
+        "matriz": np.ascontiguousarray(matriz, dtype=np.float32),
+    }
+
+
+def cuantizar_int8(matriz: np.ndarray) -> tuple:
+    """Cuantización simétrica por fila: matriz ≈ int8 * escala."""
+    escalas = np.abs(matriz).max(axis=1) / 127
+    escalas[escalas == 0] = 1
+    cuantizada = np.round(matriz / escalas[:, None]).astype(np.int8)
+    return cuantizada, escalas.astype(np.float32)
+
+
+def guardar_indice(indice: dict, ruta, int8: bool = False):
+    """Guarda el índice en un .npz (sin pickle). Con `int8=True` la matriz ocupa 4 veces menos."""
+    arreglos = dict(indice)
+    if int8:
+        arreglos["matriz"], arreglos["escalas"] = cuantizar_int8(indice["matriz"])
+    ruta = Path(ruta)
+    tmp = ruta.with_suffix(".tmp.npz")
+    np.savez(tmp, **arreglos)
+    tmp.replace(ruta)
+
+
+class IndiceDenso:
+    """
+    Índice denso en memoria: una matriz contigua (documentos x dimensiones) de float32
+    (o int8 + escala por fila) con los vectores normalizados. Una consulta es un
+    producto matriz-vector y un top-k parcial (argpartition).
+    """
+
+    def __init__(self, ids, vocabulario, idf, proyeccion, matriz, escalas=None):
+        self.ids = [str(i) for i in ids]
+        self.vocabulario = {str(t): col for col, t in enumerate(vocabulario)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.proyeccion = np.ascontiguousarray(proyeccion, dtype=np.float32)
+        self.matriz = np.ascontiguousarray(matriz)
+        self.escalas = None if escalas is None else np.asarray(escalas, dtype=np.float32)
+
+    @classmethod
+    def desde_documentos(cls, documentos: list, dimensiones: int = 128) -> "IndiceDenso":
+        return cls(**construir_indice_lsa(documentos, dimensiones=dimensiones))
+
+    @classmethod
+    def desde_archivo(cls, ruta) -> "IndiceDenso":
+        with np.load(ruta, allow_pickle=False) as datos:
+            return cls(**{nombre: datos[nombre] for nombre in datos.files})
+
+    @property
+    def dimensiones(self) -> int:
+        return self.proyeccion.shape[1]
+
+    def vectorizar(self, textos: list) -> np.ndarray:
+        """Proyecta las consultas al espacio LSA (una fila normalizada por consulta)."""
+        vectores = np.zeros((len(textos), self.dimensiones), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            columnas, pesos = _pesos_tfidf(tokenizar(texto), self.vocabulario, self.idf)
+            if len(columnas):
+                vectores[fila] = pesos @ self.proyeccion[columnas]
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        return vectores / np.where(normas > 0, normas, 1)
+
+    def puntuar_lote(self, textos: list, top: int = 50) -> list:
+        """
+        Top-k por similitud coseno para varias consultas a la vez (un solo producto
+        matriz-matriz). Devuelve, por consulta, [(índice del documento, similitud)].
+        """
+        if not self.ids:
+            return [[] for _ in textos]
+        consultas = self.vectorizar(textos)
+        if self.escalas is None:
+            similitudes = consultas @ self.matriz.T
+        else:
+            similitudes = (consultas @ self.matriz.T) * self.escalas
+
+        top = min(top, len(self.ids))
+        resultados = []
+        for fila, vector in zip(similitudes, consultas):
+            if not vector.any():
+                # Ningún término de la consulta está en el vocabulario
+                resultados.append([])
+                continue
+            mejores = np.argpartition(-fila, top - 1)[:top]
+            mejores = mejores[np.argsort(-fila[mejores])]
+            resultados.append([(int(i), float(fila[i])) for i in mejores])
+        return resultados
+
+    def puntuar(self, texto: str, top: int = 50) -> list:
+        return self.puntuar_lote([texto], top=top)[0]
+
+
+def fusion_rrf(rankings: list, k: int = 60) -> list:
+    """
+    Reciprocal Rank Fusion: cada lista aporta 1 / (k + posición) a cada clave.
+    Devuelve [(clave, puntaje)] de mayor a menor.
+    """
+    puntajes = {}
+    for ranking in rankings:
+        for posicion, clave in enumerate(ranking, start=1):
+            puntajes[clave] = puntajes.get(clave, 0.0) + 1 / (k + posicion)
+    return sorted(puntajes.items(), key=lambda par: par[1], reverse=True)
+
+
+class HybridRetriever:
+    """
+    Búsqueda híbrida: combina el ranking por palabras clave (BM25 local o Azure AI
+    Search) con el ranking denso LSA mediante RRF.
+
+    Expone el mismo método `search(search_text=..., select=..., top=...)` que el
+    SearchClient de Azure, así que puede usarse como reemplazo directo.
+    """
+
+    def __init__(self, cliente_palabras, indice: IndiceDenso, documentos: list,
+                 k_rrf: int = 60, candidatos: int = 20):
+        self.cliente_palabras = cliente_palabras
+        self.indice = indice
+        self.documentos = {str(doc.get("id")): doc for doc in documentos}
+        self.k_rrf = k_rrf
+        self.candidatos = candidatos
+
+    def search(self, search_text: str, select: list = None, top: int = 50, **kwargs) -> list:
+        candidatos = max(top, self.candidatos)
+
+        por_palabras = {}
+        for resultado in self.cliente_palabras.search(
+            search_text=search_text, select=["id", "content"], top=candidatos
+        ):
+            por_palabras[str(resultado["id"])] = resultado
+
+        densos = [self.indice.ids[i] for i, _ in self.indice.puntuar(search_text, top=candidatos)]
+
+        resultados = []
+        for doc_id, puntaje in fusion_rrf([list(por_palabras), densos], k=self.k_rrf)[:top]:
+            doc = self.documentos.get(doc_id) or por_palabras.get(doc_id)
+            if doc is None:
+                continue
+            resultado = {campo: doc.get(campo) for campo in select} if select else dict(doc)
+            resultado["@search.score"] = puntaje
+            resultados.append(resultado)
+        return resultados
+
+
+def cargar_indice_denso(ruta, documentos: list, dimensiones: int = 128) -> IndiceDenso:
+    """
+    Usa el índice denso que generan los scripts de ingesta; si no existe o no
+    corresponde a los documentos actuales, lo construye en memoria.
+    """
+    if Path(ruta).exists():
+        indice = IndiceDenso.desde_archivo(ruta)
+        if sorted(indice.ids) == sorted(str(doc.get("id")) for doc in documentos):
+            return indice
+        logger.warning(
+            "El índice denso '%s' no corresponde a los documentos; se reconstruye en memoria.", ruta
+        )
+    return IndiceDenso.desde_documentos(documentos, dimensiones=dimensiones)
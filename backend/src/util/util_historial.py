@@ -0,0 +1,98 @@
+import math
+import re
+
+from langchain_core.messages import HumanMessage, RemoveMessage
+
+# Aproximación estándar para español/inglés: ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+_FIN_ORACION = re.compile(r"(?<=[.!?])\s")
+
+
+def contar_tokens(texto) -> int:
+    """
+    Estimación local del número de tokens de un texto (sin llamar a la API).
+    """
+    if not isinstance(texto, str):
+        texto = str(texto)
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def contar_tokens_mensajes(mensajes: list) -> int:
+    return sum(contar_tokens(m.content) for m in mensajes)
+
+
+def _agrupar_turnos(mensajes: list) -> list:
+    """
+    Agrupa el historial en turnos: un mensaje del usuario y las respuestas que le siguen.
+    """
+    turnos = []
+    for mensaje in mensajes:
+        if isinstance(mensaje, HumanMessage) or not turnos:
+            turnos.append([mensaje])
+        else:
+            turnos[-1].append(mensaje)
+    return turnos
+
+
+def _primera_oracion(texto, max_chars: int) -> str:
+    texto = " ".join(str(texto).split())
+    oracion = _FIN_ORACION.split(texto, maxsplit=1)[0]
+    if len(oracion) > max_chars:
+        oracion = oracion[:max_chars].rstrip() + "…"
+    return oracion
+
+
+def _resumir_turno(turno: list) -> str:
+    partes = []
+    for mensaje in turno:
+        autor = "Usuario" if isinstance(mensaje, HumanMessage) else "ANMI"
+        partes.append(f"{autor}: {_primera_oracion(mensaje.content, 160)}")
+    return "- " + " / ".join(partes)
+
+
+def gestionar_historial(
+    mensajes: list,
+    resumen: str,
+    max_turnos: int,
+    presupuesto_tokens: int,
+    presupuesto_resumen: int,
+) -> dict:
+    """
+    Decide qué parte del historial va literal al prompt y cuál se pliega en el resumen.
+
+    Conserva los últimos `max_turnos` turnos mientras quepan en `presupuesto_tokens`
+    (el turno actual siempre se conserva). Los turnos más antiguos se resumen de forma
+    extractiva (primera oración de cada mensaje) y se añaden al resumen acumulado, que
+    se recorta a `presupuesto_resumen` tokens quedándose con lo más reciente.
+
+    Devuelve:
+      - "ventana": mensajes que van literales al prompt
+      - "resumen": resumen acumulado actualizado
+      - "eliminar": RemoveMessage de los mensajes plegados (para sacarlos del estado)
+    """
+    turnos = _agrupar_turnos(mensajes)
+
+    conservados = []
+    tokens = 0
+    for turno in reversed(turnos):
+        tokens_turno = contar_tokens_mensajes(turno)
+        if conservados and (len(conservados) >= max_turnos or tokens + tokens_turno > presupuesto_tokens):
+            break
+        conservados.insert(0, turno)
+        tokens += tokens_turno
+
+    plegados = turnos[: len(turnos) - len(conservados)]
+    if plegados:
+        lineas = [linea for linea in resumen.splitlines() if linea]
+        lineas.extend(_resumir_turno(turno) for turno in plegados)
+        # Recortamos desde lo más antiguo hasta respetar el presupuesto del resumen
+        while len(lineas) > 1 and contar_tokens("\n".join(lineas)) > presupuesto_resumen:
+            lineas.pop(0)
+        resumen = "\n".join(lineas)
+
+    return {
+        "ventana": [m for turno in conservados for m in turno],
+        "resumen": resumen,
+        "eliminar": [RemoveMessage(id=m.id) for turno in plegados for m in turno if m.id],
+    }
@@ -0,0 +1,331 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from src.util.util_denso import IndiceDenso, cuantizar_int8, fusion_rrf
+from src.util.util_texto import tokenizar
+
+logger = logging.getLogger(__name__)
+
+# Formato (little-endian):
+#   cabecera   MAGIA, versión, nº de documentos, nº de términos, nº de secciones
+#   tabla      por sección: nombre (16 bytes), offset, largo
+#   secciones  alineadas a 8 bytes; arreglos empaquetados que se leen con np.frombuffer
+#              directamente sobre el mmap (sin copiar) y cadenas con prefijo de largo (u32)
+MAGIA = b"ANMIKIDX"
+VERSION = 1
+_CABECERA = struct.Struct("<8sIIII")
+_SECCION = struct.Struct("<16sQQ")
+_LARGO = struct.Struct("<I")
+
+# Mismos parámetros que BM25Retriever: los resultados coinciden con RETRIEVER_BACKEND=bm25
+K1 = 1.5
+B = 0.75
+
+
+# ==========================================
+# ESCRITURA (la usan los scripts de ingesta)
+# ==========================================
+
+def _cadenas(textos: list) -> tuple:
+    """Cadenas UTF-8 con prefijo de largo, más el offset de cada una (acceso directo)."""
+    partes, offsets, posicion = [], [], 0
+    for texto in textos:
+        datos = texto.encode("utf-8")
+        offsets.append(posicion)
+        partes.append(_LARGO.pack(len(datos)) + datos)
+        posicion += _LARGO.size + len(datos)
+    return b"".join(partes), np.array(offsets, dtype=np.uint64)
+
+
+def escribir_indice_binario(documentos: list, ruta, indice_denso: dict = None,
+                            int8: bool = False, fuentes: list = None) -> dict:
+    """
+    Escribe el índice local en formato binario: textos, metadatos de documento y página,
+    listas de postings para BM25 y, opcionalmente, la matriz densa LSA (búsqueda híbrida).
+
+    Se escribe en un archivo temporal y se reemplaza con os.replace: los procesos que
+    tienen abierto el índice anterior lo siguen leyendo hasta que recargan.
+    """
+    titulos = sorted({str(doc.get("title") or "") for doc in documentos})
+    indice_titulo = {t: i for i, t in enumerate(titulos)}
+
+    postings = {}
+    longitudes = []
+    for idx, doc in enumerate(documentos):
+        terminos = tokenizar(doc.get("content", ""))
+        longitudes.append(len(terminos))
+        for termino, tf in Counter(terminos).items():
+            postings.setdefault(termino, []).append((idx, tf))
+    vocabulario = sorted(postings)
+    total = len(documentos)
+
+    post_ini = np.zeros(len(vocabulario) + 1, dtype=np.uint64)
+    post_doc, post_tf = [], []
+    for t, termino in enumerate(vocabulario):
+        for idx, tf in postings[termino]:
+            post_doc.append(idx)
+            post_tf.append(tf)
+        post_ini[t + 1] = len(post_doc)
+    df = np.diff(post_ini).astype(np.float64)
+    idf = np.log(1 + (total - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    meta = {
+        "creado": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fuentes": [str(f) for f in fuentes or []],
+        "k1": K1,
+        "b": B,
+        "longitud_media": (sum(longitudes) / total) if total else 0.0,
+    }
+
+    secciones = {}
+    secciones["textos"], secciones["textos_off"] = _cadenas([doc.get("content", "") for doc in documentos])
+    secciones["ids"], secciones["ids_off"] = _cadenas([str(doc.get("id", i)) for i, doc in enumerate(documentos)])
+    secciones["titulos"], secciones["titulos_off"] = _cadenas(titulos)
+    secciones["doc_titulo"] = np.array([indice_titulo[str(doc.get("title") or "")] for doc in documentos], dtype=np.uint32)
+    secciones["paginas"] = np.array([int(doc.get("page") or 0) for doc in documentos], dtype=np.uint32)
+    secciones["trozos"] = np.array([int(doc.get("chunk_index", -1)) for doc in documentos], dtype=np.int32)
+    secciones["longitudes"] = np.array(longitudes, dtype=np.uint32)
+    secciones["vocab"], secciones["vocab_off"] = _cadenas(vocabulario)
+    secciones["idf"] = idf
+    secciones["post_ini"] = post_ini
+    secciones["post_doc"] = np.array(post_doc, dtype=np.uint32)
+    secciones["post_tf"] = np.array(post_tf, dtype=np.uint32)
+
+    if indice_denso is not None:
+        # Filas de la matriz en el mismo orden que los documentos
+        fila_de = {str(i): f for f, i in enumerate(indice_denso["ids"])}
+        filas = [fila_de[str(doc.get("id", i))] for i, doc in enumerate(documentos)]
+        matriz = np.ascontiguousarray(indice_denso["matriz"][filas], dtype=np.float32)
+        if int8:
+            matriz, secciones["d_escalas"] = cuantizar_int8(matriz)
+        secciones["d_matriz"] = matriz
+        secciones["d_vocab"], secciones["d_vocab_off"] = _cadenas([str(t) for t in indice_denso["vocabulario"]])
+        secciones["d_idf"] = np.asarray(indice_denso["idf"], dtype=np.float32)
+        secciones["d_proy"] = np.ascontiguousarray(indice_denso["proyeccion"], dtype=np.float32)
+        meta["densa"] = {
+            "dimensiones": int(indice_denso["proyeccion"].shape[1]),
+            "terminos": int(indice_denso["proyeccion"].shape[0]),
+            "dtype": "int8" if int8 else "float32",
+        }
+    secciones["meta"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    ruta = Path(ruta)
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    inicio_datos = _CABECERA.size + _SECCION.size * len(secciones)
+    with open(tmp, "wb") as f:
+        f.write(_CABECERA.pack(MAGIA, VERSION, total, len(vocabulario), len(secciones)))
+        tabla, posicion = [], inicio_datos
+        for nombre, datos in secciones.items():
+            datos = datos if isinstance(datos, bytes) else datos.tobytes()
+            posicion += -posicion % 8
+            tabla.append((nombre, posicion, datos))
+            posicion += len(datos)
+        for nombre, offset, datos in tabla:
+            f.write(_SECCION.pack(nombre.encode("ascii"), offset, len(datos)))
+        for _, offset, datos in tabla:
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+    return {"documentos": total, "terminos": len(vocabulario), "postings": len(post_doc),
+            "bytes": ruta.stat().st_size, "densa": "densa" in meta}
+
+
+# ==========================================
+# LECTURA (backend, vía mmap)
+# ==========================================
+
+class _Cadenas:
+    """Secuencia de cadenas con prefijo de largo dentro del mmap (sirve para bisect)."""
+
+    def __init__(self, buffer, offsets: np.ndarray):
+        self.buffer = buffer  # la sección (los offsets son relativos a ella)
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> str:
+        inicio = int(self.offsets[i])
+        (largo,) = _LARGO.unpack_from(self.buffer, inicio)
+        inicio += _LARGO.size
+        return bytes(self.buffer[inicio:inicio + largo]).decode("utf-8")
+
+
+class IndiceMmap:
+    """
+    Índice binario abierto con mmap. Los arreglos son vistas de solo lectura sobre el
+    archivo: abrirlo no lee nada del disco por adelantado y, con varios workers de
+    uvicorn, todos comparten las mismas páginas en la caché del sistema operativo.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        with open(self.ruta, "rb") as f:
+            self.firma = _firma(os.fstat(f.fileno()))
+            self.mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = self.buffer = memoryview(self.mapa)
+
+        magia, version, self.total, self.n_terminos, n_secciones = _CABECERA.unpack_from(buffer, 0)
+        if magia != MAGIA:
+            raise ValueError(f"'{ruta}' no es un índice binario de ANMI")
+        if version != VERSION:
+            raise ValueError(f"'{ruta}' tiene la versión {version} del formato (se esperaba {VERSION})")
+
+        self.secciones = {}
+        for i in range(n_secciones):
+            nombre, offset, largo = _SECCION.unpack_from(buffer, _CABECERA.size + i * _SECCION.size)
+            self.secciones[nombre.rstrip(b"\0").decode("ascii")] = (offset, largo)
+
+        self.meta = json.loads(bytes(self._bytes("meta")).decode("utf-8"))
+        self.textos = _Cadenas(self._bytes("textos"), self._arreglo("textos_off", np.uint64))
+        self.ids = _Cadenas(self._bytes("ids"), self._arreglo("ids_off", np.uint64))
+        self.titulos = _Cadenas(self._bytes("titulos"), self._arreglo("titulos_off", np.uint64))
+        self.vocabulario = _Cadenas(self._bytes("vocab"), self._arreglo("vocab_off", np.uint64))
+        self.doc_titulo = self._arreglo("doc_titulo", np.uint32)
+        self.paginas = self._arreglo("paginas", np.uint32)
+        self.trozos = self._arreglo("trozos", np.int32)
+        self.longitudes = self._arreglo("longitudes", np.uint32)
+        self.idf = self._arreglo("idf", np.float32)
+        self.post_ini = self._arreglo("post_ini", np.uint64)
+        self.post_doc = self._arreglo("post_doc", np.uint32)
+        self.post_tf = self._arreglo("post_tf", np.uint32)
+        self._denso = None
+
+    def _bytes(self, nombre: str):
+        offset, largo = self.secciones[nombre]
+        return self.buffer[offset:offset + largo]
+
+    def _arreglo(self, nombre: str, dtype) -> np.ndarray:
+        return np.frombuffer(self._bytes(nombre), dtype=dtype)
+
+    def documento(self, idx: int) -> dict:
+        trozo = int(self.trozos[idx])
+        doc = {
+            "id": self.ids[idx],
+            "content": self.textos[idx],
+            "title": self.titulos[int(self.doc_titulo[idx])],
+            "page": int(self.paginas[idx]),
+        }
+        if trozo >= 0:
+            doc["chunk_index"] = trozo
+        return doc
+
+    def termino(self, termino: str) -> int:
+        """Posición del término en el vocabulario (búsqueda binaria sobre el mmap), o -1."""
+        pos = bisect.bisect_left(self.vocabulario, termino)
+        if pos < len(self.vocabulario) and self.vocabulario[pos] == termino:
+            return pos
+        return -1
+
+    def puntuar(self, search_text: str) -> np.ndarray:
+        """Puntaje BM25 de cada documento para la consulta."""
+        puntajes = np.zeros(self.total, dtype=np.float32)
+        normas = K1 * (1 - B + B * self.longitudes / (self.meta["longitud_media"] or 1))
+        for termino in set(tokenizar(search_text)):
+            t = self.termino(termino)
+            if t < 0:
+                continue
+            ini, fin = int(self.post_ini[t]), int(self.post_ini[t + 1])
+            docs = self.post_doc[ini:fin]
+            tf = self.post_tf[ini:fin].astype(np.float32)
+            puntajes[docs] += self.idf[t] * tf * (K1 + 1) / (tf + normas[docs])
+        return puntajes
+
+    def indice_denso(self):
+        """IndiceDenso sobre la matriz del archivo (sin copiarla), o None si no la incluye."""
+        densa = self.meta.get("densa")
+        if densa is None:
+            return None
+        if self._denso is None:
+            vocab = _Cadenas(self._bytes("d_vocab"), self._arreglo("d_vocab_off", np.uint64))
+            dtype = np.int8 if densa["dtype"] == "int8" else np.float32
+            self._denso = IndiceDenso(
+                ids=[self.ids[i] for i in range(self.total)],
+                vocabulario=[vocab[i] for i in range(len(vocab))],
+                idf=self._arreglo("d_idf", np.float32),
+                proyeccion=self._arreglo("d_proy", np.float32).reshape(densa["terminos"], densa["dimensiones"]),
+                matriz=self._arreglo("d_matriz", dtype).reshape(self.total, densa["dimensiones"]),
+                escalas=self._arreglo("d_escalas", np.float32) if "d_escalas" in self.secciones else None,
+            )
+        return self._denso
+
+
+def _firma(st) -> tuple:
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class MmapRetriever:
+    """
+    Búsqueda sobre el índice binario: BM25 con las listas de postings y, si el archivo
+    trae la matriz densa, fusión RRF con el ranking LSA (como HybridRetriever).
+
+    Cuando los scripts de ingesta reemplazan el archivo, la siguiente búsqueda (como
+    mucho una comprobación por `recarga_s`) abre el nuevo; las búsquedas en curso
+    terminan sobre el anterior.
+
+    Expone el mismo método `search(search_text=..., select=..., top=...)` que el
+    SearchClient de Azure, así que puede usarse como reemplazo directo.
+    """
+
+    def __init__(self, ruta, k_rrf: int = 60, candidatos: int = 20, recarga_s: float = 1.0):
+        self.ruta = Path(ruta)
+        self.k_rrf = k_rrf
+        self.candidatos = candidatos
+        self.recarga_s = recarga_s
+        self.indice = IndiceMmap(self.ruta)
+        self._revisado = time.monotonic()
+        self._lock = threading.Lock()
+        logger.info("Índice binario '%s' abierto: %d documentos, %d términos%s.",
+                    self.ruta, self.indice.total, self.indice.n_terminos,
+                    " (con matriz densa)" if self.indice.meta.get("densa") else "")
+
+    def _vigente(self) -> IndiceMmap:
+        ahora = time.monotonic()
+        if ahora - self._revisado < self.recarga_s:
+            return self.indice
+        with self._lock:
+            if ahora - self._revisado < self.recarga_s:
+                return self.indice
+            self._revisado = ahora
+            try:
+                if _firma(os.stat(self.ruta)) != self.indice.firma:
+                    self.indice = IndiceMmap(self.ruta)
+                    logger.info("Índice binario recargado: %d documentos.", self.indice.total)
+            except (OSError, ValueError) as e:
+                logger.warning("No se pudo recargar el índice binario (%s); se sigue con el anterior.", e)
+        return self.indice
+
+    def search(self, search_text: str, select: list = None, top: int = 50, **kwargs) -> list:
+        indice = self._vigente()
+        if indice.total == 0:
+            return []
+        puntajes = indice.puntuar(search_text)
+        denso = indice.indice_denso()
+        candidatos = min(max(top, self.candidatos) if denso else top, indice.total)
+
+        positivos = np.flatnonzero(puntajes > 0)
+        mejores = positivos[np.argsort(-puntajes[positivos], kind="stable")][:candidatos]
+        ranking = [(int(i), float(puntajes[i])) for i in mejores]
+        if denso is not None:
+            densos = [i for i, _ in denso.puntuar(search_text, top=candidatos)]
+            ranking = fusion_rrf([[i for i, _ in ranking], densos], k=self.k_rrf)
+
+        resultados = []
+        for idx, puntaje in ranking[:top]:
+            doc = indice.documento(idx)
+            resultado = {campo: doc.get(campo) for campo in select} if select else doc
+            resultado["@search.score"] = puntaje
+            resultados.append(resultado)
+        return resultados
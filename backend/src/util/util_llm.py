@@ -1,10 +1,34 @@
-# TODO: Configurar el cliente de Gemini aquí
-from langchain_google_genai import ChatGoogleGenerativeAI
+from functools import lru_cache
 from src.core.config import settings
-# llm = ChatGoogleGenerativeAI(model="gemini-pro")
+from src.util.util_resiliencia import LLMResiliente
 
-get_llm_chain = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=settings.GEMINI_API_KEY,
-    temperature=0
-)
\ No newline at end of file
+def crear_modelo():
+    """
+    Cliente de Gemini sin política propia: los plazos y reintentos los pone LLMResiliente.
+    langchain_google_genai tarda ~0.4 s en importarse: no se paga al importar la app.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=settings.GEMINI_API_KEY,
+        temperature=0,
+        max_retries=1,  # sin reintentos internos (se sumarían a los nuestros)
+        timeout=settings.LLM_TIMEOUT_S
+    )
+
+@lru_cache(maxsize=1)
+def get_llm_chain():
+    """
+    Cliente de Gemini con plazos, reintentos y hedging, creado en el primer uso
+    (o en el calentamiento al arrancar).
+    """
+    return LLMResiliente(
+        crear_modelo(),
+        timeout_s=settings.LLM_TIMEOUT_S,
+        ttft_timeout_s=settings.LLM_TTFT_TIMEOUT_S,
+        max_reintentos=settings.LLM_MAX_RETRIES,
+        espera_base_s=settings.LLM_RETRY_BACKOFF_S,
+        espera_max_s=settings.LLM_RETRY_BACKOFF_MAX_S,
+        hedge_delay_s=settings.LLM_HEDGE_DELAY_S if settings.LLM_HEDGE_ENABLED else None
+    )
@@ -0,0 +1,128 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger("anmi.metrics")
+
+# Segundos: desde lecturas locales (ms) hasta respuestas completas de Gemini (decenas de s)
+BUCKETS_LATENCIA = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    0.75, 1.0, 1.5, 2.5, 5.0, 7.5, 10.0, 20.0, 30.0, 60.0,
+)
+
+# Etapas medidas:
+#   retrieval        búsqueda en la base de conocimientos (incluye aciertos de caché)
+#   compresion       recorte del contexto recuperado a lo relevante para la consulta
+#   prompt           armado del prompt (plantilla + ventana de historial)
+#   cola_llm         espera de turno para llamar a Gemini (control de admisión)
+#   llm_ttft         desde la llamada a Gemini hasta el primer trozo con texto
+#   llm_total        llamada completa a Gemini
+#   sse_write        escritura de un frame SSE al cliente
+#   checkpoint_load  lectura del estado del hilo
+#   checkpoint_save  escritura de un checkpoint o de escrituras pendientes
+DURACION_ETAPA = Histogram(
+    "anmi_etapa_segundos",
+    "Duración de cada etapa del flujo de chat.",
+    ["etapa"],
+    buckets=BUCKETS_LATENCIA,
+)
+
+RESPUESTAS = Counter(
+    "anmi_respuestas_total",
+    "Respuestas enviadas, según su origen.",
+    ["origen"],  # llm, single_flight, cache, banco, rapida, sin_contexto
+)
+
+STREAMS_ACTIVOS = Gauge(
+    "anmi_streams_activos",
+    "Respuestas SSE en curso.",
+)
+
+STREAMS_CANCELADOS = Counter(
+    "anmi_streams_cancelados_total",
+    "Turnos cancelados porque el cliente se fue antes de recibir la respuesta completa.",
+    ["momento"],  # antes_de_responder, a_mitad
+)
+
+LLM_EN_VUELO = Gauge(
+    "anmi_llm_en_vuelo",
+    "Llamadas a Gemini en curso.",
+)
+
+LLM_EN_COLA = Gauge(
+    "anmi_llm_en_cola",
+    "Peticiones esperando turno para llamar a Gemini.",
+)
+
+RECHAZOS = Counter(
+    "anmi_rechazos_total",
+    "Peticiones rechazadas con 429 por falta de capacidad.",
+    ["motivo"],  # cola_llena, plazo_vencido, hilo_ocupado
+)
+
+LLM_INTENTOS = Counter(
+    "anmi_llm_intentos_total",
+    "Peticiones a Gemini (incluye reintentos y hedges), según cómo terminaron.",
+    ["resultado"],  # ok, error, plazo_ttft, plazo_total
+)
+
+LLM_REINTENTOS = Counter(
+    "anmi_llm_reintentos_total",
+    "Reintentos de llamadas a Gemini tras un error reintentable.",
+)
+
+LLM_HEDGE = Counter(
+    "anmi_llm_hedge_total",
+    "Peticiones de respaldo (hedge) a Gemini y cuál de las dos ganó.",
+    ["evento"],  # lanzado, gana_hedge, gana_original
+)
+
+SESIONES_EN_MEMORIA = Gauge(
+    "anmi_sesiones_en_memoria",
+    "Conversaciones (thread_id) guardadas en el checkpointer.",
+)
+
+
+def observar(etapa: str, segundos: float):
+    DURACION_ETAPA.labels(etapa=etapa).observe(segundos)
+    logger.debug("etapa=%s duracion_ms=%.1f", etapa, segundos * 1000)
+
+
+@contextmanager
+def medir(etapa: str):
+    """
+    Mide la duración del bloque y la registra en el histograma de la etapa:
+        with medir("retrieval"):
+            contexto = await abuscar_base_conocimientos_tool(pregunta)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - inicio)
+
+
+def _medido(metodo, etapa: str):
+    async def envoltura(*args, **kwargs):
+        with medir(etapa):
+            return await metodo(*args, **kwargs)
+    return envoltura
+
+
+def instrumentar_checkpointer(checkpointer):
+    """
+    Mide las lecturas y escrituras asíncronas del checkpointer (las que usa el grafo)
+    y publica cuántas conversaciones tiene guardadas.
+    """
+    checkpointer.aget_tuple = _medido(checkpointer.aget_tuple, "checkpoint_load")
+    checkpointer.aput = _medido(checkpointer.aput, "checkpoint_save")
+    checkpointer.aput_writes = _medido(checkpointer.aput_writes, "checkpoint_save")
+
+    if hasattr(checkpointer, "contar_threads"):
+        SESIONES_EN_MEMORIA.set_function(checkpointer.contar_threads)
+    elif hasattr(checkpointer, "storage"):
+        # InMemorySaver: storage = {thread_id: {...}}
+        SESIONES_EN_MEMORIA.set_function(lambda: len(checkpointer.storage))
+    return checkpointer
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from src.util.util_metrics import STREAMS_CANCELADOS
+
+logger = logging.getLogger(__name__)
+
+
+class FueraDeVentana(Exception):
+    """Los frames pedidos ya salieron del buffer circular: no se puede reanudar."""
+
+
+class Turno:
+    """
+    Un turno de chat que se genera en segundo plano, desacoplado de la conexión.
+
+    Los frames se numeran (seq = 1, 2, ...) y se guardan en un buffer circular de
+    `max_frames`: un cliente que se reconecta pide los frames desde su último seq y
+    sigue recibiendo en vivo, sin volver a generar la respuesta.
+
+    Los endpoints registran a sus clientes con `conectar` / `desconectar`: si el último
+    se va y nadie vuelve en `gracia_s` segundos, la generación se cancela (no se siguen
+    gastando tokens ni ocupando un turno de Gemini para nadie).
+    """
+
+    def __init__(self, thread_id: str, max_frames: int, gracia_s: float = 0.0):
+        self.id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.frames = deque(maxlen=max_frames)  # (seq, texto)
+        self.ultimo_seq = 0
+        self.terminado = False
+        self.error = None
+        self.cancelado = False
+        self.fin = None  # time.monotonic() al terminar
+        self.tarea = None
+        self.gracia_s = gracia_s
+        self.lectores = 0
+        self._cancelacion = None  # TimerHandle de la cancelación pendiente
+        self._cambio = asyncio.Event()
+
+    def agregar(self, texto: str):
+        self.ultimo_seq += 1
+        self.frames.append((self.ultimo_seq, texto))
+        self._avisar()
+
+    def terminar(self, error: BaseException = None):
+        self.terminado = True
+        self.error = error
+        self.fin = time.monotonic()
+        self._avisar()
+
+    def _avisar(self):
+        # Despierta a todos los lectores que esperan y prepara el evento del siguiente cambio
+        self._cambio.set()
+        self._cambio = asyncio.Event()
+
+    def conectar(self):
+        self.lectores += 1
+        if self._cancelacion is not None:
+            # Un cliente volvió dentro del periodo de gracia
+            self._cancelacion.cancel()
+            self._cancelacion = None
+
+    def desconectar(self):
+        self.lectores -= 1
+        if self.lectores > 0 or self.terminado:
+            return
+        if self.gracia_s <= 0:
+            self._abandonar()
+        elif self._cancelacion is None:
+            self._cancelacion = asyncio.get_running_loop().call_later(self.gracia_s, self._abandonar)
+
+    def _abandonar(self):
+        self._cancelacion = None
+        if self.lectores > 0 or self.terminado:
+            return
+        STREAMS_CANCELADOS.labels(momento="a_mitad" if self.ultimo_seq else "antes_de_responder").inc()
+        logger.info("Turno %s abandonado por el cliente: se cancela la generación", self.id)
+        self.tarea.cancel()
+
+    async def _esperar_cambio(self, corte) -> bool:
+        """Espera el siguiente frame (o el final); False si antes termina `corte`."""
+        if corte is None:
+            await self._cambio.wait()
+            return True
+        cambio = asyncio.ensure_future(self._cambio.wait())
+        try:
+            await asyncio.wait((cambio, corte), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cambio.cancel()
+        return not corte.done()
+
+    async def esperar_inicio(self, corte: asyncio.Future = None):
+        """
+        Espera el primer frame o el final del turno (o que termine `corte`, p. ej. la
+        desconexión del cliente). Si falló antes de emitir nada, relanza el error
+        (el endpoint puede responder 429/503 antes de abrir el stream).
+        """
+        while not self.frames and not self.terminado:
+            if not await self._esperar_cambio(corte):
+                return
+        if not self.frames and self.error is not None:
+            raise self.error
+
+    async def leer_desde(self, ultimo_recibido: int = 0, corte: asyncio.Future = None):
+        """
+        Frames con seq > `ultimo_recibido`: primero los del buffer y luego en vivo.
+        Termina con el turno o, si se pasa `corte`, en cuanto este termine.
+        """
+        siguiente = ultimo_recibido + 1
+        while True:
+            if self.frames and siguiente < self.frames[0][0]:
+                raise FueraDeVentana(f"el frame {siguiente} ya no está en el buffer del turno {self.id}")
+            pendientes = [frame for frame in self.frames if frame[0] >= siguiente]
+            for seq, texto in pendientes:
+                yield seq, texto
+                siguiente = seq + 1
+            if self.terminado and siguiente > self.ultimo_seq:
+                return
+            if not pendientes and not await self._esperar_cambio(corte):
+                return
+
+
+class TurnosReanudables:
+    """
+    Registro de turnos por id. Los terminados se conservan `ttl_s` segundos para que un
+    cliente que perdió la conexión pueda recuperar el final; como mucho `max_turnos`
+    (se descartan primero los terminados más antiguos). Un turno en curso sin clientes
+    se cancela tras `gracia_s` segundos (0: en cuanto se va el último); `iniciar` acepta
+    otra gracia para un turno en particular.
+    """
+
+    def __init__(self, max_frames: int, ttl_s: float, max_turnos: int, gracia_s: float = 0.0):
+        self.max_frames = max_frames
+        self.ttl_s = ttl_s
+        self.max_turnos = max_turnos
+        self.gracia_s = gracia_s
+        self.turnos = OrderedDict()
+        self.reanudados = 0
+
+    def iniciar(self, thread_id: str, frames, gracia_s: float = None) -> Turno:
+        """Lanza la generación (`frames`: generador asíncrono de textos) en una tarea propia."""
+        self._limpiar()
+        turno = Turno(thread_id, self.max_frames, self.gracia_s if gracia_s is None else gracia_s)
+        turno.tarea = asyncio.create_task(self._producir(turno, frames))
+        self.turnos[turno.id] = turno
+        return turno
+
+    def obtener(self, turno_id: str, thread_id: str):
+        """
+        El turno, si existe y pertenece a la conversación; None si no, si expiró o si se
+        canceló (lo generado quedó incompleto: no hay final que recuperar).
+        """
+        self._limpiar()
+        turno = self.turnos.get(turno_id)
+        if turno is None or turno.thread_id != thread_id or turno.cancelado:
+            return None
+        self.reanudados += 1
+        return turno
+
+    async def _producir(self, turno: Turno, frames):
+        try:
+            async for texto in frames:
+                turno.agregar(texto)
+            turno.terminar()
+        except asyncio.CancelledError:
+            turno.cancelado = True
+            turno.terminar()
+            raise
+        except Exception as e:
+            if turno.frames:
+                logger.exception("Error a mitad del turno %s", turno.id)
+            turno.terminar(e)
+
+    def _limpiar(self):
+        ahora = time.monotonic()
+        for turno_id in [t.id for t in self.turnos.values() if t.terminado and ahora - t.fin > self.ttl_s]:
+            del self.turnos[turno_id]
+        if len(self.turnos) >= self.max_turnos:
+            terminados = [t.id for t in self.turnos.values() if t.terminado]
+            for turno_id in terminados[:len(self.turnos) - self.max_turnos + 1]:
+                del self.turnos[turno_id]
+
+    def stats(self) -> dict:
+        en_curso = sum(1 for t in self.turnos.values() if not t.terminado)
+        cancelados = sum(1 for t in self.turnos.values() if t.cancelado)
+        return {"turnos": len(self.turnos), "en_curso": en_curso, "cancelados": cancelados,
+                "reanudados": self.reanudados}
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import random
+
+from src.util.util_metrics import LLM_HEDGE, LLM_INTENTOS, LLM_REINTENTOS
+
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP que vale la pena reintentar (cuota, sobrecarga, caídas momentáneas)
+CODIGOS_REINTENTABLES = {408, 429, 500, 502, 503, 504}
+
+_FIN = object()
+
+
+class LLMNoDisponible(Exception):
+    """Gemini no respondió a tiempo o falló en todos los intentos (se responde 503)."""
+
+    def __init__(self, motivo: str, retry_after: int = 5):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+def es_reintentable(error: BaseException) -> bool:
+    """
+    Timeouts, errores de conexión y errores de Google con código de sobrecarga.
+    langchain_google_genai envuelve los errores de la API: se revisa toda la cadena de causas.
+    """
+    while error is not None:
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        codigo = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if isinstance(codigo, int) and codigo in CODIGOS_REINTENTABLES:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _Intento:
+    """
+    Una petición a Gemini corriendo en su propia tarea. El stream se consume entero
+    dentro de esa tarea (el generador de LangChain nunca cambia de tarea): el primer
+    trozo con texto resuelve `primer_token` y el resto pasa por `cola`.
+    """
+
+    def __init__(self, modelo, messages, kwargs):
+        self.primer_token = asyncio.get_running_loop().create_future()
+        self.cola = asyncio.Queue()
+        self.tarea = asyncio.create_task(self._correr(modelo, messages, kwargs))
+
+    async def _correr(self, modelo, messages, kwargs):
+        acumulado = None
+        try:
+            async for chunk in modelo.astream(messages, **kwargs):
+                if self.primer_token.done():
+                    self.cola.put_nowait(chunk)
+                    continue
+                acumulado = chunk if acumulado is None else acumulado + chunk
+                if chunk.content:
+                    self.primer_token.set_result(acumulado)
+            if not self.primer_token.done():
+                # Stream terminado sin texto
+                self.primer_token.set_result(acumulado)
+            self.cola.put_nowait(_FIN)
+        except asyncio.CancelledError:
+            self.primer_token.cancel()
+            raise
+        except Exception as e:
+            if self.primer_token.done():
+                self.cola.put_nowait(e)
+            else:
+                self.primer_token.set_exception(e)
+                self.primer_token.exception()  # evita el aviso "exception was never retrieved"
+
+    async def cancelar(self):
+        if not self.tarea.done():
+            self.tarea.cancel()
+            await asyncio.gather(self.tarea, return_exceptions=True)
+
+
+class LLMResiliente:
+    """
+    Envuelve un modelo de chat de LangChain (`astream`) con una política de plazos:
+
+    - Plazo total por llamada (`timeout_s`), que incluye todos los intentos.
+    - Plazo hasta el primer token por intento (`ttft_timeout_s`).
+    - Reintentos con espera exponencial y jitter completo ante errores reintentables,
+      solo antes del primer token: lo ya enviado al cliente no se puede repetir.
+    - Hedging: si tras `hedge_delay_s` el intento no produjo ningún token, se lanza una
+      segunda petición idéntica; gana la primera que emite texto y la otra se cancela.
+
+    El hedge no pide otro turno al control de admisión: como mucho duplica las llamadas
+    que ya tienen uno, y solo cuando la primera va lenta.
+    """
+
+    def __init__(self, modelo, timeout_s: float, ttft_timeout_s: float, max_reintentos: int,
+                 espera_base_s: float, espera_max_s: float, hedge_delay_s: float = None):
+        self.modelo = modelo
+        self.timeout_s = timeout_s
+        self.ttft_timeout_s = ttft_timeout_s
+        self.max_reintentos = max_reintentos
+        self.espera_base_s = espera_base_s
+        self.espera_max_s = espera_max_s
+        self.hedge_delay_s = hedge_delay_s  # None: sin hedging
+
+    async def astream(self, messages, **kwargs):
+        loop = asyncio.get_running_loop()
+        fin = loop.time() + self.timeout_s
+
+        reintentos = 0
+        while True:
+            try:
+                intento, primero = await self._primer_token(messages, kwargs, fin)
+                break
+            except Exception as e:
+                restante = fin - loop.time()
+                if reintentos >= self.max_reintentos or not es_reintentable(e) or restante <= 0:
+                    raise LLMNoDisponible("plazo_ttft" if isinstance(e, TimeoutError) else "error") from e
+                reintentos += 1
+                tope = min(self.espera_max_s, self.espera_base_s * 2 ** reintentos)
+                espera = min(restante, random.uniform(0, tope))
+                LLM_REINTENTOS.inc()
+                logger.warning("Gemini falló (%s: %s); reintento %d en %.2f s",
+                               type(e).__name__, e, reintentos, espera)
+                await asyncio.sleep(espera)
+
+        try:
+            if primero is not None:
+                yield primero
+            while True:
+                restante = fin - loop.time()
+                if restante <= 0:
+                    raise TimeoutError("plazo total de la llamada vencido")
+                item = await asyncio.wait_for(intento.cola.get(), timeout=restante)
+                if item is _FIN:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        except TimeoutError as e:
+            LLM_INTENTOS.labels(resultado="plazo_total").inc()
+            raise LLMNoDisponible("plazo_total") from e
+        except Exception as e:
+            # Error a mitad de respuesta: ya no se puede reintentar
+            LLM_INTENTOS.labels(resultado="error").inc()
+            raise LLMNoDisponible("error") from e
+        finally:
+            await intento.cancelar()
+
+    async def ainvoke(self, messages, **kwargs):
+        respuesta = None
+        async for chunk in self.astream(messages, **kwargs):
+            respuesta = chunk if respuesta is None else respuesta + chunk
+        return respuesta
+
+    async def _primer_token(self, messages, kwargs, fin: float):
+        """
+        Corre un intento (más el hedge, si toca) hasta que alguno emite texto.
+        Devuelve (intento ganador, trozos acumulados hasta el primero con texto).
+        """
+        loop = asyncio.get_running_loop()
+        fin_ttft = min(fin, loop.time() + self.ttft_timeout_s)
+        hedge_en = None if self.hedge_delay_s is None else loop.time() + self.hedge_delay_s
+
+        original = _Intento(self.modelo, messages, kwargs)
+        hedge = None
+        activos = {original.primer_token: original}
+        ganador = None
+        try:
+            while True:
+                limite = fin_ttft if hedge_en is None else min(fin_ttft, hedge_en)
+                hechos, _ = await asyncio.wait(
+                    activos, timeout=max(0, limite - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                ultimo_error = None
+                for futuro in hechos:
+                    intento = activos.pop(futuro)
+                    if futuro.exception() is None:
+                        ganador = ganador or intento
+                    else:
+                        ultimo_error = futuro.exception()
+                        LLM_INTENTOS.labels(resultado="error").inc()
+                if ganador is not None:
+                    break
+                if not activos:
+                    # Fallaron todos: decide la política de reintentos
+                    raise ultimo_error
+
+                ahora = loop.time()
+                if ahora >= fin_ttft:
+                    LLM_INTENTOS.labels(resultado="plazo_ttft").inc(len(activos))
+                    raise TimeoutError("sin primer token dentro del plazo")
+                if hedge_en is not None and ahora >= hedge_en:
+                    hedge_en = None
+                    LLM_HEDGE.labels(evento="lanzado").inc()
+                    logger.info("Gemini sin primer token tras %.1f s: se lanza una petición de respaldo",
+                                self.hedge_delay_s)
+                    hedge = _Intento(self.modelo, messages, kwargs)
+                    activos[hedge.primer_token] = hedge
+
+            LLM_INTENTOS.labels(resultado="ok").inc()
+            if hedge is not None:
+                LLM_HEDGE.labels(evento="gana_hedge" if ganador is hedge else "gana_original").inc()
+            return ganador, ganador.primer_token.result()
+        finally:
+            for intento in (original, hedge):
+                if intento is not None and intento is not ganador:
+                    await intento.cancelar()
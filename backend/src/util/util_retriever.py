@@ -1,21 +1,137 @@
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from src.core.config import settings
+from src.util.util_bm25 import BM25Retriever, cargar_documentos
 
-AZURE_SEARCH_SERVICE_NAME = settings.AZURE_SEARCH_SERVICE_NAME
-AZURE_SEARCH_INDEX_NAME = settings.AZURE_SEARCH_INDEX_NAME
-AZURE_SEARCH_API_KEY = settings.AZURE_SEARCH_API_KEY
+logger = logging.getLogger(__name__)
 
-def get_search_client() -> SearchClient:
+def get_azure_search_client():
     """Create and return an Azure SearchClient."""
-    endpoint = f"https://{AZURE_SEARCH_SERVICE_NAME}.search.windows.net"
-    credential = AzureKeyCredential(AZURE_SEARCH_API_KEY)
+    # Imports diferidos: el SDK de Azure solo se carga si se usa
+    import requests
+    from requests.adapters import HTTPAdapter
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+    from azure.core.pipeline.transport import RequestsTransport
+
+    endpoint = f"https://{settings.AZURE_SEARCH_SERVICE_NAME}.search.windows.net"
+    credential = AzureKeyCredential(settings.AZURE_SEARCH_API_KEY)
+
+    # Pool de conexiones compartido, dimensionado para el executor de búsquedas
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.RETRIEVAL_MAX_CONCURRENCY
+    ))
     search_client = SearchClient(
         endpoint=endpoint,
-        index_name=AZURE_SEARCH_INDEX_NAME,
-        credential=credential
+        index_name=settings.AZURE_SEARCH_INDEX_NAME,
+        credential=credential,
+        transport=RequestsTransport(session=session, session_owner=False)
     )
     return search_client
 
-search_client = get_search_client()
-print("Cliente de Azure AI Search creado correctamente.")
\ No newline at end of file
+def get_local_search_client() -> BM25Retriever:
+    """Create and return an in-process BM25 retriever over the local ingest output."""
+    return BM25Retriever.from_json_files(settings.LOCAL_KB_FILES)
+
+def get_hybrid_search_client():
+    """Create and return a keyword + dense (LSA) retriever fused with RRF."""
+    from src.util.util_denso import HybridRetriever, cargar_indice_denso
+
+    documentos = cargar_documentos(settings.LOCAL_KB_FILES)
+    if settings.HYBRID_KEYWORD_BACKEND.lower() == "azure":
+        cliente_palabras = get_azure_search_client()
+    else:
+        cliente_palabras = BM25Retriever(documentos)
+    indice = cargar_indice_denso(settings.DENSE_INDEX_PATH, documentos, dimensiones=settings.DENSE_DIMENSIONS)
+    return HybridRetriever(
+        cliente_palabras, indice, documentos,
+        k_rrf=settings.HYBRID_RRF_K,
+        candidatos=settings.HYBRID_CANDIDATES
+    )
+
+def get_mmap_search_client():
+    """Create and return a retriever over the memory-mapped binary index."""
+    from src.util.util_indice_binario import MmapRetriever
+
+    return MmapRetriever(
+        settings.BINARY_INDEX_PATH,
+        k_rrf=settings.HYBRID_RRF_K,
+        candidatos=settings.HYBRID_CANDIDATES
+    )
+
+def get_search_client():
+    """
+    Return the retriever selected by RETRIEVER_BACKEND.
+    Every backend exposes `search(search_text=..., select=..., top=...)`.
+    """
+    backend = settings.RETRIEVER_BACKEND.lower()
+    if backend == "azure":
+        return get_azure_search_client()
+    if backend == "bm25":
+        return get_local_search_client()
+    if backend == "hybrid":
+        return get_hybrid_search_client()
+    if backend == "mmap":
+        return get_mmap_search_client()
+    raise ValueError(f"RETRIEVER_BACKEND desconocido: {settings.RETRIEVER_BACKEND}")
+
+_manifest = {"mtime": None, "version": ""}
+
+def get_index_version() -> str:
+    """
+    Version written by the ingest scripts in INDEX_MANIFEST_PATH ("" if missing).
+    The file is only re-read when its mtime changes.
+    """
+    try:
+        mtime = os.stat(settings.INDEX_MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return ""
+    if mtime != _manifest["mtime"]:
+        try:
+            with open(settings.INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                version = json.load(f).get("version", "")
+        except (OSError, ValueError):
+            return _manifest["version"]
+        _manifest.update(mtime=mtime, version=version)
+    return _manifest["version"]
+
+def get_kb_version() -> str:
+    """
+    Version of the knowledge base. Combines KB_VERSION, the index manifest version
+    and the size and mtime of the local ingest files, so a re-ingest changes it.
+    """
+    firma = [settings.KB_VERSION, get_index_version()]
+    for ruta in [*settings.LOCAL_KB_FILES, settings.DENSE_INDEX_PATH, settings.BINARY_INDEX_PATH]:
+        try:
+            st = os.stat(ruta)
+            firma.append(f"{ruta}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            continue
+    return hashlib.blake2b("|".join(firma).encode("utf-8"), digest_size=8).hexdigest()
+
+@lru_cache(maxsize=1)
+def get_shared_search_client():
+    """
+    Shared retriever for the whole process, created on first use
+    (or by the start-up warm-up) instead of at import time.
+    """
+    cliente = get_search_client()
+    logger.info("Cliente de búsqueda '%s' creado correctamente.", settings.RETRIEVER_BACKEND)
+    return cliente
+
+@lru_cache(maxsize=1)
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """
+    Las búsquedas son bloqueantes (HTTP síncrono); se ejecutan en este pool para no frenar
+    el event loop. Se crea en el primer uso: importar la app no construye Settings.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.RETRIEVAL_MAX_CONCURRENCY,
+        thread_name_prefix="retrieval"
+    )
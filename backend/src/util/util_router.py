@@ -0,0 +1,89 @@
+import re
+
+from src.util.util_texto import clave_consulta
+
+# Rutas posibles de un mensaje
+RUTA_SALUDO = "saludo"
+RUTA_SALIDA_EMERGENCIA = "salida_emergencia"
+RUTA_RAG = "rag"
+
+# Rango de edad que cubre ANMI (en meses)
+EDAD_MINIMA_MESES = 6
+EDAD_MAXIMA_MESES = 12
+
+_NUMEROS = {
+    "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12, "trece": 13,
+    "catorce": 14, "quince": 15, "dieciseis": 16, "diecisiete": 17, "dieciocho": 18,
+    "diecinueve": 19, "veinte": 20,
+}
+_NUMERO = r"(\d{1,2}|" + "|".join(sorted(_NUMEROS, key=len, reverse=True)) + r")"
+
+# Los patrones se aplican sobre el texto ya normalizado (minúsculas, sin tildes ni signos)
+
+# El mensaje es SOLO un saludo (si trae una pregunta, va al flujo normal)
+_PATRON_SALUDO = re.compile(
+    r"^(?:hola|holi|holis|buenas|buen dia|buenos dias|buenas tardes|buenas noches|saludos|hey|que tal)"
+    r"(?: (?:hola|anmi|que tal|como estas|como te va|amiga|buenas|buenos dias|buenas tardes|buenas noches))*$"
+)
+
+# Sujeto de la frase cuando se habla del bebé ("mi bebe", "mi hija", "el niño")
+_SUJETO_BEBE = (
+    r"(?:bebe|bebito|bebita|hij[oa]|hijit[oa]|ni[nñ][oa]|nene|nena|wawa|guagua|peque[nñ][oa])s?"
+)
+# Hasta tres palabras entre el sujeto y el dato ("mi bebe ya tiene", "mi hija ahora pesa")
+_HUECO = r"(?:\s+\w+){0,3}?"
+
+# Edad del bebé: "mi bebe de 5 meses", "mi hijo ya tiene 2 años", "a los 15 meses", "cumplio un año".
+# "de" / "tiene" / "con" solo cuentan detrás del bebé: "tengo 25 años" o "con 2 años de
+# experiencia" no hablan de su edad
+_PATRON_EDAD = re.compile(
+    r"\b(?:" + _SUJETO_BEBE + _HUECO + r"\s+(?:de|tiene|con)|cumple|cumplio|a los)\s+"
+    + _NUMERO + r"\s+(mes|meses|año|años|ano|anos)\b"
+)
+
+# Contextos donde "N meses" no es la edad del bebé (p. ej. "5 meses de embarazo")
+_PATRON_NO_BEBE = re.compile(r"\b(?:embaraz\w*|gestacion|gestante|gestando|puerper\w*)\b")
+
+# Peso del bebé: dietas/dosis personalizadas ("pesa 6 kg", "mi bebe pesa seis kilos",
+# "mi hija de 7 kilos"). Un peso suelto es una cantidad de comida ("compre 1 kilo de
+# lentejas", "uso 2 kg por semana"): solo cuenta tras pesa/peso o detrás del bebé.
+# Tras pesa/peso, un número en palabras necesita la unidad: "cuanto pesa un bebe de
+# 8 meses" es una pregunta general
+_CANTIDAD = r"(?:\d+(?:\s\d+)?|" + _NUMERO + r")"
+_UNIDAD_PESO = r"(?:kg|kilos?|kilogramos?|gramos?)"
+_PATRON_PESO = re.compile(
+    r"\b(?:pesa|peso|pesaba)\s+(?:de\s+)?(?:\d+(?:\s\d+)?\b|" + _NUMERO + r"\s+" + _UNIDAD_PESO + r"\b)"
+    r"|\b" + _SUJETO_BEBE + _HUECO + r"\s+" + _CANTIDAD + r"\s*(?:kg|kilos?|kilogramos?)\b(?!\s+de\b)"
+)
+
+
+def _a_meses(numero: str, unidad: str) -> int:
+    valor = int(numero) if numero.isdigit() else _NUMEROS[numero]
+    return valor if unidad.startswith("mes") else valor * 12
+
+
+def clasificar_mensaje(texto: str) -> str:
+    """
+    Clasificador determinista previo a la búsqueda y al LLM.
+
+    Devuelve RUTA_SALUDO, RUTA_SALIDA_EMERGENCIA o RUTA_RAG. Es conservador: ante la
+    duda devuelve RUTA_RAG y decide el modelo.
+    """
+    normalizado = clave_consulta(texto)
+    if not normalizado:
+        return RUTA_RAG
+
+    if _PATRON_SALUDO.match(normalizado):
+        return RUTA_SALUDO
+
+    if _PATRON_PESO.search(normalizado):
+        return RUTA_SALIDA_EMERGENCIA
+
+    if not _PATRON_NO_BEBE.search(normalizado):
+        for numero, unidad in _PATRON_EDAD.findall(normalizado):
+            meses = _a_meses(numero, unidad)
+            if meses < EDAD_MINIMA_MESES or meses > EDAD_MAXIMA_MESES:
+                return RUTA_SALIDA_EMERGENCIA
+
+    return RUTA_RAG
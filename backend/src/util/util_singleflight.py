@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class _Suscriptor:
+    def __init__(self, max_cola: int):
+        self.cola = asyncio.Queue(maxsize=max_cola)
+        # Si la cola se llena (consumidor lento), se deja de encolar y al final
+        # se le envía de una vez el resto del texto
+        self.desbordado = False
+
+
+class _Vuelo:
+    def __init__(self):
+        self.emitidos = []
+        self.suscriptores = set()
+        self.resultado = asyncio.get_running_loop().create_future()
+        self.tarea = None
+
+    def emitir(self, trozo: str):
+        self.emitidos.append(trozo)
+        for suscriptor in self.suscriptores:
+            self._encolar(suscriptor, trozo)
+
+    @staticmethod
+    def _encolar(suscriptor: _Suscriptor, item):
+        if suscriptor.desbordado:
+            return
+        try:
+            suscriptor.cola.put_nowait(item)
+        except asyncio.QueueFull:
+            suscriptor.desbordado = True
+
+
+class SingleFlight:
+    """
+    Agrupa peticiones idénticas en vuelo: la primera lanza la generación y las que
+    llegan mientras tanto se suscriben a ella en lugar de repetirla.
+
+    La generación corre en su propia tarea; cada suscriptor recibe los trozos por una
+    cola acotada (y los que llegan tarde, primero lo ya emitido). Si todos los
+    suscriptores se van, la generación se cancela.
+    """
+
+    def __init__(self, max_cola: int = 256):
+        self.max_cola = max_cola
+        self.vuelos = {}
+        self.coalescidas = 0
+
+    async def ejecutar(self, clave: str, productor, escribir) -> tuple:
+        """
+        `productor(emitir)` es una corrutina que genera la respuesta llamando a
+        `emitir(trozo)` por cada trozo y devuelve el resultado final.
+        `escribir(trozo)` envía un trozo al cliente de esta petición.
+
+        Devuelve (resultado, lider): `lider` es True si esta petición lanzó la generación.
+        """
+        vuelo = self.vuelos.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = _Vuelo()
+            self.vuelos[clave] = vuelo
+            vuelo.tarea = asyncio.create_task(self._producir(clave, vuelo, productor))
+        else:
+            self.coalescidas += 1
+            logger.info("Single-flight: petición unida a una generación en curso (%d suscriptores)",
+                        len(vuelo.suscriptores) + 1)
+
+        # Lo ya emitido se envía directo (sin await en medio: no se pierde ningún trozo)
+        for trozo in vuelo.emitidos:
+            escribir(trozo)
+        enviados = sum(len(trozo) for trozo in vuelo.emitidos)
+
+        suscriptor = _Suscriptor(self.max_cola)
+        vuelo.suscriptores.add(suscriptor)
+        if vuelo.resultado.done():
+            _Vuelo._encolar(suscriptor, _FIN)
+        try:
+            while True:
+                if suscriptor.desbordado and suscriptor.cola.empty():
+                    resultado = await asyncio.shield(vuelo.resultado)
+                    resto = _texto(resultado)[enviados:]
+                    if resto:
+                        escribir(resto)
+                    return resultado, lider
+                trozo = await suscriptor.cola.get()
+                if trozo is _FIN:
+                    return vuelo.resultado.result(), lider
+                escribir(trozo)
+                enviados += len(trozo)
+        finally:
+            vuelo.suscriptores.discard(suscriptor)
+            if not vuelo.suscriptores and not vuelo.tarea.done():
+                # Nadie espera ya esta respuesta: no tiene sentido seguir generándola
+                # (y una petición nueva no debe unirse a una generación cancelada)
+                if self.vuelos.get(clave) is vuelo:
+                    del self.vuelos[clave]
+                vuelo.tarea.cancel()
+
+    async def _producir(self, clave: str, vuelo: _Vuelo, productor):
+        try:
+            resultado = await productor(vuelo.emitir)
+            vuelo.resultado.set_result(resultado)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                vuelo.resultado.cancel()
+            else:
+                vuelo.resultado.set_exception(e)
+                vuelo.resultado.exception()  # evita el aviso "exception was never retrieved"
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if self.vuelos.get(clave) is vuelo:
+                del self.vuelos[clave]
+            for suscriptor in vuelo.suscriptores:
+                _Vuelo._encolar(suscriptor, _FIN)
+
+    def stats(self) -> dict:
+        return {"en_vuelo": len(self.vuelos), "coalescidas": self.coalescidas}
+
+
+def _texto(resultado) -> str:
+    return resultado if isinstance(resultado, str) else getattr(resultado, "content", "") or ""
@@ -0,0 +1,62 @@
+import asyncio
+
+
+async def agrupar_frames(fuente, ventana_ms: float, max_bytes: int):
+    """
+    Agrupa los trozos de texto de `fuente` (generador asíncrono) en frames.
+
+    El primer trozo sale de inmediato (para no retrasar el primer token). Después, cada
+    frame junta lo que llegue durante `ventana_ms` milisegundos o hasta `max_bytes`,
+    lo que ocurra primero. Así se envían pocos frames grandes en lugar de miles de
+    escrituras diminutas, sin añadir más latencia que la ventana.
+    """
+    loop = asyncio.get_running_loop()
+    iterador = fuente.__aiter__()
+    ventana_s = ventana_ms / 1000
+    pendiente = None
+    primero = True
+
+    try:
+        while True:
+            if pendiente is None:
+                pendiente = asyncio.ensure_future(iterador.__anext__())
+            try:
+                trozo = await pendiente
+            except StopAsyncIteration:
+                return
+            pendiente = None
+
+            frame = [trozo]
+            tamano = len(trozo.encode("utf-8"))
+            limite = loop.time() + (0 if primero else ventana_s)
+            primero = False
+
+            terminado = False
+            while tamano < max_bytes:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                pendiente = asyncio.ensure_future(iterador.__anext__())
+                listo, _ = await asyncio.wait({pendiente}, timeout=restante)
+                if not listo:
+                    # El trozo llegará después; se conserva `pendiente` para el próximo frame
+                    break
+                tarea, pendiente = pendiente, None
+                try:
+                    trozo = tarea.result()
+                except StopAsyncIteration:
+                    terminado = True
+                    break
+                frame.append(trozo)
+                tamano += len(trozo.encode("utf-8"))
+
+            yield "".join(frame)
+            if terminado:
+                return
+    finally:
+        if pendiente is not None:
+            pendiente.cancel()
+            # La fuente procesa la cancelación (y limpia) antes de cerrarla
+            await asyncio.gather(pendiente, return_exceptions=True)
+        if hasattr(iterador, "aclose"):
+            await iterador.aclose()
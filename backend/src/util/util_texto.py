@@ -0,0 +1,62 @@
+import re
+import unicodedata
+
+# Palabras vacías del español (sin tildes, porque se comparan después de normalizar)
+STOPWORDS_ES = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aquel aquella aquellas
+aquello aquellos aqui asi aun cada como con contra cual cuales cuando de del
+desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso
+esos esta estaba estan estar estas este esto estos fue fueron ha hace hacia han
+hasta hay la las le les lo los mas me mi mis mucho muy nada ni no nos nosotros
+o otra otras otro otros para pero poco por porque que quien quienes se sea ser
+si sin sobre son su sus tambien tan tanto te tiene tienen toda todas todo todos
+tu tus un una unas uno unos y ya yo
+""".split())
+
+_PATRON_TOKEN = re.compile(r"[a-z0-9ñ]+")
+
+
+def quitar_tildes(texto: str) -> str:
+    """
+    Elimina tildes y diéresis conservando la 'ñ'.
+    """
+    texto = texto.replace("ñ", "\0").replace("Ñ", "\1")
+    descompuesto = unicodedata.normalize("NFD", texto)
+    sin_marcas = "".join(ch for ch in descompuesto if unicodedata.category(ch) != "Mn")
+    return sin_marcas.replace("\0", "ñ").replace("\1", "Ñ")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Minúsculas, sin tildes y con espacios colapsados.
+    """
+    texto = quitar_tildes((texto or "").lower())
+    return " ".join(texto.split())
+
+
+def clave_consulta(texto: str) -> str:
+    """
+    Forma canónica de una pregunta para usarla como clave de caché:
+    normalizada y sin signos de puntuación ("¿Qué es la anemia?" == "que es la anemia").
+    """
+    return " ".join(_PATRON_TOKEN.findall(normalizar(texto)))
+
+
+def _raiz_ligera(token: str) -> str:
+    # Stemming mínimo: plurales comunes ("alimentos" -> "alimento", "meses" -> "mes")
+    if len(token) > 4 and token.endswith("es") and token[-3] not in "aeiou":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Convierte un texto en la lista de términos indexables (sin stopwords).
+    """
+    return [
+        _raiz_ligera(token)
+        for token in _PATRON_TOKEN.findall(normalizar(texto))
+        if token not in STOPWORDS_ES
+    ]
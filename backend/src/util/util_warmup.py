@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+
+from src.core.config import get_settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Estado del calentamiento (lo publica /readyz)
+estado = {
+    "listo": False,
+    "en_curso": False,
+    "etapas_ms": {},
+    "errores": {},
+}
+
+# Si alguna de estas etapas falla, la instancia no está lista para recibir tráfico
+ETAPAS_CRITICAS = ("settings", "busqueda", "llm", "grafo")
+
+
+async def _etapa(nombre: str, funcion, *args):
+    """Ejecuta una etapa bloqueante en un hilo y registra su duración o su error."""
+    inicio = time.perf_counter()
+    try:
+        await asyncio.to_thread(funcion, *args)
+    except Exception as e:
+        estado["errores"][nombre] = repr(e)
+        logger.warning("Calentamiento: falló la etapa '%s': %s", nombre, e)
+    finally:
+        estado["etapas_ms"][nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+async def calentar():
+    """
+    Deja la instancia lista antes del primer usuario: crea la configuración, el cliente
+    de búsqueda (carga el índice local o abre conexiones con Azure) y su executor, el cliente de Gemini,
+    el checkpointer, el grafo compilado y el banco de respuestas, y precarga la caché
+    de búsquedas con las consultas de WARMUP_QUERIES y las preguntas del banco
+    (lo que además abre conexiones del pool HTTP).
+    """
+    # Imports diferidos: los módulos pesados se cargan aquí, no al importar la app
+    from src.flow.flow_agente import get_answer_bank, get_answer_cache, get_app_graph
+    from src.tools.tool_buscar_base_conocimientos import abuscar_base_conocimientos_tool
+    from src.util.util_llm import get_llm_chain
+    from src.util.util_retriever import get_retrieval_executor, get_shared_search_client
+
+    estado.update(listo=False, en_curso=True, etapas_ms={}, errores={})
+    inicio = time.perf_counter()
+
+    await _etapa("settings", get_settings)
+    await _etapa("busqueda", get_shared_search_client)
+    await _etapa("executor_busqueda", get_retrieval_executor)
+    await _etapa("llm", get_llm_chain)
+    await _etapa("grafo", get_app_graph)
+    await _etapa("cache_respuestas", get_answer_cache)
+    await _etapa("banco_respuestas", get_answer_bank)
+
+    # Consultas en paralelo: cada una puede usar su propia conexión del pool.
+    # También las del banco de respuestas, para servirlas sin esperar la búsqueda
+    consultas = list(settings.WARMUP_QUERIES)
+    banco = get_answer_bank() if "banco_respuestas" not in estado["errores"] else None
+    if banco is not None:
+        consultas += [entrada["pregunta"] for entrada in banco.entradas.values()]
+    inicio_consultas = time.perf_counter()
+    resultados = await asyncio.gather(
+        *(abuscar_base_conocimientos_tool(consulta) for consulta in consultas),
+        return_exceptions=True
+    )
+    estado["etapas_ms"]["consultas"] = round((time.perf_counter() - inicio_consultas) * 1000, 1)
+    fallidas = [r for r in resultados if isinstance(r, Exception)]
+    if fallidas:
+        estado["errores"]["consultas"] = repr(fallidas[0])
+
+    estado["en_curso"] = False
+    estado["listo"] = not any(etapa in estado["errores"] for etapa in ETAPAS_CRITICAS)
+    logger.info(
+        "Calentamiento terminado en %.0f ms (listo=%s): %s",
+        (time.perf_counter() - inicio) * 1000, estado["listo"], estado["etapas_ms"]
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+# Settings exige la clave aunque las pruebas nunca llaman a Gemini
+os.environ.setdefault("GEMINI_API_KEY", "pruebas")
+
+from langchain_core.messages import AIMessageChunk
+from langgraph.checkpoint.memory import MemorySaver
+
+CONTEXTO_FALSO = "Alimentos ricos en hierro\nEl hígado y la sangrecita tienen mucho hierro."
+
+
+class LLMFalso:
+    """
+    Modelo de chat falso: emite `trozos` uno por uno (esperando `retardo_s` antes de cada
+    uno); opcionalmente lanza `error` en lugar del trozo `fallar_en`.
+    """
+
+    def __init__(self, trozos: list, fallar_en: int = None, error: Exception = None, retardo_s: float = 0):
+        self.trozos = trozos
+        self.fallar_en = fallar_en
+        self.error = error
+        self.retardo_s = retardo_s
+        self.llamadas = 0
+
+    async def astream(self, messages, **kwargs):
+        self.llamadas += 1
+        for i, trozo in enumerate(self.trozos):
+            await asyncio.sleep(self.retardo_s)
+            if i == self.fallar_en:
+                raise self.error
+            yield AIMessageChunk(content=trozo)
+
+
+@pytest.fixture
+def flujo(monkeypatch):
+    """
+    flow_agente (`flujo.modulo`) con memoria nueva en RAM, búsqueda falsa, sin cachés ni
+    banco de respuestas. El LLM se elige con `flujo.usar_llm(...)`, el control de admisión
+    con `flujo.usar_admision(...)`, y `flujo.mensajes(thread_id)` devuelve el historial.
+    """
+    from src.flow import flow_agente
+    from src.util.util_admision import ControlAdmision
+
+    async def buscar_falso(consulta: str) -> str:
+        return CONTEXTO_FALSO
+
+    monkeypatch.setattr(flow_agente, "abuscar_base_conocimientos_tool", buscar_falso)
+    monkeypatch.setattr(flow_agente, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(flow_agente, "get_answer_bank", lambda: None)
+    monkeypatch.setattr(flow_agente, "get_single_flight", lambda: None)
+    memoria = MemorySaver()
+    monkeypatch.setattr(flow_agente, "get_memory", lambda: memoria)
+    control = ControlAdmision(max_concurrencia=4, max_cola=4, espera_max_s=1)
+    monkeypatch.setattr(flow_agente, "get_control_admision", lambda: control)
+    flow_agente.get_app_graph.cache_clear()
+
+    def usar_llm(llm):
+        monkeypatch.setattr(flow_agente, "get_llm_chain", lambda: llm)
+        return llm
+
+    def usar_admision(nuevo):
+        monkeypatch.setattr(flow_agente, "get_control_admision", lambda: nuevo)
+        return nuevo
+
+    async def mensajes(thread_id: str) -> list:
+        estado = await flow_agente.get_app_graph().aget_state({"configurable": {"thread_id": thread_id}})
+        return [(type(m).__name__, m.content) for m in estado.values.get("messages", [])]
+
+    yield SimpleNamespace(modulo=flow_agente, usar_llm=usar_llm, usar_admision=usar_admision, mensajes=mensajes)
+    flow_agente.get_app_graph.cache_clear()
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+
+def test_importar_la_app_no_construye_settings():
+    # Sin GEMINI_API_KEY, Settings() falla: si la importación lo construyera, fallaría aquí
+    entorno = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    proceso = subprocess.run(
+        [sys.executable, "-c", "import app, logging; assert not logging.getLogger().handlers"],
+        cwd=BACKEND_DIR, env=entorno, capture_output=True, text=True
+    )
+    assert proceso.returncode == 0, proceso.stderr[-2000:]
@@ -0,0 +1,96 @@
+import orjson
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from conftest import LLMFalso
+from src.api import chat_router
+from src.util.util_resiliencia import LLMNoDisponible
+
+
+@pytest.fixture
+def cliente(flujo):
+    chat_router.get_turnos.cache_clear()
+    app = FastAPI()
+    app.include_router(chat_router.router, prefix="/api")
+    with TestClient(app) as cliente:
+        yield cliente
+    chat_router.get_turnos.cache_clear()
+
+
+def recibir_turno(ws) -> list:
+    mensajes = []
+    while not mensajes or mensajes[-1]["type"] not in ("fin", "error"):
+        mensajes.append(ws.receive_json())
+    return mensajes
+
+
+def test_ws_pedidos_invalidos_no_cierran_la_conexion(cliente):
+    with cliente.websocket_connect("/api/chat/ws/t1") as ws:
+        for pedido in ("no es json", "[1, 2]", '{"type": "reanudar", "turno": "x", "desde": "abc"}',
+                       '{"type": "mensaje", "message": 3}', '{"type": "mensaje", "message": "hola", "reanudable": 1}',
+                       '{"type": "otro"}'):
+            ws.send_text(pedido)
+            assert ws.receive_json() == {"type": "error", "motivo": "pedido_invalido"}
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json() == {"type": "error", "motivo": "pedido_invalido"}
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_ws_turno_completo_y_reanudacion(cliente, flujo):
+    flujo.usar_llm(LLMFalso(["Come ", "sangrecita."]))
+    with cliente.websocket_connect("/api/chat/ws/t1") as ws:
+        ws.send_json({"type": "mensaje", "message": "¿Qué alimentos tienen hierro?"})
+        mensajes = recibir_turno(ws)
+        assert mensajes[0]["type"] == "inicio"
+        assert mensajes[-1]["type"] == "fin"
+        texto = "".join(m["token"] for m in mensajes if m["type"] == "token")
+        assert texto == "Come sangrecita."
+
+        # Reanudar desde el primer frame devuelve solo el resto
+        ws.send_json({"type": "reanudar", "turno": mensajes[0]["turno"], "desde": 1})
+        resto = recibir_turno(ws)
+        assert [m["seq"] for m in resto if m["type"] == "token"] == list(range(2, mensajes[-1]["seq"] + 1))
+
+
+def test_ws_conexion_nueva_reemplaza_a_la_anterior(cliente):
+    with cliente.websocket_connect("/api/chat/ws/t1") as vieja:
+        with cliente.websocket_connect("/api/chat/ws/t1") as nueva:
+            with pytest.raises(Exception) as error:
+                vieja.receive_json()
+            assert getattr(error.value, "code", None) == 4000
+            nueva.send_json({"type": "ping"})
+            assert nueva.receive_json() == {"type": "pong"}
+
+
+def test_sse_turno_fallido_a_mitad_termina_con_evento_de_error(cliente, monkeypatch):
+    async def frames_que_fallan():
+        yield "Parte uno"
+        raise LLMNoDisponible("error")
+
+    monkeypatch.setattr(
+        chat_router, "iniciar_turno",
+        lambda message, thread_id, reanudable: chat_router.get_turnos().iniciar(thread_id, frames_que_fallan())
+    )
+    respuesta = cliente.post("/api/chat/stream", json={"message": "hola?", "thread_id": "t1"})
+    datos = [linea[6:] for linea in respuesta.text.splitlines() if linea.startswith("data: ")]
+    assert orjson.loads(datos[0]) == {"token": "Parte uno"}
+    assert orjson.loads(datos[-1]) == {"error": "error", "retry_after": 5}
+    assert "[DONE]" not in datos
+
+
+def test_solo_los_clientes_reanudables_tienen_periodo_de_gracia(cliente, flujo, monkeypatch):
+    turnos = []
+    original = chat_router.iniciar_turno
+
+    def iniciar(message, thread_id, reanudable):
+        turnos.append(original(message, thread_id, reanudable))
+        return turnos[-1]
+
+    flujo.usar_llm(LLMFalso(["Come sangrecita."]))
+    monkeypatch.setattr(chat_router, "iniciar_turno", iniciar)
+    cliente.post("/api/chat/stream", json={"message": "¿Qué alimentos tienen hierro?", "thread_id": "t1"})
+    cliente.post("/api/chat/stream", json={"message": "¿Y el hígado?", "thread_id": "t1", "reanudable": True})
+
+    assert [t.gracia_s for t in turnos] == [0.0, chat_router.settings.STREAM_RESUME_GRACE_S]
@@ -0,0 +1,179 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from conftest import LLMFalso
+from src.util.util_admision import ControlAdmision, Saturado
+from src.util.util_resiliencia import LLMNoDisponible
+
+
+def test_turno_rechazado_por_admision_no_cambia_el_hilo(flujo):
+    flujo.usar_llm(LLMFalso(["Come ", "sangrecita."]))
+
+    async def escenario():
+        await flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "t1")
+        antes = await flujo.mensajes("t1")
+
+        # Sin lugar en vuelo ni en cola: el turno siguiente se rechaza con 429
+        control = flujo.usar_admision(ControlAdmision(max_concurrencia=1, max_cola=0, espera_max_s=1))
+        async with control.ranura_llm():
+            with pytest.raises(Saturado):
+                await flujo.modulo.run_flow("¿Y el bazo?", "t1")
+        assert await flujo.mensajes("t1") == antes
+
+        # El reintento queda como un turno normal, sin mensajes del usuario repetidos
+        await flujo.modulo.run_flow("¿Y el bazo?", "t1")
+        return antes, await flujo.mensajes("t1")
+
+    antes, despues = asyncio.run(escenario())
+    assert [tipo for tipo, _ in antes] == ["HumanMessage", "AIMessage"]
+    assert [tipo for tipo, _ in despues] == ["HumanMessage", "AIMessage", "HumanMessage", "AIMessage"]
+
+
+def test_turno_rechazado_en_streaming_no_cambia_el_hilo(flujo):
+    flujo.usar_llm(LLMFalso(["Come ", "sangrecita."]))
+    control = flujo.usar_admision(ControlAdmision(max_concurrencia=1, max_cola=0, espera_max_s=1))
+
+    async def escenario():
+        async with control.ranura_llm():
+            with pytest.raises(Saturado):
+                async for _ in flujo.modulo.run_flow_stream("¿Qué alimentos tienen hierro?", "t2"):
+                    pass
+        return await flujo.mensajes("t2")
+
+    assert asyncio.run(escenario()) == []
+
+
+def test_respuesta_cortada_se_guarda_en_el_hilo_pero_no_en_la_cache(flujo, monkeypatch):
+    from src.prompts.system_prompts import AVISO_RESPUESTA_CORTADA
+    from src.util.util_cache import AnswerCache
+
+    cache = AnswerCache(maxsize=16, ttl=60, version_fn=lambda: "v1")
+    monkeypatch.setattr(flujo.modulo, "get_answer_cache", lambda: cache)
+    llm = flujo.usar_llm(LLMFalso(["Parte uno ", "parte dos"], fallar_en=1, error=LLMNoDisponible("error")))
+
+    respuesta = asyncio.run(flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "t1"))
+    assert respuesta == "Parte uno " + AVISO_RESPUESTA_CORTADA
+
+    # Otra conversación con la misma pregunta vuelve a llamar a Gemini
+    llm.fallar_en = None
+    respuesta = asyncio.run(flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "t2"))
+    assert respuesta == "Parte uno parte dos"
+    assert llm.llamadas == 2
+
+
+def test_fallo_antes_del_primer_token_deshace_el_turno(flujo):
+    flujo.usar_llm(LLMFalso(["Hola"], fallar_en=0, error=LLMNoDisponible("plazo_ttft")))
+
+    async def escenario():
+        with pytest.raises(LLMNoDisponible):
+            await flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "t1")
+        return await flujo.mensajes("t1")
+
+    assert asyncio.run(escenario()) == []
+
+
+def test_single_flight_los_unidos_reciben_el_error_de_una_respuesta_cortada(flujo, monkeypatch):
+    from src.util.util_singleflight import SingleFlight
+
+    single_flight = SingleFlight()
+    monkeypatch.setattr(flujo.modulo, "get_single_flight", lambda: single_flight)
+    flujo.usar_llm(LLMFalso(["Parte uno ", "parte dos"], fallar_en=1, error=LLMNoDisponible("error"), retardo_s=0.05))
+
+    async def escenario():
+        lider = asyncio.create_task(flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "lider"))
+        await asyncio.sleep(0.01)
+        unido = asyncio.create_task(flujo.modulo.run_flow("¿Qué alimentos tienen hierro?", "unido"))
+        resultados = await asyncio.gather(lider, unido, return_exceptions=True)
+        return resultados, await flujo.mensajes("lider"), await flujo.mensajes("unido")
+
+    (respuesta_lider, error_unido), hilo_lider, hilo_unido = asyncio.run(escenario())
+    assert respuesta_lider.startswith("Parte uno ")
+    assert isinstance(error_unido, LLMNoDisponible)
+    assert [tipo for tipo, _ in hilo_lider] == ["HumanMessage", "AIMessage"]
+    assert hilo_unido == []
+
+
+def test_respuesta_cortada_en_streaming_termina_con_el_aviso(flujo):
+    from src.prompts.system_prompts import AVISO_RESPUESTA_CORTADA
+
+    flujo.usar_llm(LLMFalso(["Parte uno ", "parte dos"], fallar_en=1, error=LLMNoDisponible("error")))
+
+    async def escenario():
+        return [trozo async for trozo in flujo.modulo.run_flow_stream("¿Qué alimentos tienen hierro?", "t1")]
+
+    assert asyncio.run(escenario()) == ["Parte uno ", AVISO_RESPUESTA_CORTADA]
+
+
+class AdmisionQueRechaza:
+    """Control de admisión que rechaza las primeras `rechazos` llamadas (con `retry_after`)."""
+
+    def __init__(self, rechazos: int, retry_after: float = 0):
+        self.rechazos = rechazos
+        self.retry_after = retry_after
+
+    @asynccontextmanager
+    async def ranura_llm(self):
+        if self.rechazos:
+            self.rechazos -= 1
+            raise Saturado("cola_llena", self.retry_after)
+        yield
+
+
+def test_lote_reintenta_tras_429_sin_repetir_el_mensaje(flujo):
+    from src.schemas.models import ChatRequest
+
+    flujo.usar_llm(LLMFalso(["Come ", "sangrecita."]))
+    flujo.usar_admision(AdmisionQueRechaza(rechazos=2))
+
+    async def escenario():
+        items = [ChatRequest(message="¿Qué alimentos tienen hierro?", thread_id="lote")]
+        resultados = [r async for r in flujo.modulo.run_flow_batch(items, paralelismo=2)]
+        return resultados, await flujo.mensajes("lote")
+
+    resultados, hilo = asyncio.run(escenario())
+    assert resultados[0]["reply"] == "Come sangrecita."
+    assert [tipo for tipo, _ in hilo] == ["HumanMessage", "AIMessage"]
+
+
+def test_lote_espera_el_retry_after_sin_ocupar_un_lugar(flujo):
+    from src.schemas.models import ChatRequest
+
+    flujo.usar_llm(LLMFalso(["Come ", "sangrecita."]))
+    flujo.usar_admision(AdmisionQueRechaza(rechazos=1, retry_after=0.1))
+
+    async def escenario():
+        items = [ChatRequest(message="¿Qué alimentos tienen hierro?", thread_id="a"),
+                 ChatRequest(message="¿Qué es la anemia?", thread_id="b")]
+        return [r async for r in flujo.modulo.run_flow_batch(items, paralelismo=1)]
+
+    resultados = asyncio.run(escenario())
+    # Mientras el primero espera su Retry-After, el segundo usa el único lugar del lote
+    assert [r["index"] for r in resultados] == [1, 0]
+    assert all(r["reply"] == "Come sangrecita." for r in resultados)
+    assert resultados[1]["timings"]["queue_ms"] >= 100
+
+
+def test_el_banco_de_respuestas_solo_responde_el_primer_turno(flujo, monkeypatch):
+    from conftest import CONTEXTO_FALSO
+    from src.util.util_answer_bank import AnswerBank
+    from src.util.util_cache import hash_texto
+
+    banco = AnswerBank([{"pregunta": "¿Qué es la anemia?", "hash_contexto": hash_texto(CONTEXTO_FALSO),
+                         "respuesta": "Respuesta del banco."}])
+    monkeypatch.setattr(flujo.modulo, "get_answer_bank", lambda: banco)
+    llm = flujo.usar_llm(LLMFalso(["Respuesta ", "con historial."]))
+
+    async def escenario():
+        primera = await flujo.modulo.run_flow("¿Qué es la anemia?", "t1")
+        # La misma pregunta a mitad de conversación depende del historial: va al modelo
+        await flujo.modulo.run_flow("¿Y el bazo?", "t1")
+        segunda = await flujo.modulo.run_flow("¿Qué es la anemia?", "t1")
+        return primera, segunda
+
+    primera, segunda = asyncio.run(escenario())
+    assert primera == "Respuesta del banco."
+    assert segunda == "Respuesta con historial."
+    assert banco.hits == 1
+    assert llm.llamadas == 2
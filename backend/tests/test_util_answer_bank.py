@@ -0,0 +1,61 @@
+import json
+import os
+
+from src.util.util_answer_bank import AnswerBank
+from src.util.util_cache import hash_texto
+
+CONTEXTO = "El hígado y la sangrecita tienen mucho hierro."
+
+
+def escribir_banco(ruta, respuestas: dict, mtime_ns: int):
+    entradas = [{"pregunta": p, "hash_contexto": hash_texto(CONTEXTO), "respuesta": r}
+                for p, r in respuestas.items()]
+    ruta.write_text(json.dumps({"entradas": entradas}), encoding="utf-8")
+    # mtime explícito: dos escrituras seguidas pueden caer en el mismo tick del reloj
+    os.utime(ruta, ns=(mtime_ns, mtime_ns))
+
+
+def test_responde_solo_si_el_contexto_es_el_mismo(tmp_path):
+    ruta = tmp_path / "answer_bank.json"
+    escribir_banco(ruta, {"¿Qué es la anemia?": "Es la falta de hierro."}, 1_000_000_000)
+    banco = AnswerBank.desde_archivo(ruta)
+
+    assert banco.buscar("¿que es la ANEMIA", CONTEXTO) == "Es la falta de hierro."
+    assert banco.buscar("¿Qué es la anemia?", "otro contexto") is None
+    assert banco.buscar("¿Qué es el zinc?", CONTEXTO) is None
+    assert (banco.hits, banco.obsoletas) == (1, 1)
+
+
+def test_se_recarga_cuando_cambia_el_archivo(tmp_path):
+    ruta = tmp_path / "answer_bank.json"
+    escribir_banco(ruta, {"¿Qué es la anemia?": "Versión vieja."}, 1_000_000_000)
+    banco = AnswerBank.desde_archivo(ruta)
+    assert banco.buscar("¿Qué es la anemia?", CONTEXTO) == "Versión vieja."
+
+    escribir_banco(ruta, {"¿Qué es la anemia?": "Versión nueva.", "¿Qué es el zinc?": "Un mineral."},
+                   2_000_000_000)
+
+    assert banco.buscar("¿Qué es la anemia?", CONTEXTO) == "Versión nueva."
+    assert banco.buscar("¿Qué es el zinc?", CONTEXTO) == "Un mineral."
+    assert banco.stats()["recargas"] == 1
+
+
+def test_un_archivo_roto_no_borra_el_banco_cargado(tmp_path):
+    ruta = tmp_path / "answer_bank.json"
+    escribir_banco(ruta, {"¿Qué es la anemia?": "Es la falta de hierro."}, 1_000_000_000)
+    banco = AnswerBank.desde_archivo(ruta)
+
+    ruta.write_text("{no es json", encoding="utf-8")
+    os.utime(ruta, ns=(2_000_000_000, 2_000_000_000))
+
+    assert banco.buscar("¿Qué es la anemia?", CONTEXTO) == "Es la falta de hierro."
+
+
+def test_el_banco_aparece_despues_de_arrancar(tmp_path):
+    ruta = tmp_path / "answer_bank.json"
+    banco = AnswerBank.desde_archivo(ruta)
+    assert banco.buscar("¿Qué es la anemia?", CONTEXTO) is None
+
+    escribir_banco(ruta, {"¿Qué es la anemia?": "Es la falta de hierro."}, 1_000_000_000)
+
+    assert banco.buscar("¿Qué es la anemia?", CONTEXTO) == "Es la falta de hierro."
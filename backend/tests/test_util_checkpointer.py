@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import START, MessagesState, StateGraph
+
+from src.util.util_checkpointer import SQLiteCheckpointer
+
+
+def grafo(checkpointer):
+    """Grafo mínimo: responde con el largo del último mensaje."""
+    def responder(state: MessagesState):
+        return {"messages": [AIMessage(content=str(len(state["messages"][-1].content)))]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("responder", responder)
+    builder.add_edge(START, "responder")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_el_historial_sobrevive_a_una_instancia_nueva(tmp_path):
+    ruta = str(tmp_path / "checkpoints.sqlite")
+    grafo(SQLiteCheckpointer(ruta)).invoke({"messages": [HumanMessage(content="hola")]}, config("a"))
+    grafo(SQLiteCheckpointer(ruta)).invoke({"messages": [HumanMessage(content="¿y el hierro?")]}, config("a"))
+
+    mensajes = grafo(SQLiteCheckpointer(ruta)).get_state(config("a")).values["messages"]
+    assert [m.content for m in mensajes] == ["hola", "4", "¿y el hierro?", "13"]
+
+
+def test_los_mensajes_largos_se_comprimen_y_se_leen_igual(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    largo = "sangrecita " * 500
+    grafo(checkpointer).invoke({"messages": [HumanMessage(content=largo)]}, config("a"))
+
+    tipos = {fila[0] for fila in checkpointer._conexion().execute("SELECT tipo FROM checkpoints")}
+    assert any(t.endswith("+zstd") for t in tipos)
+    assert grafo(checkpointer).get_state(config("a")).values["messages"][0].content == largo
+
+
+def test_cada_hilo_conserva_solo_sus_ultimos_checkpoints(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), checkpoints_por_thread=2)
+    app = grafo(checkpointer)
+    for i in range(4):
+        app.invoke({"messages": [HumanMessage(content=f"pregunta {i}")]}, config("a"))
+
+    assert len(list(checkpointer.list(config("a")))) == 2
+    # El último checkpoint tiene el historial completo
+    assert len(app.get_state(config("a")).values["messages"]) == 8
+
+
+def test_los_hilos_inactivos_caducan(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), idle_ttl_s=60)
+    app = grafo(checkpointer)
+    app.invoke({"messages": [HumanMessage(content="hola")]}, config("viejo"))
+    app.invoke({"messages": [HumanMessage(content="hola")]}, config("nuevo"))
+    conn = checkpointer._conexion()
+    conn.execute("UPDATE threads SET ultimo_acceso = ? WHERE thread_id = 'viejo'", (time.time() - 120,))
+
+    checkpointer._limpiar(conn, time.time())
+
+    assert checkpointer.contar_threads() == 1
+    assert checkpointer.get_tuple(config("viejo")) is None
+    assert checkpointer.get_tuple(config("nuevo")) is not None
+
+
+def test_sobre_el_tope_de_bytes_se_desalojan_los_menos_usados(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    app = grafo(checkpointer)
+    for thread_id in ("a", "b", "c"):
+        app.invoke({"messages": [HumanMessage(content="hola " * 50)]}, config(thread_id))
+    conn = checkpointer._conexion()
+    tamano = conn.execute("SELECT MAX(bytes) FROM threads").fetchone()[0]
+    conn.execute("UPDATE threads SET ultimo_acceso = 1 WHERE thread_id = 'a'")
+    checkpointer.max_bytes = tamano * 2
+
+    checkpointer._limpiar(conn, time.time())
+
+    quedan = {fila[0] for fila in conn.execute("SELECT thread_id FROM threads")}
+    assert quedan == {"b", "c"}
+
+
+def test_borrar_un_hilo_y_api_asincrona(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"))
+    app = grafo(checkpointer)
+
+    async def escenario():
+        await app.ainvoke({"messages": [HumanMessage(content="hola")]}, config("a"))
+        antes = await checkpointer.aget_tuple(config("a"))
+        await checkpointer.adelete_thread("a")
+        return antes, await checkpointer.aget_tuple(config("a"))
+
+    antes, despues = asyncio.run(escenario())
+
+    assert antes is not None
+    assert despues is None
+    assert checkpointer.contar_threads() == 0
@@ -0,0 +1,121 @@
+from src.util.util_compresion import SEPARADOR_TROZOS, _dividir, comprimir_contexto
+from src.util.util_historial import contar_tokens
+
+# Trozos reales de output_chunks.json (ingest colapsa los espacios: llegan en una sola línea)
+TROZO_TABLA_HIERRO = (
+    "(mg/día) Mujeres Varones Niños de 6 meses a 8 años 11 Niños de 9 años a adolescentes de 13 años 8 "
+    "Adolescentes de 14 a 18 años 15 11 Gestantes 30 Mujeres que dan de lactar 15 Fuente: Adaptado de "
+    "FAO/OMS. (2001). Human Vitamin and Mineral Requirements. Food and Nutrition Division - FAO. Roma, "
+    "Italia (60) Tabla N° 2 Contenido de Hierro en mg por ración de 2 cucharadas en diversos alimentos "
+    "ALIMENTOS Cantidad de Hierro en mg por ración de 2 cucharadas (30 gramos) Sangre de pollo cocida 8.9 "
+    "Bazo de res 8.6 Riñón de res 3.4 Hígado de pollo 2.6 Charqui de res 2.0 Pulmón (Bofe) 2.0 Hígado de "
+    "res 1.6 Carne seca de llama 1.2 Corazón de res 1.1 Carne de Carnero 1.1 Pavo 1.1 Carne de res 1.0 "
+    "Pescado 0.9 Carne de pollo 0.5 Fuente: CENAN/INS/MINSA. 2009 Tabla Peruana de Composición de "
+    "Alimentos 7ma. Edición. Lima, Perú (61)"
+)
+TROZO_MENCION_TABLA = (
+    "la Organización Mundial de la Salud. • En el caso de diagnosticarse anemia en cualquier grupo de "
+    "edad, se debe iniciar el tratamiento inmediato según esta Norma. Para el diagnóstico se usan los "
+    "valores de la Tabla N° 3, según la edad."
+)
+
+# Documento curado real (output_json_preview.json): porciones y frecuencias en listas
+DOC_FRECUENCIA = (
+    "Pautas de Consistencia y Frecuencia Alimentaria (6 a 11 meses)\n"
+    "\n"
+    "Palabras clave: consistencia, frecuencia, aplastado, triturado, papillas, puré, 6 meses, 7 meses, 8 meses, 9 meses, 10 meses, 11 meses, tres comidas\n"
+    "\n"
+    "La consistencia de los alimentos complementarios debe modificarse gradualmente de acuerdo a la edad del niño para apoyar el desarrollo de habilidades motoras como la masticación.\n"
+    "\n"
+    "**Consistencia por Edad:**\n"
+    "- **6 a 8 meses:** Alimentos bajo la forma de **papillas, purés** y alimentos **semisólidos**. La preparación debe ser **aplastada**.\n"
+    "- **9 a 11 meses:** Alimentos deben ser **triturados o molidos** o **desmenuzados**, y **picados en pequeños trozos**. A partir de los nueve meses, los niños deben consumir los alimentos **picaditos**.\n"
+    "\n"
+    "**Frecuencia de Comidas:**\n"
+    "- **6 meses:** 2 comidas diarias.\n"
+    "- **7 a 8 meses:** 3 comidas diarias.\n"
+    "- **9 a 11 meses:** 3 comidas diarias **más 1 refrigerio** (como mazamorras, papillas, papa, camote, frutas, pan).\n"
+    "- **Importante:** La lactancia materna debe continuar **a libre demanda** durante todo este periodo."
+)
+FRECUENCIA_DE_COMIDAS = (
+    "**Frecuencia de Comidas:**\n"
+    "- **6 meses:** 2 comidas diarias.\n"
+    "- **7 a 8 meses:** 3 comidas diarias.\n"
+    "- **9 a 11 meses:** 3 comidas diarias **más 1 refrigerio** (como mazamorras, papillas, papa, camote, frutas, pan).\n"
+    "- **Importante:** La lactancia materna debe continuar **a libre demanda** durante todo este periodo."
+)
+
+FILAS_HIERRO = [
+    "Sangre de pollo cocida 8.9", "Bazo de res 8.6", "Riñón de res 3.4", "Hígado de pollo 2.6",
+    "Charqui de res 2.0", "Pulmón (Bofe) 2.0", "Hígado de res 1.6", "Carne seca de llama 1.2",
+    "Corazón de res 1.1", "Carne de Carnero 1.1", "Pavo 1.1", "Carne de res 1.0", "Pescado 0.9",
+    "Carne de pollo 0.5",
+]
+
+
+def test_detecta_la_tabla_en_el_texto_colapsado():
+    tablas = [u for u in _dividir(TROZO_TABLA_HIERRO, 0) if u.es_tabla]
+
+    assert len(tablas) == 1
+    encabezado, *filas = tablas[0].filas
+    assert encabezado.startswith("Tabla N° 2 Contenido de Hierro")
+    assert encabezado.endswith("Sangre de pollo cocida 8.9")
+    assert filas == FILAS_HIERRO[1:]
+
+
+def test_una_mencion_a_una_tabla_no_es_una_tabla():
+    assert not any(u.es_tabla for u in _dividir(TROZO_MENCION_TABLA, 0))
+
+
+def test_la_tabla_entra_entera_si_alcanza_el_presupuesto():
+    salida = comprimir_contexto(TROZO_TABLA_HIERRO, "¿cuánto hierro tiene el bazo de res?", 1000)
+
+    assert " ".join(FILAS_HIERRO) in salida
+
+
+def test_la_tabla_que_no_entra_se_recorta_por_filas_enteras():
+    consulta = "¿cuánto hierro tiene el bazo de res y el hígado de pollo?"
+    salida = comprimir_contexto(TROZO_TABLA_HIERRO, consulta, 90)
+
+    assert contar_tokens(salida) <= 90
+    assert salida.startswith("Tabla N° 2 Contenido de Hierro")
+    # Quedan las filas que pide la consulta y ninguna a medias
+    assert "Bazo de res 8.6" in salida
+    assert "Hígado de pollo 2.6" in salida
+    cuerpo = salida.split("Sangre de pollo cocida 8.9 ", 1)[1]
+    assert cuerpo == " ".join(f for f in FILAS_HIERRO[1:] if f in cuerpo)
+    assert len(cuerpo) < len(" ".join(FILAS_HIERRO[1:]))
+
+
+def test_los_trozos_siguen_separados():
+    contexto = TROZO_MENCION_TABLA + SEPARADOR_TROZOS + TROZO_TABLA_HIERRO
+    salida = comprimir_contexto(contexto, "¿qué valores de la tabla se usan para diagnosticar anemia?", 1000)
+
+    assert SEPARADOR_TROZOS in salida
+
+
+def test_la_lista_con_su_rotulo_es_una_sola_unidad():
+    listas = [u.filas for u in _dividir(DOC_FRECUENCIA, 0) if u.es_tabla]
+
+    assert [filas[0] for filas in listas] == ["**Consistencia por Edad:**", "**Frecuencia de Comidas:**"]
+    assert "\n".join(listas[1]) == FRECUENCIA_DE_COMIDAS
+
+
+def test_el_documento_curado_entra_entero_con_el_presupuesto_por_defecto():
+    from src.core.config import Settings
+
+    presupuesto = Settings.model_fields["CONTEXT_TOKEN_BUDGET"].default
+    salida = comprimir_contexto(DOC_FRECUENCIA, "¿Cuántas comidas al día debe comer mi bebé de 7 meses?", presupuesto)
+
+    assert FRECUENCIA_DE_COMIDAS in salida
+    assert "- **9 a 11 meses:** Alimentos deben ser **triturados o molidos**" in salida
+
+
+def test_la_lista_que_no_entra_se_recorta_por_items_enteros():
+    salida = comprimir_contexto(DOC_FRECUENCIA, "¿Cuántas comidas al día debe comer mi bebé de 7 meses?", 150)
+
+    assert contar_tokens(salida) <= 150
+    assert "**Frecuencia de Comidas:**\n- **6 meses:** 2 comidas diarias." in salida
+    assert "- **7 a 8 meses:** 3 comidas diarias." in salida
+    # Ningún ítem a medias (en este documento cada línea es un ítem, un rótulo o una oración)
+    assert set(salida.split("\n")) <= set(DOC_FRECUENCIA.split("\n"))
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from src.util.util_reanudable import FueraDeVentana, TurnosReanudables
+
+
+async def generar(textos, liberar: asyncio.Event = None):
+    for i, texto in enumerate(textos):
+        if liberar is not None and i == 1:
+            await liberar.wait()
+        yield texto
+
+
+async def leer(turno, desde=0):
+    return [frame async for frame in turno.leer_desde(desde)]
+
+
+def test_reanudar_desde_el_ultimo_frame_recibido():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10)
+        turno = turnos.iniciar("hilo", generar(["a", "b", "c"]))
+        await turno.tarea
+        reanudado = turnos.obtener(turno.id, "hilo")
+        return await leer(turno), await leer(reanudado, desde=1), turnos
+
+    completo, resto, turnos = asyncio.run(escenario())
+
+    assert completo == [(1, "a"), (2, "b"), (3, "c")]
+    assert resto == [(2, "b"), (3, "c")]
+    assert turnos.stats()["reanudados"] == 1
+
+
+def test_el_lector_sigue_en_vivo_tras_el_buffer():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10)
+        liberar = asyncio.Event()
+        turno = turnos.iniciar("hilo", generar(["a", "b", "c"], liberar))
+        await turno.esperar_inicio()
+        lectura = asyncio.create_task(leer(turno))
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return await lectura
+
+    assert asyncio.run(escenario()) == [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_frames_fuera_del_buffer():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=2, ttl_s=60, max_turnos=10)
+        turno = turnos.iniciar("hilo", generar(["a", "b", "c", "d"]))
+        await turno.tarea
+        with pytest.raises(FueraDeVentana):
+            await leer(turno, desde=1)
+        return await leer(turno, desde=2)
+
+    assert asyncio.run(escenario()) == [(3, "c"), (4, "d")]
+
+
+def test_otra_conversacion_no_puede_reanudar_el_turno():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10)
+        turno = turnos.iniciar("hilo", generar(["a"]))
+        await turno.tarea
+        return turnos.obtener(turno.id, "otro_hilo"), turnos.obtener("no_existe", "hilo")
+
+    assert asyncio.run(escenario()) == (None, None)
+
+
+def test_error_antes_del_primer_frame_se_relanza_en_esperar_inicio():
+    async def falla():
+        raise RuntimeError("gemini caído")
+        yield  # pragma: no cover
+
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10)
+        turno = turnos.iniciar("hilo", falla())
+        with pytest.raises(RuntimeError):
+            await turno.esperar_inicio()
+
+    asyncio.run(escenario())
+
+
+def test_turno_sin_lectores_se_cancela_y_no_se_puede_reanudar():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10)
+        turno = turnos.iniciar("hilo", generar(["a", "b"], asyncio.Event()))
+        await turno.esperar_inicio()
+        turno.conectar()
+        turno.desconectar()
+        with pytest.raises(asyncio.CancelledError):
+            await turno.tarea
+        return turno, turnos.obtener(turno.id, "hilo")
+
+    turno, reanudado = asyncio.run(escenario())
+
+    assert turno.cancelado and turno.terminado
+    assert reanudado is None
+
+
+def test_el_cliente_que_vuelve_en_la_gracia_evita_la_cancelacion():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=10, gracia_s=0.05)
+        liberar = asyncio.Event()
+        turno = turnos.iniciar("hilo", generar(["a", "b"], liberar))
+        await turno.esperar_inicio()
+        turno.conectar()
+        turno.desconectar()
+        await asyncio.sleep(0.01)
+        turno.conectar()
+        await asyncio.sleep(0.1)
+        liberar.set()
+        await turno.tarea
+        return turno
+
+    turno = asyncio.run(escenario())
+
+    assert not turno.cancelado
+    assert turno.ultimo_seq == 2
+
+
+def test_se_descartan_primero_los_turnos_terminados_mas_antiguos():
+    async def escenario():
+        turnos = TurnosReanudables(max_frames=10, ttl_s=60, max_turnos=2)
+        primero = turnos.iniciar("hilo", generar(["a"]))
+        await primero.tarea
+        segundo = turnos.iniciar("hilo", generar(["b"]))
+        await segundo.tarea
+        turnos.iniciar("hilo", generar(["c"]))
+        return list(turnos.turnos), primero.id, segundo.id
+
+    ids, primero, segundo = asyncio.run(escenario())
+
+    assert primero not in ids
+    assert segundo in ids
+    assert len(ids) == 2
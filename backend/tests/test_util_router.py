@@ -0,0 +1,51 @@
+import pytest
+
+from src.util.util_router import RUTA_RAG, RUTA_SALIDA_EMERGENCIA, RUTA_SALUDO, clasificar_mensaje
+
+
+@pytest.mark.parametrize("texto", [
+    "Hola",
+    "¡Buenos días, ANMI!",
+    "hola que tal como estas",
+])
+def test_saludos(texto):
+    assert clasificar_mensaje(texto) == RUTA_SALUDO
+
+
+@pytest.mark.parametrize("texto", [
+    "Mi bebé tiene 2 años, ¿qué le doy de comer?",
+    "¿Qué papilla le doy a mi bebé de 3 meses?",
+    "Mi hijo ya tiene dos años",
+    "¿Qué come un niño de 15 meses?",
+    "A los 18 meses, ¿cuánto hierro necesita?",
+    "Mi hija cumplió 2 años la semana pasada",
+    "Mi bebé pesa 6 kg, ¿cuánto sulfato ferroso le doy?",
+    "mi bebe pesa seis kilos",
+    "Mi hija de 7 kilos no quiere comer",
+    "Mi hija pesa 7500 gramos",
+])
+def test_edad_o_peso_personal_va_a_la_salida_de_emergencia(texto):
+    assert clasificar_mensaje(texto) == RUTA_SALIDA_EMERGENCIA
+
+
+@pytest.mark.parametrize("texto", [
+    "¿Qué alimentos tienen hierro?",
+    "Hola, ¿qué alimentos tienen hierro?",
+    "Mi bebé tiene 8 meses, ¿puede comer sangrecita?",
+    "¿Qué papilla le doy a mi bebé de 6 meses?",
+    "Mi hijo cumplió un año",
+    "Tengo 5 meses de embarazo, ¿qué debo comer?",
+    # Edad de la madre o de otra cosa, no del bebé
+    "Tengo 25 años y mi bebé tiene 8 meses, ¿qué le doy?",
+    "Trabajo en un centro de salud con 2 años de experiencia, ¿cómo preparo la papilla?",
+    # Cantidades de comida, no el peso del bebé
+    "Compré 1 kilo de lentejas para mi bebé de 8 meses",
+    "En casa uso 2 kg por semana de hígado, ¿está bien?",
+    "¿Cuál es el peso ideal de un bebé de 9 meses?",
+    # Preguntas generales de crecimiento: "pesa un ..." no es un peso
+    "¿Cuánto pesa un bebé de 8 meses?",
+    "¿Cuánto pesa una niña de 10 meses?",
+    "¿Cuánto pesa una cucharada de hígado?",
+])
+def test_preguntas_de_nutricion_van_al_flujo_normal(texto):
+    assert clasificar_mensaje(texto) == RUTA_RAG
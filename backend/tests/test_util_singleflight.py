@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from src.util.util_singleflight import SingleFlight
+
+
+def productor_controlado(trozos, liberar: asyncio.Event, contador: list):
+    """Emite `trozos` de a uno, esperando `liberar` antes del segundo (da tiempo a que se unan otros)."""
+    async def productor(emitir):
+        contador.append(1)
+        for i, trozo in enumerate(trozos):
+            if i == 1:
+                await liberar.wait()
+            emitir(trozo)
+            await asyncio.sleep(0)
+        return "".join(trozos)
+    return productor
+
+
+def test_peticiones_identicas_comparten_una_generacion():
+    async def escenario():
+        sf = SingleFlight()
+        liberar = asyncio.Event()
+        llamadas = []
+        productor = productor_controlado(["Hola", ", ", "mamá"], liberar, llamadas)
+        recibido_a, recibido_b = [], []
+
+        lider = asyncio.create_task(sf.ejecutar("clave", productor, recibido_a.append))
+        await asyncio.sleep(0.01)
+        seguidor = asyncio.create_task(sf.ejecutar("clave", productor, recibido_b.append))
+        await asyncio.sleep(0.01)
+        liberar.set()
+
+        return await lider, await seguidor, recibido_a, recibido_b, llamadas, sf
+
+    (res_a, es_lider_a), (res_b, es_lider_b), recibido_a, recibido_b, llamadas, sf = asyncio.run(escenario())
+
+    assert len(llamadas) == 1
+    assert (es_lider_a, es_lider_b) == (True, False)
+    assert res_a == res_b == "Hola, mamá"
+    # El que llegó tarde recibe primero lo ya emitido y luego el resto en vivo
+    assert "".join(recibido_a) == "".join(recibido_b) == "Hola, mamá"
+    assert sf.stats() == {"en_vuelo": 0, "coalescidas": 1}
+
+
+def test_claves_distintas_no_se_agrupan():
+    async def escenario():
+        sf = SingleFlight()
+        llamadas = []
+
+        async def productor(emitir):
+            llamadas.append(1)
+            emitir("ok")
+            return "ok"
+
+        await asyncio.gather(sf.ejecutar("a", productor, lambda t: None),
+                             sf.ejecutar("b", productor, lambda t: None))
+        return llamadas
+
+    assert len(asyncio.run(escenario())) == 2
+
+
+def test_el_error_del_productor_llega_a_todos():
+    async def escenario():
+        sf = SingleFlight()
+        liberar = asyncio.Event()
+
+        async def productor(emitir):
+            emitir("Hola")
+            await liberar.wait()
+            raise RuntimeError("gemini caído")
+
+        lider = asyncio.create_task(sf.ejecutar("clave", productor, lambda t: None))
+        await asyncio.sleep(0.01)
+        seguidor = asyncio.create_task(sf.ejecutar("clave", productor, lambda t: None))
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return await asyncio.gather(lider, seguidor, return_exceptions=True), sf
+
+    resultados, sf = asyncio.run(escenario())
+
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+    assert sf.stats()["en_vuelo"] == 0
+
+
+def test_si_todos_se_van_la_generacion_se_cancela():
+    async def escenario():
+        sf = SingleFlight()
+        cancelada = asyncio.Event()
+
+        async def productor(emitir):
+            emitir("Hola")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelada.set()
+                raise
+
+        peticion = asyncio.create_task(sf.ejecutar("clave", productor, lambda t: None))
+        await asyncio.sleep(0.01)
+        peticion.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await peticion
+        await asyncio.wait_for(cancelada.wait(), 1)
+        return sf
+
+    assert asyncio.run(escenario()).stats()["en_vuelo"] == 0
+
+
+def test_un_suscriptor_lento_recibe_el_resto_al_final():
+    async def escenario():
+        sf = SingleFlight(max_cola=2)
+        trozos = [str(i) for i in range(10)]
+
+        async def productor(emitir):
+            # Emite todo sin ceder el control: la cola de 2 se desborda
+            for trozo in trozos:
+                emitir(trozo)
+            return "".join(trozos)
+
+        recibido = []
+        resultado, _ = await sf.ejecutar("clave", productor, recibido.append)
+        return resultado, recibido
+
+    resultado, recibido = asyncio.run(escenario())
+
+    assert "".join(recibido) == resultado == "0123456789"
@@ -0,0 +1,163 @@
+"""
+Carga concurrente y tolerante a fallos hacia Azure AI Search.
+
+- Lotes acotados por número de documentos y por tamaño en bytes.
+- Varios lotes en vuelo a la vez, con un máximo (la memoria no crece con el corpus).
+- Reintentos con backoff exponencial (tenacity) para errores transitorios; si un lote
+  falla solo en parte, se reintentan únicamente los documentos fallidos.
+- Los documentos que fallan definitivamente se guardan en un archivo "dead letter"
+  (JSON Lines) en lugar de perderse en silencio.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Necesitarás: pip install tenacity azure-core
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+# Límites de Azure: 1000 documentos y 16 MB por petición (dejamos margen)
+MAX_DOCS_POR_LOTE = 1000
+MAX_BYTES_POR_LOTE = 8 * 1024 * 1024
+
+# Códigos por documento que vale la pena reintentar (Azure marca 409 y 422 como transitorios)
+CODIGOS_REINTENTABLES = {408, 409, 422, 429, 500, 502, 503, 504}
+# Errores de red / timeouts antes de tener una respuesta HTTP
+ERRORES_DE_RED = (ServiceRequestError, ServiceResponseError, ConnectionError, TimeoutError)
+
+
+class LoteIncompleto(Exception):
+    """Algunos documentos del lote fallaron con un código reintentable."""
+
+
+def _es_reintentable(error: BaseException) -> bool:
+    if isinstance(error, LoteIncompleto):
+        return True
+    if isinstance(error, HttpResponseError):
+        # La petición entera: timeout, límite de tasa o error del servicio
+        codigo = error.status_code or 0
+        return codigo in (408, 429) or 500 <= codigo < 600
+    # Cualquier otro error (credenciales, documento mal formado, bug) no se arregla reintentando
+    return isinstance(error, ERRORES_DE_RED)
+
+
+class CargadorAzure:
+    """
+    Uso:
+        with CargadorAzure(search_client, workers=4, dead_letter_path="dead_letter.jsonl") as cargador:
+            for doc in documentos:
+                cargador.subir(doc)
+            cargador.borrar(ids_obsoletos)
+        cargador.subidos / cargador.borrados  -> IDs confirmados por Azure
+    """
+
+    def __init__(self, search_client, workers: int = 4, dead_letter_path: str = None,
+                 intentos: int = 5, max_docs: int = MAX_DOCS_POR_LOTE,
+                 max_bytes: int = MAX_BYTES_POR_LOTE):
+        self.search_client = search_client
+        self.dead_letter_path = dead_letter_path
+        self.intentos = intentos
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="azure-upload")
+        # Como máximo `workers` lotes ejecutándose y otros tantos esperando turno
+        self.en_vuelo = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+
+        self.lote = []
+        self.bytes_lote = 0
+        self.num_lotes = 0
+
+        self.subidos = set()
+        self.borrados = set()
+        self.fallidos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cerrar()
+
+    # --- API pública ---
+
+    def subir(self, doc: dict):
+        tamano = len(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
+        if self.lote and (len(self.lote) >= self.max_docs or self.bytes_lote + tamano > self.max_bytes):
+            self._enviar("merge_or_upload_documents", self.lote)
+            self.lote, self.bytes_lote = [], 0
+        self.lote.append(doc)
+        self.bytes_lote += tamano
+
+    def borrar(self, ids: list):
+        for i in range(0, len(ids), self.max_docs):
+            self._enviar("delete_documents", [{"id": doc_id} for doc_id in ids[i:i + self.max_docs]])
+
+    def cerrar(self):
+        if self.lote:
+            self._enviar("merge_or_upload_documents", self.lote)
+            self.lote, self.bytes_lote = [], 0
+        self.pool.shutdown(wait=True)
+
+        print(f"\nCarga completada: {len(self.subidos)} subidos, {len(self.borrados)} borrados, "
+              f"{self.fallidos} fallidos.")
+        if self.fallidos:
+            print(f"  > Los documentos fallidos se guardaron en '{self.dead_letter_path}'.")
+
+    # --- Internos ---
+
+    def _enviar(self, accion: str, lote: list):
+        # Bloquea si ya hay demasiados lotes en vuelo (backpressure hacia el productor)
+        self.en_vuelo.acquire()
+        self.num_lotes += 1
+        futuro = self.pool.submit(self._procesar_lote, accion, lote, self.num_lotes)
+        futuro.add_done_callback(lambda _: self.en_vuelo.release())
+
+    def _procesar_lote(self, accion: str, lote: list, numero: int):
+        pendientes = list(lote)
+        confirmados = set()
+        error_final = None
+
+        def intentar():
+            nonlocal pendientes
+            resultados = getattr(self.search_client, accion)(documents=pendientes)
+            reintentar = set()
+            for r in resultados:
+                if r.succeeded:
+                    confirmados.add(r.key)
+                elif r.status_code in CODIGOS_REINTENTABLES:
+                    reintentar.add(r.key)
+            pendientes = [doc for doc in pendientes if doc["id"] not in confirmados]
+            if reintentar:
+                raise LoteIncompleto(f"{len(reintentar)} documentos con error reintentable")
+
+        try:
+            for intento in Retrying(
+                stop=stop_after_attempt(self.intentos),
+                wait=wait_exponential_jitter(initial=1, max=30),
+                retry=retry_if_exception(_es_reintentable),
+                reraise=True,
+            ):
+                with intento:
+                    intentar()
+        except Exception as e:
+            error_final = str(e)
+
+        with self.lock:
+            if accion == "delete_documents":
+                self.borrados |= confirmados
+            else:
+                self.subidos |= confirmados
+            if pendientes:
+                self._dead_letter(accion, pendientes, error_final or "rechazado por Azure")
+
+        print(f"  > Lote {numero} ({accion}): {len(confirmados)}/{len(lote)} confirmados.")
+
+    def _dead_letter(self, accion: str, documentos: list, error: str):
+        self.fallidos += len(documentos)
+        if not self.dead_letter_path:
+            return
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for doc in documentos:
+                f.write(json.dumps({"accion": accion, "error": error, "documento": doc}, ensure_ascii=False) + "\n")
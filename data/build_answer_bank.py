@@ -0,0 +1,193 @@
+"""
+Construye el banco de respuestas precalculadas para las preguntas frecuentes
+(las opciones rápidas del frontend y otras de preguntas_canonicas.json).
+
+Cada pregunta pasa una vez por el mismo flujo que usa el backend: búsqueda en la base de
+conocimientos + SYSTEM_PROMPT + Gemini. La respuesta se guarda junto con el hash del
+contexto recuperado en 'answer_bank.json', que el backend carga al iniciar y sirve sin
+llamar a Gemini.
+
+Es incremental: solo se regeneran las preguntas nuevas o aquellas cuyo contexto cambió
+(p. ej. después de re-ingestar). ingest.py e ingest_json.py lo ejecutan solos al terminar
+si el banco ya existe (en su dry-run solo muestran qué se regeneraría; se desactiva con
+--sin-banco); usa la misma configuración de búsqueda (RETRIEVER_BACKEND, backend/.env)
+que el backend.
+
+Uso:
+  - Ver qué se regeneraría:  python build_answer_bank.py --dry-run
+  - Construir / actualizar:  python build_answer_bank.py
+  - Regenerar todo:          python build_answer_bank.py --full
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    def load_dotenv(*args, **kwargs):
+        return
+
+# La configuración del backend (GEMINI_API_KEY, RETRIEVER_BACKEND, ...) vive en backend/.env
+load_dotenv(BACKEND_DIR / ".env")
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.core.config import settings
+from src.flow.flow_agente import generar_respuesta
+from src.prompts.system_prompts import SYSTEM_PROMPT
+from src.tools.tool_buscar_base_conocimientos import buscar_base_conocimientos_tool
+from src.util.util_cache import hash_texto
+from src.util.util_resiliencia import LLMNoDisponible
+from src.util.util_router import clasificar_mensaje, RUTA_RAG
+from src.util.util_texto import clave_consulta
+
+DATA_DIR = Path(__file__).parent
+PREGUNTAS_PATH = DATA_DIR / "preguntas_canonicas.json"
+
+
+def leer_banco(ruta: Path) -> dict:
+    if not ruta.exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return {clave_consulta(e["pregunta"]): e for e in json.load(f).get("entradas", [])}
+
+
+def guardar_banco(ruta: Path, entradas: list):
+    banco = {
+        "generado": datetime.now(timezone.utc).isoformat(),
+        "retriever": settings.RETRIEVER_BACKEND,
+        "entradas": entradas,
+    }
+    # Escritura atómica y compacta: el backend nunca lee un archivo a medio escribir
+    tmp = ruta.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(banco, f, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(ruta)
+
+
+async def generar(pregunta: str, contexto: str):
+    """La respuesta de Gemini, o None si falló o se cortó a mitad (no se guarda en el banco)."""
+    mensajes = [
+        SystemMessage(content=SYSTEM_PROMPT.format(
+            contexto_de_la_busqueda_rag=contexto,
+            pregunta_del_usuario=pregunta
+        )),
+        HumanMessage(content=pregunta),
+    ]
+    try:
+        respuesta = await generar_respuesta(mensajes, lambda trozo: None)
+    except LLMNoDisponible as e:
+        print(f"    Gemini no respondió ({e.motivo})")
+        return None
+    if respuesta.additional_kwargs.get("cortada"):
+        print("    La respuesta se cortó a mitad")
+        return None
+    return respuesta.content
+
+
+def actualizar_banco(preguntas_path: Path = PREGUNTAS_PATH, salida: Path = None,
+                     full: bool = False, dry_run: bool = False, solo_si_existe: bool = False):
+    """
+    Regenera las entradas nuevas o cuyo contexto cambió. Los scripts de ingesta lo llaman al
+    terminar con `solo_si_existe=True`: actualizan un banco que ya se usa, pero crearlo (y
+    gastar las llamadas a Gemini) se decide ejecutando este script.
+    """
+    salida = Path(salida or settings.ANSWER_BANK_PATH)
+    if solo_si_existe and not salida.exists():
+        print(f"\nBanco de respuestas: no existe '{salida}', no se actualiza.")
+        return
+    with open(preguntas_path, "r", encoding="utf-8") as f:
+        preguntas = json.load(f)
+    anteriores = leer_banco(salida)
+
+    entradas = []
+    conteo = {"nuevas": 0, "reconstruidas": 0, "sin_cambios": 0, "omitidas": 0, "fallidas": 0}
+    for pregunta in preguntas:
+        clave = clave_consulta(pregunta)
+        if clasificar_mensaje(pregunta) != RUTA_RAG:
+            # El enrutador la responde antes de la búsqueda: el banco nunca se consultaría
+            print(f"  - Omitida (la responde el enrutador): {pregunta}")
+            conteo["omitidas"] += 1
+            continue
+
+        contexto = buscar_base_conocimientos_tool(pregunta)
+        if contexto.startswith(("No se encontraron resultados", "Error al conectar")):
+            print(f"  - Omitida ({contexto}): {pregunta}")
+            conteo["omitidas"] += 1
+            continue
+
+        hash_contexto = hash_texto(contexto)
+        anterior = anteriores.get(clave)
+        if anterior is not None and anterior["hash_contexto"] == hash_contexto and not full:
+            entradas.append(anterior)
+            conteo["sin_cambios"] += 1
+            continue
+
+        estado = "nuevas" if anterior is None else "reconstruidas"
+        conteo[estado] += 1
+        if dry_run:
+            print(f"  - Se regeneraría ({estado}): {pregunta}")
+            if anterior is not None:
+                entradas.append(anterior)
+            continue
+
+        print(f"  - Generando: {pregunta}")
+        respuesta = asyncio.run(generar(pregunta, contexto))
+        if respuesta is None:
+            # Se conserva la entrada anterior (si la hay); la próxima ejecución lo reintenta
+            conteo[estado] -= 1
+            conteo["fallidas"] += 1
+            if anterior is not None:
+                entradas.append(anterior)
+            continue
+        entradas.append({
+            "pregunta": pregunta,
+            "hash_contexto": hash_contexto,
+            "respuesta": respuesta,
+            "generado": datetime.now(timezone.utc).isoformat(),
+        })
+
+    eliminadas = len(set(anteriores) - {clave_consulta(e["pregunta"]) for e in entradas})
+    print(f"\nBanco de respuestas: {conteo['nuevas']} nuevas, {conteo['reconstruidas']} reconstruidas, "
+          f"{conteo['sin_cambios']} sin cambios, {conteo['omitidas']} omitidas, {conteo['fallidas']} fallidas, "
+          f"{eliminadas} eliminadas.")
+
+    if dry_run:
+        print("Modo DRY RUN: no se escribió el banco.")
+        return
+    guardar_banco(salida, entradas)
+    print(f"Banco guardado en '{salida}' ({len(entradas)} respuestas).")
+
+
+def actualizar_banco_tras_ingesta(dry_run: bool = False):
+    """
+    Lo llaman ingest.py e ingest_json.py al terminar. Un fallo aquí no deshace la
+    ingesta: se avisa y se sigue.
+    """
+    try:
+        actualizar_banco(dry_run=dry_run, solo_si_existe=True)
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar el banco de respuestas ({e}). "
+              "Ejecuta build_answer_bank.py a mano.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el banco de respuestas precalculadas.")
+    parser.add_argument('--dry-run', action='store_true', help="Solo muestra qué preguntas se regenerarían.")
+    parser.add_argument('--full', action='store_true', help="Regenera todas las respuestas.")
+    parser.add_argument('--preguntas', type=str, default=str(PREGUNTAS_PATH), help="JSON con la lista de preguntas.")
+    parser.add_argument('--salida', type=str, default=settings.ANSWER_BANK_PATH, help="Archivo del banco de respuestas.")
+    args = parser.parse_args()
+    actualizar_banco(Path(args.preguntas), Path(args.salida), full=args.full, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Construye el índice binario local que usa el backend con RETRIEVER_BACKEND=mmap.
+
+Lee los JSON que generan los modos --dry-run de ingest.py e ingest_json.py y guarda
+'knowledge_index.bin': textos con prefijo de largo, metadatos de documento y página en
+arreglos empaquetados, listas de postings para BM25 y (salvo --sin-matriz) la matriz
+densa LSA para la búsqueda híbrida. El backend lo abre con mmap: arranca sin leerlo
+entero y los workers comparten la memoria. Se reemplaza de forma atómica, así que el
+backend lo recarga en caliente.
+
+Los scripts de ingesta lo generan con --emit-index; también se puede ejecutar a mano.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# El código del índice vive en el backend (el mismo que lo lee al servir)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+# Necesitarás: pip install numpy
+from src.util.util_bm25 import cargar_documentos
+from src.util.util_denso import construir_indice_lsa
+from src.util.util_indice_binario import escribir_indice_binario
+
+DATA_DIR = Path(__file__).parent
+ARCHIVOS_BASE = [DATA_DIR / "output_json_preview.json", DATA_DIR / "output_chunks.json"]
+RUTA_INDICE_BINARIO = DATA_DIR / "knowledge_index.bin"
+
+
+def construir_indice_binario(rutas: list = ARCHIVOS_BASE, salida: Path = RUTA_INDICE_BINARIO,
+                             con_matriz: bool = True, dimensiones: int = 128, int8: bool = False):
+    inicio = time.perf_counter()
+    documentos = cargar_documentos(rutas)
+    if not documentos:
+        print("Índice binario: no hay documentos locales, no se genera.")
+        return
+
+    indice_denso = construir_indice_lsa(documentos, dimensiones=dimensiones) if con_matriz else None
+    resumen = escribir_indice_binario(
+        documentos, salida, indice_denso=indice_denso, int8=int8,
+        fuentes=[Path(r).name for r in rutas if Path(r).exists()]
+    )
+    print(f"\nÍndice binario guardado en '{salida}': {resumen['documentos']} trozos, "
+          f"{resumen['terminos']} términos, {resumen['postings']} postings, "
+          f"{resumen['bytes'] / 1024:.0f} KB{' con matriz densa' if resumen['densa'] else ''} "
+          f"({time.perf_counter() - inicio:.2f}s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice binario local (mmap) para el backend.")
+    parser.add_argument('--salida', type=str, default=str(RUTA_INDICE_BINARIO), help="Archivo de salida.")
+    parser.add_argument('--sin-matriz', action='store_true', help="No incluye la matriz densa (solo BM25).")
+    parser.add_argument('--dimensiones', type=int, default=128, help="Dimensiones LSA (default: 128).")
+    parser.add_argument('--int8', action='store_true', help="Guarda la matriz densa cuantizada a int8.")
+    args = parser.parse_args()
+    construir_indice_binario(salida=Path(args.salida), con_matriz=not args.sin_matriz,
+                             dimensiones=args.dimensiones, int8=args.int8)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Construye el índice denso local (LSA: TF-IDF + SVD truncada) que usa el backend con
+RETRIEVER_BACKEND=hybrid.
+
+Lee los JSON que generan los modos --dry-run de ingest.py e ingest_json.py y guarda una
+matriz contigua float32 (o int8 con --int8) en 'dense_index.npz'. Los scripts de ingesta
+lo llaman solos al terminar un dry-run si el backend usa la búsqueda híbrida; también se
+puede ejecutar a mano.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# El código del índice vive en el backend (el mismo que lo lee al servir)
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Necesitarás: pip install numpy
+from src.util.util_bm25 import cargar_documentos
+from src.util.util_denso import construir_indice_lsa, guardar_indice
+
+DATA_DIR = Path(__file__).parent
+ARCHIVOS_BASE = [DATA_DIR / "output_json_preview.json", DATA_DIR / "output_chunks.json"]
+RUTA_INDICE = DATA_DIR / "dense_index.npz"
+
+
+def indice_denso_activo() -> bool:
+    """
+    True si el backend usa el índice denso (RETRIEVER_BACKEND=hybrid, en el entorno o en
+    backend/.env). Si no, generarlo en cada dry-run es trabajo que nadie lee.
+    """
+    backend = os.environ.get("RETRIEVER_BACKEND")
+    if backend is None:
+        try:
+            from dotenv import dotenv_values
+            backend = dotenv_values(BACKEND_DIR / ".env").get("RETRIEVER_BACKEND")
+        except Exception:
+            backend = None
+    return (backend or "").lower() == "hybrid"
+
+
+def construir_indice_denso(rutas: list = ARCHIVOS_BASE, salida: Path = RUTA_INDICE,
+                           dimensiones: int = 128, int8: bool = False):
+    inicio = time.perf_counter()
+    documentos = cargar_documentos(rutas)
+    if not documentos:
+        print("Índice denso: no hay documentos locales, no se genera.")
+        return
+
+    indice = construir_indice_lsa(documentos, dimensiones=dimensiones)
+    guardar_indice(indice, salida, int8=int8)
+
+    filas, dims = indice["matriz"].shape
+    print(f"\nÍndice denso guardado en '{salida}': {filas} trozos x {dims} dimensiones, "
+          f"{len(indice['vocabulario'])} términos ({'int8' if int8 else 'float32'}, "
+          f"{time.perf_counter() - inicio:.2f}s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice denso local para la búsqueda híbrida.")
+    parser.add_argument('--dimensiones', type=int, default=128, help="Dimensiones LSA (default: 128).")
+    parser.add_argument('--int8', action='store_true', help="Guarda la matriz cuantizada a int8.")
+    args = parser.parse_args()
+    construir_indice_denso(dimensiones=args.dimensiones, int8=args.int8)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Eliminación de trozos casi duplicados (MinHash + LSH por bandas).
+
+Las guías repiten las mismas tablas y párrafos, y el solapamiento del splitter genera
+trozos casi idénticos. Si llegan al índice, ocupan los pocos resultados (top=3) que
+recibe el modelo con texto repetido.
+
+- Cada trozo se convierte en un conjunto de "shingles" (n-gramas de palabras).
+- Su firma MinHash estima la similitud de Jaccard entre dos trozos.
+- LSH por bandas propone solo los pares candidatos (no se comparan todos contra todos).
+- Los pares que superan el umbral se agrupan en clusters; de cada cluster se conserva
+  un único representante (el trozo con más contenido).
+- Funciona en streaming: en memoria solo quedan la firma y el largo de cada trozo; los
+  documentos esperan en un archivo temporal hasta la segunda pasada.
+"""
+
+import json
+import re
+import tempfile
+import unicodedata
+import zlib
+
+# Necesitarás: pip install numpy
+import numpy as np
+
+UMBRAL_SIMILITUD = 0.8
+NUM_PERMUTACIONES = 128
+TAMANO_SHINGLE = 5
+
+# Primo de Mersenne 2^31 - 1: (a * h + b) cabe en uint64 sin desbordar
+_PRIMO = np.uint64((1 << 31) - 1)
+
+
+def _normalizar(texto: str) -> list:
+    texto = unicodedata.normalize("NFD", texto.lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    return re.findall(r"[a-z0-9]+", texto)
+
+
+def shingles(texto: str, tamano: int = TAMANO_SHINGLE) -> np.ndarray:
+    """Hashes (32 bits) de los n-gramas de palabras del texto normalizado."""
+    palabras = _normalizar(texto)
+    if len(palabras) <= tamano:
+        grupos = {" ".join(palabras)}
+    else:
+        grupos = {" ".join(palabras[i:i + tamano]) for i in range(len(palabras) - tamano + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grupos), dtype=np.uint64)
+
+
+def elegir_bandas(umbral: float, num_perm: int) -> tuple:
+    """
+    Elige (bandas, filas) de modo que el punto de corte de LSH, (1/b)^(1/r),
+    quede lo más cerca posible del umbral.
+    """
+    mejor = None
+    for filas in range(1, num_perm + 1):
+        bandas = num_perm // filas
+        corte = (1 / bandas) ** (1 / filas)
+        if mejor is None or abs(corte - umbral) < mejor[0]:
+            mejor = (abs(corte - umbral), bandas, filas)
+    return mejor[1], mejor[2]
+
+
+class DeduplicadorMinHash:
+    """
+    Uso:
+        dedup = DeduplicadorMinHash(umbral=0.8)
+        conservados = list(dedup.filtrar(documentos))
+        dedup.imprimir()
+        dedup.guardar_reporte("dedup_report.json")
+    """
+
+    def __init__(self, umbral: float = UMBRAL_SIMILITUD, num_perm: int = NUM_PERMUTACIONES,
+                 tamano_shingle: int = TAMANO_SHINGLE, semilla: int = 42):
+        self.umbral = umbral
+        self.num_perm = num_perm
+        self.tamano_shingle = tamano_shingle
+        self.bandas, self.filas = elegir_bandas(umbral, num_perm)
+
+        # Semilla fija: las mismas entradas dan siempre los mismos clusters
+        rng = np.random.default_rng(semilla)
+        self.a = rng.integers(1, int(_PRIMO), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIMO), size=num_perm, dtype=np.uint64)
+
+        self.total = 0
+        self.reporte = []
+
+    def firma(self, texto: str) -> np.ndarray:
+        hashes = shingles(texto, self.tamano_shingle) % _PRIMO
+        # Matriz (shingles x permutaciones); el mínimo por columna es la firma
+        return ((np.outer(hashes, self.a) + self.b) % _PRIMO).min(axis=0)
+
+    def filtrar(self, documentos):
+        """
+        Generador: consume los documentos y devuelve (en su orden original) solo los
+        representantes de cada cluster. Hay que ver todos los trozos antes de decidir,
+        pero en memoria solo se guarda la firma (uint32) y el largo de cada uno: los
+        documentos se escriben en un archivo temporal (JSON Lines) y se vuelven a leer
+        en una segunda pasada.
+        """
+        firmas = []
+        largos = []
+        cubetas = {}
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as pendientes:
+            # 1. Firma de cada trozo y LSH: los que coinciden en una banda completa son candidatos
+            #    (la clave de la banda es un hash de 64 bits; una colisión solo agrega un candidato
+            #    que después se verifica)
+            for i, doc in enumerate(documentos):
+                firma = self.firma(doc["content"]).astype(np.uint32)  # valores < 2^31
+                firmas.append(firma)
+                largos.append(len(doc["content"]))
+                for banda in range(self.bandas):
+                    trozo_firma = firma[banda * self.filas:(banda + 1) * self.filas].tobytes()
+                    clave = (banda, zlib.crc32(trozo_firma) << 32 | zlib.adler32(trozo_firma))
+                    cubetas.setdefault(clave, []).append(i)
+                pendientes.write(json.dumps(doc, ensure_ascii=False) + "\n")
+
+            # 2. Verificar candidatos con la similitud estimada y unir (union-find)
+            padre = list(range(len(firmas)))
+
+            def raiz(i):
+                while padre[i] != i:
+                    padre[i] = padre[padre[i]]
+                    i = padre[i]
+                return i
+
+            comparados = set()
+            for indices in cubetas.values():
+                for pos, i in enumerate(indices):
+                    for j in indices[pos + 1:]:
+                        if (i, j) in comparados:
+                            continue
+                        comparados.add((i, j))
+                        if np.mean(firmas[i] == firmas[j]) >= self.umbral:
+                            padre[raiz(j)] = raiz(i)
+            cubetas.clear()
+            comparados.clear()
+
+            grupos = {}
+            for i in range(len(firmas)):
+                grupos.setdefault(raiz(i), []).append(i)
+
+            # 3. Un representante por cluster: el de más contenido (a igualdad, el primero)
+            conservar = set()
+            clusters = []
+            for miembros in grupos.values():
+                representante = max(miembros, key=lambda i: (largos[i], -i))
+                conservar.add(representante)
+                if len(miembros) > 1:
+                    clusters.append((representante, miembros))
+            en_cluster = {i for _, miembros in clusters for i in miembros}
+
+            # 4. Segunda pasada: salen los representantes; de los trozos en clusters se
+            #    guarda solo un resumen para el reporte
+            self.total = len(firmas)
+            resumenes = {}
+            pendientes.seek(0)
+            for i, linea in enumerate(pendientes):
+                doc = json.loads(linea)
+                if i in en_cluster:
+                    resumenes[i] = self._resumir(doc)
+                if i in conservar:
+                    yield doc
+
+        self.reporte = [self._describir_cluster(resumenes, firmas, representante, miembros)
+                        for representante, miembros in clusters]
+
+    @staticmethod
+    def _resumir(doc: dict) -> dict:
+        return {
+            "id": doc["id"],
+            "title": doc.get("title"),
+            "page": doc.get("page"),
+            "chunk_index": doc.get("chunk_index"),
+            "inicio": doc["content"][:120],
+        }
+
+    def _describir_cluster(self, resumenes, firmas, representante, miembros):
+        def resumen(i):
+            return {k: v for k, v in resumenes[i].items() if k != "inicio"}
+
+        return {
+            "representante": resumen(representante),
+            "eliminados": [
+                {
+                    **resumen(i),
+                    "similitud": round(float(np.mean(firmas[i] == firmas[representante])), 3),
+                    "inicio": resumenes[i]["inicio"],
+                }
+                for i in miembros if i != representante
+            ],
+        }
+
+    @property
+    def eliminados(self) -> int:
+        return sum(len(cluster["eliminados"]) for cluster in self.reporte)
+
+    def imprimir(self):
+        print(f"\nCasi duplicados (umbral {self.umbral}, {self.bandas} bandas x {self.filas} filas):")
+        print(f"  > Trozos analizados: {self.total}")
+        print(f"  > Clusters con duplicados: {len(self.reporte)}")
+        print(f"  > Trozos eliminados: {self.eliminados}")
+        print(f"  > Trozos conservados: {self.total - self.eliminados}")
+
+    def guardar_reporte(self, ruta: str):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({
+                "umbral": self.umbral,
+                "num_permutaciones": self.num_perm,
+                "bandas": self.bandas,
+                "filas": self.filas,
+                "analizados": self.total,
+                "eliminados": self.eliminados,
+                "clusters": self.reporte,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"  > Reporte de duplicados guardado en '{ruta}'.")
@@ -0,0 +1,140 @@
+"""
+Manifiesto del índice de Azure AI Search e ingesta incremental.
+
+Los scripts de ingesta (ingest.py e ingest_json.py) guardan aquí los IDs de los documentos
+indexados. El ID se calcula a partir del contenido: un documento modificado tiene otro ID.
+En cada corrida se compara contra el manifiesto y solo se suben los IDs nuevos, y se borran
+los que ya no existen (entre ellos, la versión anterior de lo modificado).
+
+El backend lee el campo "version" para invalidar sus cachés de búsqueda y de respuestas
+cuando cambia el contenido del índice.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from azure_uploader import CargadorAzure
+
+MANIFEST_PATH = Path(__file__).parent / "index_manifest.json"
+
+def _sha256(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def generar_id(fuente: str, contenido: str, pagina=None) -> str:
+    """
+    ID determinista a partir del archivo de origen, el hash del contenido y (en los PDFs)
+    la página. No depende de la posición del trozo: si se agrega una página al principio,
+    los demás conservan su ID y no se vuelven a subir.
+    (Azure solo admite letras, números, '_', '-' y '=' en la clave: usamos hex.)
+    """
+    clave = _sha256(contenido) if pagina is None else f"{pagina}|{_sha256(contenido)}"
+    return _sha256(f"{fuente}|{clave}")[:40]
+
+
+def leer_manifest(manifest_path: Path = MANIFEST_PATH) -> dict:
+    if manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": "", "sources": {}}
+
+
+class Diferencias:
+    """
+    Compara, documento a documento, lo que produce la ingesta con lo último indexado.
+    Funciona en streaming: solo guarda en memoria los IDs, no los documentos.
+    Con `full=True` se vuelve a subir todo (igual se borran los documentos obsoletos).
+    """
+
+    def __init__(self, source: str, full: bool = False, manifest_path: Path = MANIFEST_PATH):
+        self.source = source
+        self.full = full
+        self.manifest_path = manifest_path
+        # Los manifiestos anteriores guardaban {id: hash}: set() toma las claves igual
+        self.indexados = set(leer_manifest(manifest_path)["sources"].get(source, {}).get("ids", []))
+        self.actuales = set()
+        self.nuevos = 0
+        self.sin_cambios = 0
+
+    def registrar(self, doc: dict) -> bool:
+        """Registra un documento actual. Devuelve True si hay que subirlo."""
+        self.actuales.add(doc["id"])
+        if doc["id"] in self.indexados:
+            self.sin_cambios += 1
+            return self.full
+        self.nuevos += 1
+        return True
+
+    @property
+    def eliminar(self) -> list:
+        """IDs indexados que ya no existen en el origen (llamar al terminar de registrar)."""
+        return sorted(self.indexados - self.actuales)
+
+    def imprimir(self):
+        print(f"\nDiferencias con el último indexado ('{self.source}'):")
+        print(f"  > Nuevos (incluye los modificados): {self.nuevos}")
+        print(f"  > Eliminados: {len(self.eliminar)}")
+        print(f"  > Sin cambios: {self.sin_cambios}")
+
+    def guardar(self, subidos: set, borrados: set):
+        """
+        Registra en el manifiesto lo que quedó indexado. Lo que falló no se registra,
+        así se reintenta en la próxima corrida.
+        """
+        indexados = (self.indexados | set(subidos)) - set(borrados)
+        write_index_manifest(self.source, sorted(indexados), self.manifest_path)
+
+
+def sincronizar_indice(search_client, source: str, documentos, full: bool = False,
+                       workers: int = 4, dead_letter_path: str = None,
+                       manifest_path: Path = MANIFEST_PATH):
+    """
+    Consume `documentos` (lista o generador) y sube a Azure solo los IDs nuevos,
+    con lotes concurrentes; después borra lo obsoleto y actualiza el manifiesto.
+    """
+    diferencias = Diferencias(source, full=full, manifest_path=manifest_path)
+
+    print("\nCargando documentos nuevos al índice de Azure...")
+    with CargadorAzure(search_client, workers=workers, dead_letter_path=dead_letter_path) as cargador:
+        for doc in documentos:
+            if diferencias.registrar(doc):
+                cargador.subir(doc)
+        cargador.borrar(diferencias.eliminar)
+
+    diferencias.imprimir()
+    diferencias.guardar(cargador.subidos, cargador.borrados)
+
+
+def write_index_manifest(source: str, indexados: list, manifest_path: Path = MANIFEST_PATH):
+    """
+    Registra los IDs indexados de `source` ("pdf", "json", ...) y recalcula la
+    versión del índice, que solo cambia si cambia el contenido indexado.
+    """
+    manifest = leer_manifest(manifest_path)
+
+    anterior = manifest["sources"].get(source, {})
+    if anterior.get("ids") == indexados:
+        print("El índice ya estaba al día: el manifiesto no cambia.")
+        return
+
+    manifest["sources"][source] = {
+        "documentos": len(indexados),
+        "actualizado": datetime.now(timezone.utc).isoformat(),
+        "ids": indexados,
+    }
+
+    firma = json.dumps(
+        {nombre: datos["ids"] for nombre, datos in manifest["sources"].items()},
+        sort_keys=True
+    ).encode("utf-8")
+    manifest["version"] = hashlib.sha256(firma).hexdigest()[:16]
+
+    # Escritura atómica: el backend nunca ve un manifiesto a medio escribir
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    tmp_path.replace(manifest_path)
+
+    print(f"Manifiesto del índice actualizado: versión {manifest['version']}")
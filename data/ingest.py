@@ -1,8 +1,10 @@
 import os
-import uuid
 import json
 import re
+import time
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 try:
     from dotenv import load_dotenv
@@ -12,8 +14,9 @@ except Exception:
         return
 
 # --- Carga de Documentos (PDF) ---
-# Necesitarás: pip install langchain-community pypdf
-from langchain_community.document_loaders import PyPDFLoader
+# Necesitarás: pip install pypdf langchain-text-splitters
+from pypdf import PdfReader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 # --- Conexión a Azure ---
@@ -21,6 +24,14 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 
+from index_manifest import generar_id, Diferencias, sincronizar_indice
+from build_binary_index import RUTA_INDICE_BINARIO, construir_indice_binario
+from build_dense_index import construir_indice_denso, indice_denso_activo
+from deduplicacion import DeduplicadorMinHash, UMBRAL_SIMILITUD
+
+# Los JSON del dry-run van junto a este script, donde los buscan el backend y los índices locales
+DATA_DIR = Path(__file__).parent
+
 # ==========================================
 # 1. CONFIGURACIÓN DE FILTRADO Y LIMPIEZA
 # ==========================================
@@ -93,6 +104,29 @@ PATRONES_LIMPIEZA_TEXTO = [
 # Umbral mínimo de caracteres para que un chunk sea útil
 MIN_CHUNK_CHARS = 50
 
+# Palabras que indican una tabla médica (se le permite más números/símbolos)
+PALABRAS_TABLA = ["tabla", "cuadro", "dosis", "mg/kg", "mg/dia", "suplementación"]
+
+# Páginas de un PDF que procesa cada tarea del pool
+PAGINAS_POR_TAREA = 16
+
+# --- Patrones precompilados (una sola pasada por chunk en lugar de una por patrón) ---
+PATRON_LIMPIEZA = re.compile(
+    "|".join(f"(?:{patron})" for patron in PATRONES_LIMPIEZA_TEXTO),
+    flags=re.IGNORECASE | re.MULTILINE
+)
+PATRON_ESPACIOS = re.compile(r"\s+")
+
+def compilar_buscador(palabras: list):
+    """
+    Compila una lista de palabras en un único buscador multipatrón
+    (una alternancia de literales: recorre el texto una sola vez).
+    """
+    return re.compile("|".join(re.escape(p.lower()) for p in sorted(palabras, key=len, reverse=True)))
+
+BUSCADOR_ELIMINAR = compilar_buscador(PALABRAS_ELIMINAR_CHUNK)
+BUSCADOR_TABLA = compilar_buscador(PALABRAS_TABLA)
+
 # ==========================================
 # 2. FUNCIONES AUXILIARES
 # ==========================================
@@ -121,127 +155,199 @@ def get_search_client():
     return search_client
 
 def clean_chunk_content(text):
-    text_clean = text
-    for patron in PATRONES_LIMPIEZA_TEXTO:
-        # Reemplaza el patrón por espacio vacío
-        text_clean = re.sub(patron, "", text_clean, flags=re.IGNORECASE | re.MULTILINE)
+    # Todos los patrones de limpieza en una sola pasada
+    text_clean = PATRON_LIMPIEZA.sub("", text)
     
     # Limpieza final de espacios extra
-    text_clean = re.sub(r"\s+", " ", text_clean).strip()
+    text_clean = PATRON_ESPACIOS.sub(" ", text_clean).strip()
     return text_clean
 
-def load_and_split_pdfs(data_folder: Path):
+def filtrar_chunk(content: str):
     """
-    Carga todos los PDFs de la carpeta /data y los divide en trozos limpios.
+    Limpia un chunk y decide si se conserva.
+    Devuelve el texto limpio, o None si el chunk es 'ruido'.
     """
-    print(f"Cargando PDFs desde: {data_folder}...")
+    # 1. LIMPIEZA DE TEXTO (Quitar encabezados repetitivos)
+    content_clean = clean_chunk_content(content)
+    content_lower = content_clean.lower()
+
+    # Si tras limpiar queda vacío o muy corto, descartar
+    if len(content_clean) < MIN_CHUNK_CHARS:
+        return None
+
+    # 2. FILTRO DE ELIMINACIÓN TOTAL (Contenido administrativo/social)
+    if BUSCADOR_ELIMINAR.search(content_lower):
+        return None
+
+    # 3. PROTECCIÓN DE TABLAS DE DOSIFICACIÓN
+    # Detectamos si el texto parece ser una tabla médica importante
+    is_table_context = BUSCADOR_TABLA.search(content_lower) is not None
+    
+    # Análisis de calidad del texto (ratio alfabético)
+    alpha_chars = sum(1 for ch in content_clean if ch.isalpha())
+    total_chars = len(content_clean)
+    alpha_ratio = alpha_chars / total_chars if total_chars > 0 else 0
     
+    # Lógica de decisión:
+    # Si NO parece una tabla médica Y tiene muy poco texto alfabético (ej. basura de escaneo), se borra.
+    # Si ES una tabla (ej. dosis de hierro), permitimos más números/símbolos (alpha_ratio más bajo).
+    if not is_table_context and alpha_ratio < 0.40:
+        return None
+
+    return content_clean
+
+def procesar_rango_paginas(tarea: tuple):
+    """
+    Trabajo de un proceso del pool: extrae, divide, limpia y filtra las páginas
+    [inicio, fin) de un PDF.
+
+    Devuelve (chunks conservados con su índice local, total de chunks del rango, tiempos por etapa).
+    """
+    pdf_path, inicio, fin = tarea
+    tiempos = {"extraccion": 0.0, "division": 0.0, "limpieza": 0.0}
+
+    t0 = time.perf_counter()
+    reader = PdfReader(str(pdf_path))
+    documents = [
+        Document(
+            page_content=reader.pages[num].extract_text(extraction_mode="plain"),
+            metadata={"source": str(pdf_path), "page": num}
+        )
+        for num in range(inicio, fin)
+    ]
+    t1 = time.perf_counter()
+
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,  # Tamaño ajustado para capturar párrafos completos
         chunk_overlap=200   # Solapamiento para mantener contexto
     )
-    
-    all_chunks = []
-    
-    # Convertimos la lista de palabras prohibidas a minúsculas para comparar más rápido
-    palabras_eliminar_lower = [p.lower() for p in PALABRAS_ELIMINAR_CHUNK]
-    
-    for pdf_path in data_folder.glob("*.pdf"):
-        print(f"\nProcesando: {pdf_path.name}...")
-        
-        loader = PyPDFLoader(str(pdf_path))
-        documents = loader.load()
-        chunks = text_splitter.split_documents(documents)
+    chunks = text_splitter.split_documents(documents)
+    t2 = time.perf_counter()
 
-        print(f"  > Se dividió en {len(chunks)} trozos. Aplicando filtros inteligentes...")
+    conservados = []
+    for i, chunk in enumerate(chunks):
+        content_clean = filtrar_chunk((chunk.page_content or "").strip())
+        if content_clean is None:
+            continue
+        # Intento de obtener número de página
+        page_number = chunk.metadata.get("page", 0) + 1 # PyPDF empieza en 0
+        conservados.append((i, content_clean, page_number))
+    t3 = time.perf_counter()
 
-        chunks_filtrados = 0
-        kept = 0
-        
-        for i, chunk in enumerate(chunks):
-            content = (chunk.page_content or "").strip()
-            
-            # 1. LIMPIEZA DE TEXTO (Quitar encabezados repetitivos)
-            content_clean = clean_chunk_content(content)
-            content_lower = content_clean.lower()
-
-            # Si tras limpiar queda vacío o muy corto, descartar
-            if len(content_clean) < MIN_CHUNK_CHARS:
-                chunks_filtrados += 1
-                continue
-
-            # 2. FILTRO DE ELIMINACIÓN TOTAL (Contenido administrativo/social)
-            if any(bad_word in content_lower for bad_word in palabras_eliminar_lower):
-                chunks_filtrados += 1
-                continue
-
-            # 3. PROTECCIÓN DE TABLAS DE DOSIFICACIÓN
-            # Detectamos si el texto parece ser una tabla médica importante
-            is_table_context = any(x in content_lower for x in ["tabla", "cuadro", "dosis", "mg/kg", "mg/dia", "suplementación"])
-            
-            # Análisis de calidad del texto (ratio alfabético)
-            alpha_chars = sum(1 for ch in content_clean if ch.isalpha())
-            total_chars = len(content_clean)
-            alpha_ratio = alpha_chars / total_chars if total_chars > 0 else 0
-            
-            # Lógica de decisión:
-            # Si NO parece una tabla médica Y tiene muy poco texto alfabético (ej. basura de escaneo), se borra.
-            # Si ES una tabla (ej. dosis de hierro), permitimos más números/símbolos (alpha_ratio más bajo).
-            if not is_table_context and alpha_ratio < 0.40:
-                chunks_filtrados += 1
-                continue
-            
-            # Intento de obtener número de página
-            page_number = chunk.metadata.get("page", 0) + 1 # PyPDF empieza en 0
-
-            # Crear el documento limpio para Azure
-            azure_doc = {
-                "id": str(uuid.uuid4()),
-                "content": content_clean,
-                "title": pdf_path.name,
-                "page": page_number,
-                "chunk_index": i,
-                "tags": [pdf_path.name]
-            }
-            all_chunks.append(azure_doc)
-            kept += 1
-
-        print(f"  > Se filtraron {chunks_filtrados} trozos 'ruido'. Mantenidos: {kept}.")
-            
-    return all_chunks
+    tiempos["extraccion"] = t1 - t0
+    tiempos["division"] = t2 - t1
+    tiempos["limpieza"] = t3 - t2
+    return conservados, len(chunks), tiempos
 
-def upload_to_azure(search_client: SearchClient, documents: list):
+def map_ordenado_acotado(pool, funcion, tareas, en_vuelo: int):
     """
-    Sube los documentos (chunks) al índice de Azure AI Search.
+    Como pool.map, pero con como máximo `en_vuelo` tareas enviadas a la vez:
+    los resultados se consumen a medida que salen y la memoria no crece con el corpus.
     """
-    if not documents:
-        print("No se encontraron documentos válidos para cargar.")
-        return
-        
-    print(f"\nCargando {len(documents)} trozos al índice de Azure...")
-    
-    batch_size = 500
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i + batch_size]
-        try:
-            search_client.upload_documents(documents=batch)
-            print(f"  > Lote {int(i/batch_size) + 1} cargado exitosamente.")
-        except Exception as e:
-            print(f"  > Error cargando lote: {e}")
-
-    print("¡Carga completada!")
-
-def save_to_json(documents: list):
+    pendientes = deque()
+    for tarea in tareas:
+        pendientes.append(pool.submit(funcion, tarea))
+        if len(pendientes) >= en_vuelo:
+            yield pendientes.popleft().result()
+    while pendientes:
+        yield pendientes.popleft().result()
+
+def load_and_split_pdfs(data_folder: Path, workers: int = None):
+    """
+    Generador: carga los PDFs de la carpeta /data y produce los trozos limpios uno a uno.
+    Pipeline: extraer páginas -> dividir -> limpiar -> filtrar (en un pool de procesos,
+    por rangos de páginas) -> documento para Azure.
+    """
+    print(f"Cargando PDFs desde: {data_folder}...")
+    inicio_total = time.perf_counter()
+
+    pdfs = sorted(data_folder.glob("*.pdf"))
+    tareas = []
+    for pdf_path in pdfs:
+        num_paginas = len(PdfReader(str(pdf_path)).pages)
+        for inicio in range(0, num_paginas, PAGINAS_POR_TAREA):
+            tareas.append((pdf_path, inicio, min(inicio + PAGINAS_POR_TAREA, num_paginas)))
+
+    workers = workers or os.cpu_count() or 1
+    print(f"  > {len(pdfs)} PDFs en {len(tareas)} tareas, usando {workers} procesos...")
+
+    vistos = set()
+    tiempos_totales = {"extraccion": 0.0, "division": 0.0, "limpieza": 0.0}
+    por_pdf = {}
+
+    # Los resultados salen en el orden de las tareas, así los chunk_index son los mismos
+    # que en modo secuencial
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        resultados = map_ordenado_acotado(pool, procesar_rango_paginas, tareas, en_vuelo=workers * 2)
+        for (pdf_path, _, _), (conservados, total_rango, tiempos) in zip(tareas, resultados):
+            estado = por_pdf.setdefault(pdf_path.name, {"offset": 0, "total": 0, "kept": 0})
+            for i, content_clean, page_number in conservados:
+                # ID determinista: el mismo trozo conserva su ID entre corridas
+                doc_id = generar_id(pdf_path.name, content_clean, pagina=page_number)
+                if doc_id in vistos:
+                    # Mismo texto en la misma página: es un duplicado exacto
+                    continue
+                vistos.add(doc_id)
+                estado["kept"] += 1
+
+                # Crear el documento limpio para Azure
+                yield {
+                    "id": doc_id,
+                    "content": content_clean,
+                    "title": pdf_path.name,
+                    "page": page_number,
+                    "chunk_index": estado["offset"] + i,
+                    "tags": [pdf_path.name]
+                }
+            estado["offset"] += total_rango
+            estado["total"] += total_rango
+            for etapa, segundos in tiempos.items():
+                tiempos_totales[etapa] += segundos
+
+    for nombre, estado in por_pdf.items():
+        print(f"\nProcesado: {nombre}")
+        print(f"  > Se dividió en {estado['total']} trozos. "
+              f"Se filtraron {estado['total'] - estado['kept']} trozos 'ruido'. Mantenidos: {estado['kept']}.")
+
+    print("\nTiempos por etapa (suma de todos los procesos):")
+    for etapa, segundos in tiempos_totales.items():
+        print(f"  > {etapa}: {segundos:.2f}s")
+    print(f"  > Tiempo total (reloj): {time.perf_counter() - inicio_total:.2f}s")
+
+def registrar_diferencias(documents, diferencias: Diferencias):
+    """Deja pasar cada trozo, registrándolo antes en `diferencias`."""
+    for doc in documents:
+        diferencias.registrar(doc)
+        yield doc
+
+def save_to_json(documents):
     """
     Guarda los chunks procesados en un archivo JSON local (Modo Dry Run).
+    Acepta un generador: escribe cada trozo a medida que llega.
     """
-    output_file = "output_chunks.json"
-    print(f"\nModo DRY RUN: Guardando {len(documents)} trozos en '{output_file}'...")
+    output_file = DATA_DIR / "output_chunks.json"
+    print(f"\nModo DRY RUN: Guardando trozos en '{output_file}'...")
     
+    total = 0
     with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(documents, f, indent=2, ensure_ascii=False)
+        f.write("[")
+        for doc in documents:
+            f.write(",\n  " if total else "\n  ")
+            f.write(json.dumps(doc, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            total += 1
+        f.write("\n]" if total else "]")
         
-    print(f"¡Archivo '{output_file}' guardado! Reísalo para verificar la limpieza.")
+    print(f"¡Archivo '{output_file}' guardado con {total} trozos! Revísalo para verificar la limpieza.")
+
+def deduplicar(chunks, umbral: float, reporte: str):
+    """
+    Generador: filtra los casi duplicados sin materializar la lista de trozos.
+    El reporte se imprime y se guarda cuando el destino terminó de consumirlos.
+    """
+    dedup = DeduplicadorMinHash(umbral=umbral)
+    yield from dedup.filtrar(chunks)
+    dedup.imprimir()
+    dedup.guardar_reporte(reporte)
 
 def main():
     """
@@ -254,6 +360,60 @@ def main():
         action='store_true', 
         help="Ejecuta el script sin cargar a Azure. Guarda el resultado en 'output_chunks.json' para revisión."
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help="Número de procesos para extraer y limpiar los PDFs (por defecto, uno por núcleo)."
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help="Vuelve a subir todos los trozos, aunque no hayan cambiado desde la última carga."
+    )
+    parser.add_argument(
+        '--upload-workers',
+        type=int,
+        default=4,
+        help="Lotes que se suben a Azure en paralelo (default: 4)."
+    )
+    parser.add_argument(
+        '--dead-letter',
+        type=str,
+        default="dead_letter_pdf.jsonl",
+        help="Archivo donde se guardan los trozos que no se pudieron subir tras los reintentos."
+    )
+    parser.add_argument(
+        '--umbral-duplicados',
+        type=float,
+        default=UMBRAL_SIMILITUD,
+        help=f"Similitud (Jaccard estimada) a partir de la cual dos trozos son casi duplicados (default: {UMBRAL_SIMILITUD})."
+    )
+    parser.add_argument(
+        '--sin-banco',
+        action='store_true',
+        help="No actualiza el banco de respuestas precalculadas al terminar."
+    )
+    parser.add_argument(
+        '--sin-dedup',
+        action='store_true',
+        help="No elimina los trozos casi duplicados."
+    )
+    parser.add_argument(
+        '--reporte-dedup',
+        type=str,
+        default="dedup_report.json",
+        help="Archivo donde se guarda el reporte de clusters de casi duplicados."
+    )
+    parser.add_argument(
+        '--emit-index',
+        nargs='?',
+        const=str(RUTA_INDICE_BINARIO),
+        default=None,
+        metavar='RUTA',
+        help="Tras el dry-run, escribe el índice binario local (mmap) del backend "
+             f"(default: '{RUTA_INDICE_BINARIO.name}')."
+    )
     args = parser.parse_args()
 
     # Define la ruta a la carpeta 'data' relativa a este script
@@ -265,16 +425,45 @@ def main():
         return
 
     try:
-        # 1. Cargar y limpiar
-        chunks_to_upload = load_and_split_pdfs(data_folder)
+        # 1. Cargar y limpiar (generador: los trozos se procesan a medida que salen)
+        chunks = load_and_split_pdfs(data_folder, workers=args.workers)
         
-        # 2. Decidir destino (JSON local o Azure Cloud)
+        # 1b. Eliminar casi duplicados (tablas repetidas, encabezados, solapamiento del splitter)
+        if not args.sin_dedup:
+            chunks = deduplicar(chunks, args.umbral_duplicados, args.reporte_dedup)
+        
+        # 2. Decidir destino (JSON local o Azure Cloud).
+        #    En ambos casos se compara con lo último indexado: solo se sube lo nuevo.
         if args.dry_run:
-            save_to_json(chunks_to_upload)
+            diferencias = Diferencias("pdf", full=args.full)
+            save_to_json(registrar_diferencias(chunks, diferencias))
+            diferencias.imprimir()
+            # El índice denso local (búsqueda híbrida) se construye sobre los JSON del dry-run
+            if indice_denso_activo():
+                construir_indice_denso()
+            else:
+                print("Índice denso: se omite (RETRIEVER_BACKEND no es 'hybrid'; "
+                      "build_dense_index.py lo genera a mano).")
+            if args.emit_index:
+                construir_indice_binario(salida=Path(args.emit_index))
         else:
             print("Modo REAL: Conectando a Azure para cargar...")
+            if args.emit_index:
+                print("Aviso: --emit-index se genera a partir de los JSON del dry-run; aquí se ignora.")
             client = get_search_client()
-            upload_to_azure(client, chunks_to_upload)
+            sincronizar_indice(
+                client, "pdf", chunks,
+                full=args.full,
+                workers=args.upload_workers,
+                dead_letter_path=args.dead_letter
+            )
+
+        # 3. El banco de respuestas sigue al índice: se regeneran las entradas cuyo contexto
+        #    cambió (en el dry-run solo se muestra cuáles). Se importa aquí: carga el flujo
+        #    del backend y su configuración (backend/.env)
+        if not args.sin_banco:
+            from build_answer_bank import actualizar_banco_tras_ingesta
+            actualizar_banco_tras_ingesta(dry_run=args.dry_run)
             
     except Exception as e:
         print(f"\n--- Ocurrió un error crítico ---")
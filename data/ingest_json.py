@@ -4,10 +4,13 @@ Script para subir el archivo JSON curado (anmi_knowledge_base_curada.json) a Azu
 Uso:
   - Modo DRY RUN (ver qué se subiría): python ingest_json.py --dry-run
   - Modo REAL (subir a Azure):         python ingest_json.py
+  - Recarga completa (ignora lo ya indexado): python ingest_json.py --full
+
+Solo se suben los documentos nuevos desde la última carga; uno modificado cuenta como nuevo y
+su versión anterior se borra (ver index_manifest.py).
 """
 
 import os
-import uuid
 import json
 import argparse
 from pathlib import Path
@@ -21,6 +24,10 @@ except ImportError:
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 
+from index_manifest import generar_id, Diferencias, sincronizar_indice
+from build_binary_index import RUTA_INDICE_BINARIO, construir_indice_binario
+from build_dense_index import construir_indice_denso, indice_denso_activo
+
 
 def get_search_client():
     """
@@ -67,7 +74,9 @@ def load_curated_json(json_path: Path) -> list:
         full_content = f"{title}\n\nPalabras clave: {keywords}\n\n{content}"
         
         azure_doc = {
-            "id": str(uuid.uuid4()),
+            # ID determinista: el mismo documento conserva su ID entre corridas, aunque
+            # se agreguen o reordenen entradas en el JSON
+            "id": generar_id(json_path.name, full_content),
             "content": full_content,
             "title": title,
             "page": i + 1,  # Usamos el índice como "página"
@@ -79,30 +88,7 @@ def load_curated_json(json_path: Path) -> list:
     return azure_docs
 
 
-def upload_to_azure(search_client: SearchClient, documents: list):
-    """
-    Sube los documentos al índice de Azure AI Search.
-    """
-    if not documents:
-        print("No se encontraron documentos válidos para cargar.")
-        return
-        
-    print(f"\nCargando {len(documents)} documentos al índice de Azure...")
-    
-    batch_size = 500
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i + batch_size]
-        try:
-            result = search_client.upload_documents(documents=batch)
-            succeeded = sum(1 for r in result if r.succeeded)
-            print(f"  > Lote {int(i/batch_size) + 1}: {succeeded}/{len(batch)} documentos cargados exitosamente.")
-        except Exception as e:
-            print(f"  > Error cargando lote: {e}")
-
-    print("\n¡Carga completada!")
-
-
-def save_preview_json(documents: list, output_file: str = "output_json_preview.json"):
+def save_preview_json(documents: list, output_file: Path = Path(__file__).parent / "output_json_preview.json"):
     """
     Guarda una vista previa de los documentos que se subirían (Modo Dry Run).
     """
@@ -129,6 +115,31 @@ def main():
         default="anmi_knowledge_base_curada.json",
         help="Nombre del archivo JSON a procesar (default: anmi_knowledge_base_curada.json)"
     )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help="Vuelve a subir todos los documentos, aunque no hayan cambiado desde la última carga."
+    )
+    parser.add_argument(
+        '--dead-letter',
+        type=str,
+        default="dead_letter_json.jsonl",
+        help="Archivo donde se guardan los documentos que no se pudieron subir tras los reintentos."
+    )
+    parser.add_argument(
+        '--sin-banco',
+        action='store_true',
+        help="No actualiza el banco de respuestas precalculadas al terminar."
+    )
+    parser.add_argument(
+        '--emit-index',
+        nargs='?',
+        const=str(RUTA_INDICE_BINARIO),
+        default=None,
+        metavar='RUTA',
+        help="Tras el dry-run, escribe el índice binario local (mmap) del backend "
+             f"(default: '{RUTA_INDICE_BINARIO.name}')."
+    )
     args = parser.parse_args()
 
     # Ruta al archivo JSON (en la misma carpeta que este script)
@@ -142,13 +153,35 @@ def main():
         # 1. Cargar y transformar el JSON
         azure_docs = load_curated_json(json_path)
         
-        # 2. Decidir destino
+        # 2. Decidir destino.
+        #    En ambos casos se compara con lo último indexado: solo se sube lo nuevo.
         if args.dry_run:
+            diferencias = Diferencias("json", full=args.full)
+            for doc in azure_docs:
+                diferencias.registrar(doc)
+            diferencias.imprimir()
             save_preview_json(azure_docs)
+            # El índice denso local (búsqueda híbrida) se construye sobre los JSON del dry-run
+            if indice_denso_activo():
+                construir_indice_denso()
+            else:
+                print("Índice denso: se omite (RETRIEVER_BACKEND no es 'hybrid'; "
+                      "build_dense_index.py lo genera a mano).")
+            if args.emit_index:
+                construir_indice_binario(salida=Path(args.emit_index))
         else:
             print("\nModo REAL: Conectando a Azure para cargar...")
+            if args.emit_index:
+                print("Aviso: --emit-index se genera a partir de los JSON del dry-run; aquí se ignora.")
             client = get_search_client()
-            upload_to_azure(client, azure_docs)
+            sincronizar_indice(client, "json", azure_docs, full=args.full, dead_letter_path=args.dead_letter)
+
+        # 3. El banco de respuestas sigue al índice: se regeneran las entradas cuyo contexto
+        #    cambió (en el dry-run solo se muestra cuáles). Se importa aquí: carga el flujo
+        #    del backend y su configuración (backend/.env)
+        if not args.sin_banco:
+            from build_answer_bank import actualizar_banco_tras_ingesta
+            actualizar_banco_tras_ingesta(dry_run=args.dry_run)
             
     except FileNotFoundError:
         print(f"Error: No se encontró el archivo JSON")
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Los scripts de data/ se importan entre sí como módulos sueltos (from index_manifest import ...)
+DATA_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(DATA_DIR))
@@ -0,0 +1,83 @@
+import json
+
+from deduplicacion import DeduplicadorMinHash, elegir_bandas, shingles
+
+PARRAFO = (
+    "La anemia por deficiencia de hierro en niños menores de tres años afecta el desarrollo "
+    "cognitivo, motor y emocional. Por eso se recomienda incluir todos los días alimentos de "
+    "origen animal ricos en hierro, como sangrecita, hígado, bazo y otras vísceras de color "
+    "oscuro, además de carnes rojas y pescado, desde los seis meses de edad."
+)
+OTRO_PARRAFO = (
+    "El tamizaje de hemoglobina se realiza a los seis meses de edad y se repite a los doce, "
+    "dieciocho y veinticuatro meses. El resultado se ajusta según la altitud de la localidad "
+    "donde vive el niño antes de compararlo con los valores normales."
+)
+
+
+def doc(doc_id: str, contenido: str) -> dict:
+    return {"id": doc_id, "content": contenido, "title": "guia.pdf", "page": 1, "chunk_index": 0}
+
+
+def test_las_bandas_ponen_el_corte_cerca_del_umbral():
+    bandas, filas = elegir_bandas(0.8, 128)
+
+    assert bandas * filas <= 128
+    assert abs((1 / bandas) ** (1 / filas) - 0.8) < 0.05
+
+
+def test_los_shingles_ignoran_mayusculas_tildes_y_signos():
+    assert set(shingles("¡La ANEMIA, en niños!")) == set(shingles("la anemia en ninos"))
+
+
+def test_un_casi_duplicado_se_elimina_y_queda_el_mas_largo():
+    casi_igual = PARRAFO.replace("sangrecita, hígado", "sangrecita , hígado") + " (60)"
+    docs = [doc("a", PARRAFO), doc("b", OTRO_PARRAFO), doc("c", casi_igual)]
+    dedup = DeduplicadorMinHash(umbral=0.8)
+
+    conservados = [d["id"] for d in dedup.filtrar(docs)]
+
+    assert conservados == ["b", "c"]
+    assert dedup.eliminados == 1
+    assert dedup.reporte[0]["representante"]["id"] == "c"
+    assert dedup.reporte[0]["eliminados"][0]["id"] == "a"
+
+
+def test_textos_distintos_se_conservan_en_su_orden():
+    docs = [doc("a", PARRAFO), doc("b", OTRO_PARRAFO)]
+    dedup = DeduplicadorMinHash()
+
+    assert [d["id"] for d in dedup.filtrar(docs)] == ["a", "b"]
+    assert dedup.eliminados == 0
+
+
+def test_misma_entrada_mismos_clusters(tmp_path):
+    casi_igual = PARRAFO + " Fuente: MINSA."
+    docs = [doc("a", PARRAFO), doc("b", casi_igual), doc("c", OTRO_PARRAFO)]
+
+    primera = [d["id"] for d in DeduplicadorMinHash().filtrar(docs)]
+    dedup = DeduplicadorMinHash()
+    segunda = [d["id"] for d in dedup.filtrar(docs)]
+    dedup.guardar_reporte(str(tmp_path / "dedup_report.json"))
+
+    assert primera == segunda
+    reporte = json.loads((tmp_path / "dedup_report.json").read_text(encoding="utf-8"))
+    assert reporte["analizados"] == 3
+    assert reporte["eliminados"] == dedup.eliminados
+
+
+def test_acepta_un_generador_y_no_lo_materializa():
+    leidos = []
+
+    def trozos():
+        for d in [doc("a", PARRAFO), doc("b", PARRAFO + " (60)"), doc("c", OTRO_PARRAFO)]:
+            leidos.append(d["id"])
+            yield d
+
+    dedup = DeduplicadorMinHash()
+    salida = dedup.filtrar(trozos())
+    assert leidos == []  # nada se consume hasta que se pide el primer trozo
+
+    assert [d for d in salida] == [doc("b", PARRAFO + " (60)"), doc("c", OTRO_PARRAFO)]
+    assert dedup.total == 3
+    assert dedup.reporte[0]["eliminados"][0]["inicio"] == PARRAFO[:120]
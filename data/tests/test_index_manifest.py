@@ -0,0 +1,117 @@
+import json
+from types import SimpleNamespace
+
+from index_manifest import Diferencias, generar_id, leer_manifest, sincronizar_indice
+
+
+def documento(contenido: str, pagina: int, chunk_index: int) -> dict:
+    return {
+        "id": generar_id("guia.pdf", contenido, pagina=pagina),
+        "content": contenido,
+        "title": "guia.pdf",
+        "page": pagina,
+        "chunk_index": chunk_index,
+        "tags": ["guia.pdf"],
+    }
+
+
+class SearchClientFalso:
+    """Acepta todo y recuerda qué se subió y qué se borró."""
+
+    def __init__(self):
+        self.subidos = []
+        self.borrados = []
+
+    def merge_or_upload_documents(self, documents):
+        self.subidos += [d["id"] for d in documents]
+        return [SimpleNamespace(key=d["id"], succeeded=True, status_code=200) for d in documents]
+
+    def delete_documents(self, documents):
+        self.borrados += [d["id"] for d in documents]
+        return [SimpleNamespace(key=d["id"], succeeded=True, status_code=200) for d in documents]
+
+
+def test_el_id_es_determinista_y_depende_del_contenido():
+    assert generar_id("guia.pdf", "hierro", pagina=3) == generar_id("guia.pdf", "hierro", pagina=3)
+    assert generar_id("guia.pdf", "hierro", pagina=3) != generar_id("guia.pdf", "zinc", pagina=3)
+    assert generar_id("guia.pdf", "hierro", pagina=3) != generar_id("guia.pdf", "hierro", pagina=4)
+    # Sin página (JSON curado): solo el origen y el contenido, no la posición de la entrada
+    assert generar_id("curada.json", "hierro") != generar_id("otra.json", "hierro")
+
+
+def test_un_documento_modificado_se_sube_y_se_borra_su_version_anterior(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    antes = [documento("hierro", 1, 0), documento("zinc", 2, 1)]
+    sincronizar_indice(SearchClientFalso(), "pdf", antes, manifest_path=manifest)
+
+    despues = [documento("hierro hemínico", 1, 0), documento("zinc", 2, 1)]
+    cliente = SearchClientFalso()
+    sincronizar_indice(cliente, "pdf", despues, manifest_path=manifest)
+
+    assert cliente.subidos == [despues[0]["id"]]
+    assert cliente.borrados == [antes[0]["id"]]
+    assert leer_manifest(manifest)["sources"]["pdf"]["ids"] == sorted(d["id"] for d in despues)
+
+
+def test_lee_los_manifiestos_con_hashes(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    doc = documento("hierro", 1, 0)
+    manifest.write_text(json.dumps({"version": "v", "sources": {"pdf": {"ids": {doc["id"]: "hash"}}}}),
+                        encoding="utf-8")
+
+    diferencias = Diferencias("pdf", manifest_path=manifest)
+
+    assert diferencias.registrar(doc) is False
+    assert diferencias.eliminar == []
+
+
+def test_solo_se_sube_lo_nuevo_o_modificado(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    primera = [documento("hierro", 1, 0), documento("zinc", 2, 1)]
+    cliente = SearchClientFalso()
+    sincronizar_indice(cliente, "pdf", primera, manifest_path=manifest)
+    version = leer_manifest(manifest)["version"]
+
+    # Se agrega un trozo al principio: los demás se corren de posición pero no cambian
+    segunda = [documento("calcio", 1, 0), documento("hierro", 1, 1), documento("zinc", 2, 2)]
+    cliente = SearchClientFalso()
+    sincronizar_indice(cliente, "pdf", segunda, manifest_path=manifest)
+
+    assert cliente.subidos == [segunda[0]["id"]]
+    assert cliente.borrados == []
+    assert leer_manifest(manifest)["version"] != version
+
+
+def test_se_borra_lo_que_ya_no_existe(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    docs = [documento("hierro", 1, 0), documento("zinc", 2, 1)]
+    sincronizar_indice(SearchClientFalso(), "pdf", docs, manifest_path=manifest)
+
+    cliente = SearchClientFalso()
+    sincronizar_indice(cliente, "pdf", docs[:1], manifest_path=manifest)
+
+    assert cliente.subidos == []
+    assert cliente.borrados == [docs[1]["id"]]
+    assert list(leer_manifest(manifest)["sources"]["pdf"]["ids"]) == [docs[0]["id"]]
+
+
+def test_sin_cambios_la_version_no_cambia(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    docs = [documento("hierro", 1, 0)]
+    sincronizar_indice(SearchClientFalso(), "pdf", docs, manifest_path=manifest)
+    version = leer_manifest(manifest)["version"]
+
+    sincronizar_indice(SearchClientFalso(), "pdf", docs, manifest_path=manifest)
+
+    assert leer_manifest(manifest)["version"] == version
+
+
+def test_full_vuelve_a_subir_todo(tmp_path):
+    manifest = tmp_path / "index_manifest.json"
+    docs = [documento("hierro", 1, 0), documento("zinc", 2, 1)]
+    sincronizar_indice(SearchClientFalso(), "pdf", docs, manifest_path=manifest)
+
+    diferencias = Diferencias("pdf", full=True, manifest_path=manifest)
+
+    assert all(diferencias.registrar(doc) for doc in docs)
+    assert diferencias.sin_cambios == 2
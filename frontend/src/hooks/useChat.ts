@@ -9,6 +9,14 @@ const WAITING_MESSAGES = [
     "Preparándome para ayudarte, ya casi... 💚"
 ]
 
+// Esperas antes de cada reintento para reanudar una respuesta cortada por la red.
+// El servidor espera STREAM_RESUME_GRACE_S (1,5 s) a que vuelva un cliente reanudable
+// antes de cancelar el turno: todos los reintentos (1,2 s en total) caben en esa ventana
+const RESUME_DELAYS_MS = [200, 400, 600]
+
+// El servidor avisó que el turno falló (evento {"error": ...}): reanudarlo no sirve
+class TurnFailedError extends Error {}
+
 export const useChat = () => {
     const [messages, setMessages] = useState<Message[]>([
         {
@@ -33,7 +41,10 @@ export const useChat = () => {
     useEffect(() => {
         const interval = setInterval(() => {
             if (streamQueue.current.length > 0 && currentBotMessageId.current) {
-                const nextChunk = streamQueue.current.shift()
+                // Efecto de escritura: si la cola crece (el servidor manda frames grandes),
+                // se consumen más caracteres por tick para no quedarse atrás
+                const batchSize = Math.max(1, Math.ceil(streamQueue.current.length / 20))
+                const nextChunk = streamQueue.current.splice(0, batchSize).join('')
                 if (nextChunk) {
                     setMessages(prev => {
                         const msgExists = prev.some(m => m.id === currentBotMessageId.current)
@@ -75,6 +86,78 @@ export const useChat = () => {
         }
     }, [])
 
+    // Lee un stream SSE de /chat/stream y encola los tokens. Devuelve true si llegó [DONE].
+    const readStream = async (text: string, lastEventId: string | null, onEventId: (id: string) => void) => {
+        const headers: Record<string, string> = {
+            'Content-Type': 'application/json',
+        }
+        if (lastEventId) {
+            headers['Last-Event-ID'] = lastEventId
+        }
+
+        const response = await fetch(endpoints.chatStream, {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({
+                message: text,
+                thread_id: threadIdRef.current,
+                reanudable: true
+            }),
+        })
+
+        if (!response.ok) {
+            throw new Error('Error en la comunicación con el servidor')
+        }
+
+        if (!response.body) {
+            throw new Error('No response body')
+        }
+
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        // Un frame SSE puede llegar partido entre dos lecturas: guardamos la línea incompleta
+        let pendingLine = ''
+
+        while (true) {
+            const { value, done } = await reader.read()
+            if (done) return false
+
+            pendingLine += decoder.decode(value, { stream: true })
+            const lines = pendingLine.split('\n')
+            pendingLine = lines.pop() ?? ''
+
+            for (const line of lines) {
+                if (line.startsWith('id: ')) {
+                    onEventId(line.slice(4))
+                } else if (line.startsWith('data: ')) {
+                    const dataStr = line.slice(6)
+                    if (dataStr === '[DONE]') return true
+
+                    let data: { token?: string; error?: string }
+                    try {
+                        data = JSON.parse(dataStr)
+                    } catch (e) {
+                        console.warn('Error parsing SSE data:', e)
+                        continue
+                    }
+                    if (data.error) {
+                        throw new TurnFailedError(`El turno falló: ${data.error}`)
+                    }
+                    if (data.token) {
+                        // Push token to queue instead of updating state directly
+                        // To make it smoother, we can split by character if the chunk is large.
+                        if (data.token.length > 5) {
+                            const chars = data.token.split('')
+                            streamQueue.current.push(...chars)
+                        } else {
+                            streamQueue.current.push(data.token)
+                        }
+                    }
+                }
+            }
+        }
+    }
+
     const sendMessageToApi = async (text: string) => {
         setIsTyping(true)
         isStreaming.current = true
@@ -93,63 +176,28 @@ export const useChat = () => {
         // DO NOT add the empty bot message to the state immediately
         // setMessages(prev => [...prev, botResponse])
 
-        try {
-            const response = await fetch(endpoints.chatStream, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: text,
-                    thread_id: threadIdRef.current
-                }),
-            })
-
-            if (!response.ok) {
-                throw new Error('Error en la comunicación con el servidor')
-            }
-
-            if (!response.body) {
-                throw new Error('No response body')
-            }
-
-            const reader = response.body.getReader()
-            const decoder = new TextDecoder()
+        // Id del último evento SSE recibido ("<turno>:<seq>"). Si la conexión se corta a mitad
+        // de la respuesta (p. ej. cambio de red en el móvil), se reanuda desde ahí con Last-Event-ID
+        // en lugar de perder el resto o volver a generarla.
+        let lastEventId: string | null = null
+        let resumeAttempts = 0
 
+        try {
             while (true) {
-                const { value, done } = await reader.read()
-                if (done) break
-
-                const chunk = decoder.decode(value, { stream: true })
-                const lines = chunk.split('\n')
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const dataStr = line.slice(6)
-                        if (dataStr === '[DONE]') continue
-
-                        try {
-                            const data = JSON.parse(dataStr)
-                            if (data.token) {
-                                // Push token to queue instead of updating state directly
-                                // Split token into characters for smoother effect if it's a large chunk
-                                // But usually tokens are small enough. 
-                                // If the token is a whole word or more, we can push it as is, 
-                                // or split it if we want super smooth char-by-char.
-                                // Let's push it as is for now, but the interval will handle it.
-                                // To make it smoother, we can split by character if the chunk is large.
-                                if (data.token.length > 5) {
-                                    const chars = data.token.split('')
-                                    streamQueue.current.push(...chars)
-                                } else {
-                                    streamQueue.current.push(data.token)
-                                }
-                            }
-                        } catch (e) {
-                            console.warn('Error parsing SSE data:', e)
-                        }
-                    }
+                let finished = false
+                try {
+                    finished = await readStream(text, lastEventId, (id) => { lastEventId = id })
+                } catch (error) {
+                    // Sin ningún evento recibido no hay nada que reanudar
+                    if (error instanceof TurnFailedError) throw error
+                    if (lastEventId === null || resumeAttempts >= RESUME_DELAYS_MS.length) throw error
+                }
+                if (finished) break
+                if (lastEventId === null || resumeAttempts >= RESUME_DELAYS_MS.length) {
+                    throw new Error('La respuesta se cortó antes de terminar')
                 }
+                await new Promise(resolve => setTimeout(resolve, RESUME_DELAYS_MS[resumeAttempts]))
+                resumeAttempts++
             }
 
         } catch (error) {